@@ -0,0 +1,142 @@
+from datetime import timedelta
+from sqlalchemy import text
+from banco import recriar_gatilhos
+from dependencias import pd
+
+# --- AGENDA DE RETORNOS ---
+#
+# Última avaliação de cada paciente do cadastro (a proxima_avaliacao das
+# anteriores já foi substituída). A tela de retornos consulta só esta
+# tabela, por faixas de datas no índice de proxima_avaliacao. Gatilhos
+# mantêm a linha de cada paciente a cada avaliação nova, excluída ou com
+# datas/nome/paciente alterados, refazendo só a linha daquele paciente pelo
+# índice (paciente_id, data_criacao, id). A tabela inteira só é refeita no
+# primeiro acesso do dia (ou ao ser criada), para corrigir qualquer desvio.
+
+COLUNAS_AGENDA = ["paciente_id", "paciente_nome", "avaliacao_id", "data_criacao", "proxima_avaliacao",
+                  "profissional_responsavel", "responsavel_nome"]
+
+# Colunas de avaliacoes que mudam a agenda (o gatilho de UPDATE só dispara nelas)
+COLUNAS_ORIGEM_AGENDA = ["paciente_id", "paciente_nome", "data_criacao", "proxima_avaliacao",
+                         "profissional_responsavel", "responsavel_nome"]
+
+DIAS_PROXIMOS = 7
+
+# Rótulo -> (condição, ordem). :hoje e :limite são datas ISO, como o
+# SQLAlchemy grava colunas Date no SQLite.
+VISOES_AGENDA = {
+    "Atrasados": ("proxima_avaliacao < :hoje", "proxima_avaliacao"),
+    f"Próximos {DIAS_PROXIMOS} dias": ("proxima_avaliacao BETWEEN :hoje AND :limite", "proxima_avaliacao"),
+    "Sem retorno agendado": ("proxima_avaliacao IS NULL", "data_criacao"),
+}
+
+def _refazer(paciente):
+    # Linha de um paciente: a avaliação mais recente dele, se ainda houver
+    colunas = ", ".join(COLUNAS_AGENDA)
+    return f"""DELETE FROM agenda_retorno WHERE paciente_id = {paciente};
+        INSERT INTO agenda_retorno ({colunas})
+        SELECT paciente_id, paciente_nome, id, data_criacao, proxima_avaliacao,
+               profissional_responsavel, responsavel_nome
+        FROM avaliacoes WHERE paciente_id = {paciente}
+        ORDER BY data_criacao DESC, id DESC LIMIT 1;"""
+
+def _ddl_agenda():
+    return [
+        """CREATE TABLE IF NOT EXISTS agenda_retorno (
+        paciente_id INTEGER PRIMARY KEY,
+        paciente_nome TEXT NOT NULL,
+        avaliacao_id INTEGER NOT NULL,
+        data_criacao DATE,
+        proxima_avaliacao DATE,
+        profissional_responsavel TEXT,
+        responsavel_nome TEXT
+    )""",
+        "CREATE INDEX IF NOT EXISTS ix_agenda_retorno_proxima_avaliacao ON agenda_retorno (proxima_avaliacao)",
+        """CREATE TABLE IF NOT EXISTS agenda_retorno_estado (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        gerada_em DATE,
+        desatualizada INTEGER NOT NULL
+    )""",
+        "INSERT OR IGNORE INTO agenda_retorno_estado (id, gerada_em, desatualizada) VALUES (1, NULL, 1)",
+        f"""CREATE TRIGGER IF NOT EXISTS agenda_retorno_ai AFTER INSERT ON avaliacoes
+    WHEN new.paciente_id IS NOT NULL BEGIN
+        {_refazer('new.paciente_id')}
+    END""",
+        # Só a exclusão da avaliação que está na agenda muda a linha (o
+        # arquivo morto nunca move a última de cada paciente)
+        f"""CREATE TRIGGER IF NOT EXISTS agenda_retorno_ad AFTER DELETE ON avaliacoes
+    WHEN old.id = (SELECT avaliacao_id FROM agenda_retorno WHERE paciente_id = old.paciente_id) BEGIN
+        {_refazer('old.paciente_id')}
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS agenda_retorno_au
+    AFTER UPDATE OF {', '.join(COLUNAS_ORIGEM_AGENDA)} ON avaliacoes
+    WHEN new.paciente_id IS NOT NULL BEGIN
+        {_refazer('new.paciente_id')}
+    END""",
+        # Avaliação que passou para outro paciente (unificação, vínculo refeito)
+        f"""CREATE TRIGGER IF NOT EXISTS agenda_retorno_au_anterior
+    AFTER UPDATE OF paciente_id ON avaliacoes
+    WHEN old.paciente_id IS NOT new.paciente_id AND old.paciente_id IS NOT NULL BEGIN
+        {_refazer('old.paciente_id')}
+    END""",
+    ]
+
+def criar_agenda(engine):
+    with engine.begin() as conn:
+        # Bancos com a agenda antiga, indexada pelo nome: refeita do zero
+        colunas = [c for _, c, *_ in conn.exec_driver_sql("PRAGMA table_info(agenda_retorno)")]
+        if colunas and "paciente_id" not in colunas:
+            conn.execute(text("DROP TABLE agenda_retorno"))
+            conn.execute(text("UPDATE agenda_retorno_estado SET desatualizada = 1"))
+        recriar_gatilhos(conn, _ddl_agenda())
+        for ddl in _ddl_agenda():
+            conn.execute(text(ddl))
+
+def reconstruir_agenda(conn, hoje):
+    # A última avaliação de cada paciente é a que não tem sucessora na ordem
+    # (data_criacao, id); a janela percorre o índice (paciente_id, data_criacao, id)
+    colunas = ", ".join(COLUNAS_AGENDA)
+    conn.execute(text("DELETE FROM agenda_retorno"))
+    conn.execute(text(f"""
+        INSERT INTO agenda_retorno ({colunas})
+        SELECT {colunas} FROM (
+            SELECT paciente_id, paciente_nome, id AS avaliacao_id, data_criacao, proxima_avaliacao,
+                   profissional_responsavel, responsavel_nome,
+                   LEAD(id) OVER (PARTITION BY paciente_id ORDER BY data_criacao, id) AS seguinte
+            FROM avaliacoes
+            WHERE paciente_id IS NOT NULL
+        ) WHERE seguinte IS NULL
+    """))
+    conn.execute(text("UPDATE agenda_retorno_estado SET gerada_em = :hoje, desatualizada = 0"),
+                 {"hoje": hoje.isoformat()})
+
+def atualizar_agenda(engine, hoje):
+    # Refaz a tabela inteira uma vez por dia (os gatilhos cuidam do resto);
+    # retorna True se refez. A leitura do estado não abre transação de escrita.
+    with engine.begin() as conn:
+        gerada_em, desatualizada = conn.execute(
+            text("SELECT gerada_em, desatualizada FROM agenda_retorno_estado")
+        ).one()
+        if desatualizada or gerada_em != hoje.isoformat():
+            reconstruir_agenda(conn, hoje)
+            return True
+    return False
+
+def _parametros(hoje):
+    return {"hoje": hoje.isoformat(), "limite": (hoje + timedelta(days=DIAS_PROXIMOS - 1)).isoformat()}
+
+def contar_agenda(conn, hoje):
+    # Quantos pacientes em cada visão
+    return {
+        visao: conn.execute(text(f"SELECT COUNT(*) FROM agenda_retorno WHERE {condicao}"), _parametros(hoje)).scalar()
+        for visao, (condicao, _) in VISOES_AGENDA.items()
+    }
+
+def consultar_agenda(conn, visao, hoje, limite=500):
+    condicao, ordem = VISOES_AGENDA[visao]
+    df = pd.read_sql(
+        text(f"SELECT * FROM agenda_retorno WHERE {condicao} ORDER BY {ordem}, paciente_nome, paciente_id LIMIT :linhas"),
+        conn, params={**_parametros(hoje), "linhas": limite}, parse_dates=["data_criacao", "proxima_avaliacao"],
+    )
+    df["dias"] = (df["proxima_avaliacao"] - pd.Timestamp(hoje)).dt.days
+    return df
@@ -1,79 +1,26 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, Date, Text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from modelos import Avaliacao
+from pacientes import obter_paciente
+# Banco (CAPS_DATABASE_URL), manutenção e histórico são os do
+# streamlit_app.py: este formulário é só outra tela sobre eles
+from streamlit_app import (Session, carregar_pagina_historico, contar_avaliacoes, gerar_csv_avaliacoes,
+                           registrar_gravacao)
 
 # Configuração da Página
 st.set_page_config(page_title="CAPS Infantil - Checklist", layout="wide")
 
-# Configuração do Banco de Dados
-Base = declarative_base()
-engine = create_engine('sqlite:///caps_data.db')
-Session = sessionmaker(bind=engine)
-
-class Avaliacao(Base):
-    __tablename__ = 'avaliacoes'
-    id = Column(Integer, primary_key=True)
-    data_criacao = Column(Date, default=datetime.today)
-    
-    # Cabeçalho
-    cidade = Column(String, default="Angicos")
-    estado = Column(String, default="RN")
-    profissional_responsavel = Column(String)
-    
-    # Acolhimento Inicial
-    paciente_nome = Column(String) # Adicionado para identificação
-    crianca_identificada = Column(Boolean)
-    responsavel_presente = Column(Boolean)
-    responsavel_nome = Column(String) # Adicionado para detalhe
-    motivo_atendimento = Column(Text)
-    encaminhamento_origem = Column(String)
-    observacao_comportamento = Column(Text)
-    
-    # Caderneta Vacinal
-    caderneta_apresentada = Column(Boolean)
-    vacinas_conferidas = Column(Boolean)
-    esquema_completo = Column(Boolean)
-    vacinas_atraso = Column(Boolean)
-    orientacao_responsavel_vacina = Column(Boolean)
-    encaminhamento_ubs_vacina = Column(Boolean)
-    
-    # Avaliação Nutricional
-    peso = Column(Float)
-    altura = Column(Float)
-    imc = Column(Float)
-    classificacao_nutricional = Column(String)
-    queixa_alimentar = Column(String)
-    orientacao_nutricional = Column(Boolean)
-    encaminhamento_nutricao = Column(Boolean)
-    
-    # Avaliação Odontológica
-    higiene_bucal = Column(Boolean)
-    carie_visivel = Column(Boolean)
-    dor_relatada = Column(Boolean)
-    orientacao_higiene_bucal = Column(Boolean)
-    encaminhamento_odontologico = Column(Boolean)
-    classificacao_odonto = Column(String) # Rotina / Urgência
-    
-    # Plano Inicial
-    inserido_caps = Column(Boolean)
-    encaminhamento_ubs_plano = Column(Boolean)
-    encaminhamento_nutricao_plano = Column(Boolean)
-    encaminhamento_odonto_plano = Column(Boolean)
-    encaminhamento_assistencia_social = Column(Boolean)
-    proxima_avaliacao = Column(Date)
-    registro_prontuario = Column(Boolean)
-
-# Criar tabelas se não existirem
-Base.metadata.create_all(engine)
+TAMANHO_PAGINA = 50
 
 def save_avaliacao(data):
     session = Session()
+    data['paciente_id'], data['paciente_nome'] = obter_paciente(session.connection(), data.get('paciente_nome'),
+                                                                data.get('data_nascimento'))
     nova_avaliacao = Avaliacao(**data)
     session.add(nova_avaliacao)
     session.commit()
     session.close()
+    registrar_gravacao()
 
 def main():
     st.title("CAPS INFANTIL - AVALIAÇÃO INICIAL")
@@ -218,22 +165,32 @@ def main():
         st.header("Histórico")
         session = Session()
         try:
-            # Carregar dados
-            df = pd.read_sql(session.query(Avaliacao).statement, session.bind)
+            # Filtro e paginação no banco (busca no índice FTS, uma página por vez)
+            filtro_nome = st.text_input("Buscar por paciente, responsável ou profissional")
+            if st.session_state.get('hist_filtro') != filtro_nome:
+                st.session_state['hist_filtro'] = filtro_nome
+                st.session_state['hist_cursores'] = [None]
+            cursores = st.session_state['hist_cursores']
             
-            if not df.empty:
-                # Filtros
-                filtro_nome = st.text_input("Filtrar por nome do paciente")
-                if filtro_nome:
-                    df = df[df['paciente_nome'].str.contains(filtro_nome, case=False, na=False)]
-                
+            total = contar_avaliacoes(session, filtro_nome)
+            if total:
+                df, proximo_cursor = carregar_pagina_historico(session, filtro_nome, tamanho_pagina=TAMANHO_PAGINA,
+                                                             cursor=cursores[-1])
                 st.dataframe(df)
                 
-                # Botão para exportar
-                csv = df.to_csv(index=False).encode('utf-8')
+                nav_ant, nav_info, nav_prox = st.columns([1, 3, 1])
+                nav_info.caption(f"Página {len(cursores)} de {-(-total // TAMANHO_PAGINA)} — {total} avaliações")
+                if nav_ant.button("⬅️ Anterior", disabled=len(cursores) == 1):
+                    cursores.pop()
+                    st.rerun()
+                if nav_prox.button("Próxima ➡️", disabled=proximo_cursor is None):
+                    cursores.append(proximo_cursor)
+                    st.rerun()
+                
+                # Botão para exportar: o CSV só é gerado ao clicar, em lotes
                 st.download_button(
                     label="Baixar dados em CSV",
-                    data=csv,
+                    data=lambda: gerar_csv_avaliacoes(filtro_nome),
                     file_name='avaliacoes_caps.csv',
                     mime='text/csv',
                 )
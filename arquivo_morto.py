@@ -0,0 +1,433 @@
+import argparse
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable
+from banco import MAX_OVERFLOW, POOL_SIZE, PRAGMAS_SQLITE, adicionar_colunas
+from busca import criar_indice_busca
+
+# --- ARQUIVO MORTO (AVALIAÇÕES ANTIGAS, UM ARQUIVO POR ANO) ---
+#
+# Uso, a partir da raiz do projeto:
+#     python -m arquivo_morto arquivar [--banco sqlite:///caps_data.db] [--meses 24 | --antes-de AAAA-MM-DD] [--pasta ...]
+#     python -m arquivo_morto restaurar [--banco ...] ID [ID ...]
+#     python -m arquivo_morto listar [--banco ...]
+#
+# Avaliações anteriores ao corte saem do banco principal para um arquivo
+# SQLite por ano (arquivo_morto/avaliacoes_AAAA.db, ao lado do banco), com
+# a mesma tabela, os mesmos índices e o próprio índice de busca. A última
+# avaliação de cada paciente nunca sai (agenda de retornos, cadastro). O
+# banco principal guarda o registro dos arquivos (arquivo_morto) e quantas
+# avaliações de cada paciente há em cada ano (arquivo_morto_pacientes), e
+# nada deixa de ser encontrado:
+#   - a busca do histórico, a linha do tempo do paciente e as exportações
+#     leem também os arquivos (ArquivoMorto, somente leitura; a linha do
+#     tempo só abre os anos daquele paciente);
+#   - o banco principal passa a usar AUTOINCREMENT, então o id de uma
+#     avaliação arquivada nunca é dado a outra;
+#   - mover não é criar nem excluir: enquanto avaliações são movidas, os
+#     gatilhos dos resumos do painel, das exclusões (exportação incremental)
+#     e da sincronização não disparam (SEM_MOVIMENTACAO).
+# Para mover, o arquivo é anexado ao banco principal (ATTACH) e cada lote
+# passa em duas transações, cada uma gravando num arquivo só (em WAL o
+# commit de uma transação que grava nos dois não é atômico): primeiro a
+# cópia no arquivo, depois a remoção do principal, só das linhas que não
+# mudaram nesse meio tempo. Se o processo cair entre as duas, a avaliação
+# fica nos dois e vale a do principal: a busca e a linha do tempo ignoram a
+# cópia e o próximo arquivamento a descarta. Restaurar (para editar, excluir ou
+# receber alterações de outra unidade) faz o caminho inverso, na mesma
+# ordem: grava no principal, depois apaga do arquivo.
+
+PASTA_ARQUIVO_MORTO = "arquivo_morto"  # ao lado do banco principal
+MESES_ARQUIVO_MORTO = 24
+TAMANHO_LOTE_ARQUIVO = 5000
+LIMITE_PARAMETROS = 500  # valores por IN (...) na restauração
+
+# Gatilhos sobre avaliacoes que não devem disparar quando a linha só muda de arquivo
+SEM_MOVIMENTACAO = "NOT EXISTS (SELECT 1 FROM arquivo_morto_movimentacao)"
+
+DDL_ARQUIVO_MORTO = [
+    """CREATE TABLE IF NOT EXISTS arquivo_morto (
+        ano INTEGER PRIMARY KEY,
+        arquivo TEXT NOT NULL,
+        avaliacoes INTEGER NOT NULL,
+        atualizado_em TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS arquivo_morto_pacientes (
+        paciente_id INTEGER NOT NULL,
+        ano INTEGER NOT NULL,
+        avaliacoes INTEGER NOT NULL,
+        PRIMARY KEY (paciente_id, ano)
+    ) WITHOUT ROWID""",
+    # Tem uma linha só durante as transações que movem avaliações
+    "CREATE TABLE IF NOT EXISTS arquivo_morto_movimentacao (id INTEGER PRIMARY KEY CHECK (id = 1))",
+]
+
+# Uma movimentação por vez neste processo (arquivamento e restaurações); o
+# backup (manutencao.py) também o segura, para não copiar o principal e os
+# arquivos com um lote no meio do caminho
+lock_movimentacao = threading.Lock()
+
+def criar_arquivo_morto(engine):
+    # Antes dos gatilhos que usam SEM_MOVIMENTACAO
+    with engine.begin() as conn:
+        for ddl in DDL_ARQUIVO_MORTO:
+            conn.execute(text(ddl))
+        conn.execute(text("DELETE FROM arquivo_morto_movimentacao"))
+
+def _agora():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def _banco(engine):
+    banco = engine.url.database
+    if engine.dialect.name != "sqlite" or banco in (None, "", ":memory:"):
+        raise ValueError("O arquivo morto só funciona com SQLite em arquivo.")
+    return os.path.abspath(banco)
+
+def caminho_arquivo(engine, arquivo):
+    # O registro guarda o caminho relativo à pasta do banco principal
+    return os.path.join(os.path.dirname(_banco(engine)), arquivo)
+
+def listar_arquivos(conn):
+    return conn.execute(text(
+        "SELECT ano, arquivo, avaliacoes, atualizado_em FROM arquivo_morto ORDER BY ano DESC"
+    )).all()
+
+def corte_por_meses(meses, hoje=None):
+    # Primeiro dia do mês de `meses` meses atrás
+    hoje = hoje or date.today()
+    mes = hoje.year * 12 + hoje.month - 1 - meses
+    return date(mes // 12, mes % 12 + 1, 1)
+
+def pacientes_arquivados(conn, paciente_id):
+    # (ids a procurar nos arquivos, anos com avaliações arquivadas) de um
+    # paciente: o próprio cadastro e os unificados a ele
+    anos = [ano for (ano,) in conn.execute(text(
+        "SELECT ano FROM arquivo_morto_pacientes WHERE paciente_id = :id AND avaliacoes > 0 ORDER BY ano"
+    ), {"id": paciente_id})]
+    if not anos:
+        return [paciente_id], []
+    apelidos = [i for (i,) in conn.execute(text("SELECT id FROM pacientes WHERE unificado_em = :id"), {"id": paciente_id})]
+    return [paciente_id] + apelidos, anos
+
+# --- ESQUEMA ---
+
+def garantir_autoincremento(engine):
+    # Bancos criados antes do arquivo morto: recria avaliacoes com
+    # AUTOINCREMENT (ids arquivados não podem voltar a ser usados), com os
+    # mesmos índices e gatilhos, numa transação só. Roda uma vez, no
+    # primeiro arquivamento, e bloqueia as gravações enquanto copia.
+    from modelos import Avaliacao
+    with engine.connect() as conn, conn.begin():
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'avaliacoes'")).scalar()
+        if "AUTOINCREMENT" in sql.upper():
+            return False
+        # O pysqlite só abre a transação antes de INSERT/UPDATE/DELETE: esta
+        # linha a abre antes do DDL (e não dispara gatilho nenhum)
+        conn.execute(text("INSERT INTO arquivo_morto_movimentacao (id) VALUES (1)"))
+        dependentes = [s for (s,) in conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = 'avaliacoes' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ))]
+        modelo = [c.name for c in Avaliacao.__table__.columns]
+        extras = [(nome, tipo) for _, nome, tipo, *_ in conn.exec_driver_sql("PRAGMA table_info(avaliacoes)")
+                  if nome not in modelo]
+        ddl = str(CreateTable(Avaliacao.__table__).compile(dialect=engine.dialect))
+        conn.exec_driver_sql("DROP TABLE IF EXISTS avaliacoes_nova")
+        conn.exec_driver_sql(ddl.replace("CREATE TABLE avaliacoes ", "CREATE TABLE avaliacoes_nova ", 1))
+        for nome, tipo in extras:
+            conn.exec_driver_sql(f"ALTER TABLE avaliacoes_nova ADD COLUMN {nome} {tipo}")
+        colunas = ", ".join(modelo + [nome for nome, _ in extras])
+        conn.exec_driver_sql(f"INSERT INTO avaliacoes_nova ({colunas}) SELECT {colunas} FROM avaliacoes")
+        conn.exec_driver_sql("DROP TABLE avaliacoes")
+        conn.exec_driver_sql("ALTER TABLE avaliacoes_nova RENAME TO avaliacoes")
+        for ddl in dependentes:
+            conn.exec_driver_sql(ddl)
+        conn.execute(text("DELETE FROM arquivo_morto_movimentacao"))
+    return True
+
+def preparar_arquivo(caminho):
+    # Mesma tabela e índices do banco principal (com as colunas novas do
+    # modelo) e o próprio índice de busca; os demais gatilhos não vão junto
+    from modelos import Avaliacao
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    engine = create_engine(f"sqlite:///{caminho}")
+    try:
+        Avaliacao.__table__.create(engine, checkfirst=True)
+        adicionar_colunas(engine, Avaliacao.__table__)
+        for indice in Avaliacao.__table__.indexes:
+            indice.create(engine, checkfirst=True)
+        criar_indice_busca(engine)
+    finally:
+        engine.dispose()
+
+@contextmanager
+def anexado(conn, caminho):
+    # ATTACH/DETACH fora de transação (o SQLite recusa DETACH dentro de uma)
+    with conn.begin():
+        conn.exec_driver_sql("ATTACH DATABASE ? AS arquivo", (caminho,))
+    try:
+        yield conn
+    finally:
+        with conn.begin():
+            conn.exec_driver_sql("DETACH DATABASE arquivo")
+
+# --- MOVIMENTAÇÃO ---
+
+# Avaliações do ano criadas e alteradas pela última vez antes do corte
+# (exportação incremental e sincronização já as viram) que não são a
+# última do paciente, na ordem do índice (data_criacao, id)
+CANDIDATAS = """
+    FROM main.avaliacoes a
+    WHERE a.data_criacao >= :inicio AND a.data_criacao < :fim
+      AND (a.data_criacao, a.id) > (:data, :ultimo)
+      AND (a.atualizado_em IS NULL OR a.atualizado_em < :corte)
+      AND (a.paciente_id IS NULL OR EXISTS (
+          SELECT 1 FROM main.avaliacoes b
+          WHERE b.paciente_id = a.paciente_id AND (b.data_criacao, b.id) > (a.data_criacao, a.id)
+      ))
+"""
+
+def _lista(ids):
+    return ", ".join(str(int(i)) for i in ids)
+
+def arquivar_avaliacoes(engine, antes_de, pasta=None, tamanho_lote=TAMANHO_LOTE_ARQUIVO, progresso=None):
+    # Move para o arquivo de cada ano as avaliações com data_criacao anterior
+    # a `antes_de` (date). progresso(movidas, total) após cada lote.
+    # Retorna {ano: avaliações movidas}.
+    from modelos import Avaliacao
+    base = os.path.dirname(_banco(engine))
+    pasta = pasta or os.path.join(base, PASTA_ARQUIVO_MORTO)
+    garantir_autoincremento(engine)
+    colunas = ", ".join(c.name for c in Avaliacao.__table__.columns)
+    corte = antes_de.isoformat()
+
+    with engine.connect() as conn:
+        with conn.begin():
+            registrados = {ano: arquivo for ano, arquivo, *_ in listar_arquivos(conn)}
+            anos = [int(ano) for (ano,) in conn.execute(text(
+                "SELECT DISTINCT substr(data_criacao, 1, 4) FROM avaliacoes WHERE data_criacao < :corte ORDER BY 1"
+            ), {"corte": corte})]
+            total = conn.execute(text(f"SELECT COUNT(*) {CANDIDATAS}"),
+                                 {"inicio": "", "fim": corte, "corte": corte, "data": "", "ultimo": 0}).scalar()
+        movidas = {}
+        for ano in anos:
+            arquivo = registrados.get(ano) or os.path.relpath(os.path.join(pasta, f"avaliacoes_{ano}.db"), base)
+            caminho = os.path.join(base, arquivo)
+            preparar_arquivo(caminho)
+            parametros = {"inicio": f"{ano:04d}-01-01", "fim": min(f"{ano + 1:04d}-01-01", corte), "corte": corte,
+                          "data": "", "ultimo": 0, "limite": tamanho_lote}
+            with anexado(conn, caminho):
+                with lock_movimentacao, conn.begin():
+                    # Sobras de uma movimentação interrompida: vale o principal
+                    conn.exec_driver_sql("DELETE FROM arquivo.avaliacoes WHERE id IN (SELECT id FROM main.avaliacoes)")
+                while True:
+                    with conn.begin():
+                        lote = conn.execute(text(
+                            f"SELECT a.id, a.data_criacao {CANDIDATAS} ORDER BY a.data_criacao, a.id LIMIT :limite"
+                        ), parametros).all()
+                    if not lote:
+                        break
+                    parametros["data"], parametros["ultimo"] = lote[-1].data_criacao, lote[-1].id
+                    ids = _lista(l.id for l in lote)
+                    with lock_movimentacao:
+                        with conn.begin():
+                            conn.exec_driver_sql(f"DELETE FROM arquivo.avaliacoes WHERE id IN ({ids})")
+                            conn.exec_driver_sql(f"INSERT INTO arquivo.avaliacoes ({colunas}) "
+                                                 f"SELECT {colunas} FROM main.avaliacoes WHERE id IN ({ids})")
+                        with conn.begin():
+                            conn.execute(text("INSERT INTO main.arquivo_morto_movimentacao (id) VALUES (1)"))
+                            # Só as que ninguém alterou depois da cópia
+                            iguais = _lista(i for (i,) in conn.exec_driver_sql(f"""
+                                SELECT m.id FROM main.avaliacoes m JOIN arquivo.avaliacoes x ON x.id = m.id
+                                WHERE m.id IN ({ids}) AND m.versao = x.versao AND m.atualizado_em IS x.atualizado_em
+                            """))
+                            quantidade = 0
+                            if iguais:
+                                conn.exec_driver_sql(f"""
+                                    INSERT INTO main.arquivo_morto_pacientes (paciente_id, ano, avaliacoes)
+                                    SELECT COALESCE(p.unificado_em, p.id), {ano}, COUNT(*)
+                                    FROM main.avaliacoes a JOIN main.pacientes p ON p.id = a.paciente_id
+                                    WHERE a.id IN ({iguais}) GROUP BY 1
+                                    ON CONFLICT (paciente_id, ano) DO UPDATE SET avaliacoes = avaliacoes + excluded.avaliacoes
+                                """)
+                                quantidade = conn.exec_driver_sql(f"DELETE FROM main.avaliacoes WHERE id IN ({iguais})").rowcount
+                                conn.execute(text("""
+                                    INSERT INTO main.arquivo_morto (ano, arquivo, avaliacoes, atualizado_em)
+                                    VALUES (:ano, :arquivo, :quantidade, :agora)
+                                    ON CONFLICT (ano) DO UPDATE SET avaliacoes = avaliacoes + excluded.avaliacoes,
+                                        atualizado_em = excluded.atualizado_em
+                                """), {"ano": ano, "arquivo": arquivo, "quantidade": quantidade, "agora": _agora()})
+                            conn.execute(text("DELETE FROM main.arquivo_morto_movimentacao"))
+                    movidas[ano] = movidas.get(ano, 0) + quantidade
+                    if progresso:
+                        progresso(sum(movidas.values()), total)
+    return movidas
+
+def restaurar_avaliacoes(engine, ids=(), uuids=()):
+    # Devolve ao banco principal as avaliações arquivadas com estes ids ou
+    # uuids (as que não estão arquivadas são ignoradas). Se o paciente foi
+    # renomeado ou unificado depois do arquivamento, a avaliação volta já
+    # com o cadastro atual. Retorna quantas voltaram.
+    from modelos import Avaliacao
+    ids, uuids = list(ids), list(uuids)
+    with engine.connect() as conn:
+        arquivos = listar_arquivos(conn)
+    if not arquivos or not (ids or uuids):
+        return 0
+    colunas = ", ".join(c.name for c in Avaliacao.__table__.columns)
+    restauradas = 0
+    for ano, arquivo, *_ in arquivos:
+        caminho = caminho_arquivo(engine, arquivo)
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"Arquivo morto de {ano} não encontrado: {caminho}")
+        with engine.connect() as conn, anexado(conn, caminho):
+            for inicio in range(0, max(len(ids), len(uuids)), LIMITE_PARAMETROS):
+                parte_ids, parte_uuids = ids[inicio:inicio + LIMITE_PARAMETROS], uuids[inicio:inicio + LIMITE_PARAMETROS]
+                with conn.begin():
+                    encontradas = _lista(i for (i,) in conn.exec_driver_sql(
+                        f"SELECT id FROM arquivo.avaliacoes WHERE id IN ({_lista(parte_ids) or 'NULL'}) "
+                        f"OR uuid IN ({', '.join('?' * len(parte_uuids)) or 'NULL'})", tuple(parte_uuids)))
+                if not encontradas:
+                    continue
+                with lock_movimentacao:
+                    with conn.begin():
+                        conn.execute(text("INSERT INTO main.arquivo_morto_movimentacao (id) VALUES (1)"))
+                        novas = _lista(i for (i,) in conn.exec_driver_sql(
+                            f"SELECT id FROM arquivo.avaliacoes WHERE id IN ({encontradas}) "
+                            "AND id NOT IN (SELECT id FROM main.avaliacoes)"))
+                        if novas:
+                            por_paciente = Counter(dict(conn.exec_driver_sql(f"""
+                                SELECT COALESCE(p.unificado_em, p.id), COUNT(*)
+                                FROM arquivo.avaliacoes x JOIN main.pacientes p ON p.id = x.paciente_id
+                                WHERE x.id IN ({novas}) GROUP BY 1
+                            """).all()))
+                            quantidade = conn.exec_driver_sql(f"INSERT INTO main.avaliacoes ({colunas}) "
+                                                              f"SELECT {colunas} FROM arquivo.avaliacoes WHERE id IN ({novas})").rowcount
+                            if por_paciente:
+                                conn.execute(text("""
+                                    UPDATE main.arquivo_morto_pacientes SET avaliacoes = avaliacoes - :quantidade
+                                    WHERE paciente_id = :paciente_id AND ano = :ano
+                                """), [{"paciente_id": p, "ano": ano, "quantidade": q} for p, q in por_paciente.items()])
+                                conn.execute(text("DELETE FROM main.arquivo_morto_pacientes WHERE avaliacoes <= 0"))
+                            conn.execute(text("UPDATE main.arquivo_morto SET avaliacoes = avaliacoes - :quantidade, "
+                                              "atualizado_em = :agora WHERE ano = :ano"),
+                                         {"quantidade": quantidade, "agora": _agora(), "ano": ano})
+                            # Cadastro atual do paciente
+                            conn.execute(text(f"""
+                                UPDATE main.avaliacoes
+                                SET (paciente_id, paciente_nome) = (
+                                        SELECT p.id, p.nome FROM main.pacientes a JOIN main.pacientes p
+                                        ON p.id = COALESCE(a.unificado_em, a.id) WHERE a.id = avaliacoes.paciente_id),
+                                    versao = versao + 1, atualizado_em = :agora
+                                WHERE id IN ({novas}) AND EXISTS (
+                                    SELECT 1 FROM main.pacientes a JOIN main.pacientes p ON p.id = COALESCE(a.unificado_em, a.id)
+                                    WHERE a.id = avaliacoes.paciente_id
+                                      AND (p.id <> avaliacoes.paciente_id OR p.nome IS NOT avaliacoes.paciente_nome))
+                            """), {"agora": _agora()})
+                            restauradas += quantidade
+                        conn.execute(text("DELETE FROM main.arquivo_morto_movimentacao"))
+                    with conn.begin():
+                        conn.exec_driver_sql(f"DELETE FROM arquivo.avaliacoes WHERE id IN ({encontradas}) "
+                                             "AND id IN (SELECT id FROM main.avaliacoes)")
+    return restauradas
+
+# --- LEITURA ---
+
+class ArquivoMorto:
+    # Consultas nos arquivos registrados, cada um com sua engine somente
+    # leitura, aberta na primeira consulta e reaproveitada. As funções de
+    # consulta do banco principal (busca, contagem, linha do tempo, PDF)
+    # rodam sem mudança sobre estas conexões.
+    def __init__(self, engine, ao_criar_engine=None):
+        # ao_criar_engine(engine) é chamado para cada arquivo aberto (ex.: instrumentação)
+        self.engine = engine
+        self.ao_criar_engine = ao_criar_engine
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def arquivos(self):
+        # [(ano, caminho, avaliações)], do ano mais recente ao mais antigo
+        with self.engine.connect() as conn:
+            registrados = listar_arquivos(conn)
+        return [(ano, caminho_arquivo(self.engine, arquivo), avaliacoes) for ano, arquivo, avaliacoes, _ in registrados]
+
+    def total(self):
+        return sum(avaliacoes for _, _, avaliacoes in self.arquivos())
+
+    def engine_arquivo(self, ano, caminho):
+        with self._lock:
+            if caminho not in self._engines:
+                if not os.path.exists(caminho):
+                    raise FileNotFoundError(f"Arquivo morto de {ano} não encontrado: {caminho}")
+                uri = f"{Path(caminho).resolve().as_uri()}?mode=ro"
+
+                def conectar():
+                    conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                           timeout=PRAGMAS_SQLITE["busy_timeout"] / 1000)
+                    conn.execute(f"PRAGMA cache_size={PRAGMAS_SQLITE['cache_size']}")
+                    return conn
+
+                engine = create_engine("sqlite://", creator=conectar, poolclass=QueuePool,
+                                       pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
+                if self.ao_criar_engine:
+                    self.ao_criar_engine(engine)
+                self._engines[caminho] = engine
+            return self._engines[caminho]
+
+    def consultar(self, consulta, anos=None):
+        # [(ano, consulta(conn))] em cada arquivo, ou só nos `anos`
+        resultados = []
+        for ano, caminho, _ in self.arquivos():
+            if anos is None or ano in anos:
+                with self.engine_arquivo(ano, caminho).connect() as conn:
+                    resultados.append((ano, consulta(conn)))
+        return resultados
+
+    def fechar(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="Move avaliações antigas para arquivos por ano, ou as traz de volta.")
+    parser.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    arquivar = comandos.add_parser("arquivar", help="move as avaliações anteriores ao corte")
+    corte = arquivar.add_mutually_exclusive_group()
+    corte.add_argument("--meses", type=int, default=int(os.environ.get('CAPS_ARQUIVO_MESES', MESES_ARQUIVO_MORTO)),
+                       help="arquiva o que tem mais de N meses (a partir do início do mês)")
+    corte.add_argument("--antes-de", type=date.fromisoformat, help="arquiva o que é anterior a esta data (AAAA-MM-DD)")
+    arquivar.add_argument("--pasta", default=os.environ.get('CAPS_ARQUIVO_DIR') or None,
+                          help=f"pasta dos arquivos (padrão: {PASTA_ARQUIVO_MORTO}/ ao lado do banco)")
+    restaurar = comandos.add_parser("restaurar", help="traz avaliações arquivadas de volta ao banco principal")
+    restaurar.add_argument("ids", type=int, nargs="+")
+    comandos.add_parser("listar", help="mostra os arquivos registrados")
+    args = parser.parse_args()
+
+    from banco import criar_engine
+    from esquema import preparar_banco
+
+    engine = criar_engine(args.banco)
+    preparar_banco(engine)
+    if args.comando == "arquivar":
+        antes_de = args.antes_de or corte_por_meses(args.meses)
+        movidas = arquivar_avaliacoes(engine, antes_de, args.pasta,
+                                      progresso=lambda n, total: print(f"\r{n} de {total}", end="", flush=True))
+        print(f"\n{sum(movidas.values())} avaliação(ões) anteriores a {antes_de:%d/%m/%Y} arquivadas"
+              + "".join(f"\n  {ano}: {n}" for ano, n in sorted(movidas.items())))
+    elif args.comando == "restaurar":
+        print(f"{restaurar_avaliacoes(engine, ids=args.ids)} avaliação(ões) restaurada(s)")
+    else:
+        with engine.connect() as conn:
+            for ano, arquivo, avaliacoes, atualizado_em in listar_arquivos(conn):
+                print(f"{ano}  {avaliacoes:>8} avaliações  {arquivo}  (atualizado em {atualizado_em[:19]})")
+
+if __name__ == "__main__":
+    main()
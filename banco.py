@@ -0,0 +1,80 @@
+import re
+from sqlalchemy import create_engine, event, inspect, text
+
+# --- PERFIL DE PRODUÇÃO DO SQLITE ---
+#
+# Aplicado a cada conexão nova do pool. Em WAL, leitores não bloqueiam o
+# escritor (e vice-versa); busy_timeout faz um escritor esperar pelo outro
+# em vez de falhar com "database is locked"; synchronous=NORMAL é seguro em
+# WAL e evita um fsync por commit. auto_vacuum=INCREMENTAL deixa a
+# manutenção devolver páginas livres ao disco aos poucos (manutencao.py); só
+# vale em banco novo, antes do journal_mode (que já grava o cabeçalho) —
+# bancos antigos são convertidos pela manutenção com um VACUUM.
+PRAGMAS_SQLITE = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,            # ms
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -32000,            # negativo = KiB (32 MB por conexão)
+    "temp_store": "MEMORY",
+}
+
+# Cada sessão do Streamlit roda em sua própria thread; o pool reaproveita
+# conexões entre reruns e limita quantas ficam abertas ao mesmo tempo.
+POOL_SIZE = 8
+MAX_OVERFLOW = 16
+
+def aplicar_pragmas(dbapi_conn, connection_record=None):
+    cursor = dbapi_conn.cursor()
+    for nome, valor in PRAGMAS_SQLITE.items():
+        cursor.execute(f"PRAGMA {nome}={valor}")
+    cursor.close()
+
+def criar_engine(url):
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # Banco em memória: o SQLAlchemy usa uma conexão por thread, sem pool
+        engine = create_engine(url)
+    else:
+        engine = create_engine(
+            url,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            connect_args={"check_same_thread": False, "timeout": PRAGMAS_SQLITE["busy_timeout"] / 1000},
+        )
+    event.listen(engine, "connect", aplicar_pragmas)
+    return engine
+
+# --- MIGRAÇÕES ---
+
+def adicionar_colunas(engine, tabela):
+    # create_all não altera tabelas existentes: acrescenta as colunas novas do
+    # modelo. Colunas NOT NULL precisam de server_default.
+    existentes = {c["name"] for c in inspect(engine).get_columns(tabela.name)}
+    with engine.begin() as conn:
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            ddl = f"ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {coluna.type.compile(engine.dialect)}"
+            if not coluna.nullable:
+                ddl += " NOT NULL"
+            if coluna.server_default is not None:
+                ddl += f" DEFAULT {coluna.server_default.arg}"
+            for fk in coluna.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+            conn.execute(text(ddl))
+
+def recriar_gatilhos(conn, ddls):
+    # CREATE TRIGGER IF NOT EXISTS não altera um gatilho que já existe: os
+    # que mudaram de definição são apagados para serem criados de novo. O
+    # SQLite guarda o texto do CREATE sem o "IF NOT EXISTS".
+    for ddl in ddls:
+        nome = re.match(r"\s*CREATE TRIGGER IF NOT EXISTS (\w+)", ddl)
+        if not nome:
+            continue
+        atual = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = :nome"),
+                             {"nome": nome.group(1)}).scalar()
+        if atual is not None and atual != ddl.replace("IF NOT EXISTS ", "", 1):
+            conn.execute(text(f"DROP TRIGGER {nome.group(1)}"))
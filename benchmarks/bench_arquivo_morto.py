@@ -0,0 +1,108 @@
+# Benchmark do arquivo morto: banco principal antes e depois de arquivar.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_arquivo_morto [--avaliacoes 200000] [--meses 24]
+#
+# Gera um banco sintético (cinco anos de avaliações), mede as consultas do
+# dia a dia no banco principal, arquiva as avaliações com mais de --meses
+# meses e mede de novo: contagem e primeira página do histórico, typeahead
+# da busca e linha do tempo de pacientes (esta já juntando o arquivo
+# morto). Mostra o tempo do arquivamento, o tamanho do principal compactado
+# (VACUUM INTO numa cópia: o arquivo só encolhe no próximo VACUUM) e confere
+# que nenhuma avaliação se perdeu e que os resumos não mudaram.
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+
+TERMOS = ["ana", "silva", "pedro", "mar", "agitação", "escola", "joão souza", "cardoso"]
+
+def mediana_ms(funcao, argumentos):
+    tempos = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcao(argumento)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=200_000)
+    parser.add_argument("--meses", type=int, default=24)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'arquivo.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from arquivo_morto import arquivar_avaliacoes, corte_por_meses
+    from benchmarks.dados_sinteticos import popular_banco
+    from busca import sugerir_avaliacoes
+    from pacientes import consultar_linha_do_tempo
+    from sqlalchemy import text
+
+    ate = date(2026, 6, 30)
+    popular_banco(app.engine, args.avaliacoes, ate=ate)
+    with app.engine.begin() as conn:
+        # O vínculo com o cadastro de pacientes marca tudo como editado agora;
+        # volta à data da avaliação para que as antigas possam ser arquivadas
+        conn.execute(text("UPDATE avaliacoes SET atualizado_em = data_criacao || ' 12:00:00.000000'"))
+        pacientes = [p for (p,) in conn.execute(text(
+            "SELECT id FROM pacientes WHERE unificado_em IS NULL ORDER BY random() LIMIT 200"))]
+
+    def estado():
+        compactado = os.path.join(pasta, "compactado.db")
+        with app.engine.connect() as conn:
+            uuids = {u for (u,) in conn.execute(text("SELECT uuid FROM avaliacoes"))}
+            resumo = conn.execute(text("SELECT SUM(total) FROM resumo_mensal")).scalar()
+            conn.exec_driver_sql(f"VACUUM INTO '{compactado}'")
+        tamanho = os.path.getsize(compactado)
+        os.remove(compactado)
+        return uuids, resumo, tamanho
+
+    def medir(rotulo, linha_do_tempo):
+        session = app.Session()
+        try:
+            conn = session.connection()
+            contagem = mediana_ms(lambda _: app.contar_avaliacoes(session), range(20))
+            pagina = mediana_ms(lambda _: app.carregar_pagina_historico(session), range(20))
+            busca = mediana_ms(lambda termo: sugerir_avaliacoes(conn, termo), TERMOS * 3)
+            linhas = mediana_ms(lambda p: linha_do_tempo(conn, p), pacientes)
+        finally:
+            session.close()
+        print(f"{rotulo:<8} contagem {contagem:7.2f} ms  primeira página {pagina:7.2f} ms  "
+              f"typeahead {busca:6.2f} ms  linha do tempo {linhas:6.2f} ms  (medianas)")
+
+    uuids, resumo, ocupado = estado()
+    print(f"{args.avaliacoes} avaliações, {ocupado / 1024 ** 2:.1f} MB no banco principal compactado")
+    medir("antes", consultar_linha_do_tempo)
+
+    inicio = time.perf_counter()
+    movidas = arquivar_avaliacoes(app.engine, corte_por_meses(args.meses, ate))
+    duracao = time.perf_counter() - inicio
+    total = sum(movidas.values())
+    print(f"arquivadas {total} avaliações em {duracao:.1f} s ({total / duracao:,.0f}/s): "
+          + ", ".join(f"{ano}: {n}" for ano, n in sorted(movidas.items())))
+
+    quentes, resumo_depois, ocupado_depois = estado()
+    print(f"{len(quentes)} avaliações, {ocupado_depois / 1024 ** 2:.1f} MB no banco principal compactado "
+          f"({100 * (1 - ocupado_depois / ocupado):.0f}% menos)")
+    app.arquivo_morto.clear()
+    medir("depois", app.linha_do_tempo)
+
+    arquivadas = {u for _, lote in app.arquivo_morto().consultar(
+        lambda c: [u for (u,) in c.execute(text("SELECT uuid FROM avaliacoes"))]) for u in lote}
+    print(f"todas as avaliações alcançáveis: {'sim' if quentes | arquivadas == uuids and not quentes & arquivadas else 'NÃO'}; "
+          f"resumos iguais: {'sim' if resumo_depois == resumo else 'NÃO'}")
+    app.arquivo_morto().fechar()
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
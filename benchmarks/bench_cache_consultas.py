@@ -0,0 +1,119 @@
+# Benchmark do cache de consultas compartilhado entre sessões.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_cache_consultas [--avaliacoes 100000] [--sessoes 8] [--reruns 50] [--gravar-a-cada 20]
+#
+# Gera um banco sintético e simula --sessoes usuários (threads), cada um
+# reexecutando --reruns vezes as leituras de um rerun do app: contagem e
+# primeira página do histórico, busca, filtros e resumos do painel e a
+# linha do tempo de um paciente. A cada --gravar-a-cada reruns (somando
+# todas as sessões) alguém salva uma avaliação, o que invalida o cache.
+# Mede o tempo por rerun com o cache desligado e ligado e mostra acertos,
+# faltas e memória usada. No fim confere que, depois de uma gravação, a
+# primeira leitura já vê a avaliação nova.
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=100_000)
+    parser.add_argument("--sessoes", type=int, default=8)
+    parser.add_argument("--reruns", type=int, default=50, help="por sessão")
+    parser.add_argument("--gravar-a-cada", type=int, default=20, help="reruns entre gravações (0 = nunca)")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'cache.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+    session = app.Session()
+    try:
+        pacientes = [i for (i,) in session.query(app.Avaliacao.paciente_id).distinct().limit(args.sessoes)]
+        termo = session.query(app.Avaliacao.paciente_nome).first()[0].split()[0][:4]
+    finally:
+        session.close()
+
+    def rerun(sessao_usuario):
+        # As leituras de um rerun (abas histórico, painel e pacientes)
+        session = app.sessao_leitura()
+        try:
+            conn = session.connection()
+            total = app.em_cache(session, ("historico.contar", None, ()), lambda: app.contar_avaliacoes(session))
+            pagina = app.em_cache(session, ("historico.pagina", None, "Data (mais recentes)", 50, (), None),
+                                  lambda: app.carregar_pagina_historico(session))
+            app.em_cache(session, ("busca.avaliacoes", termo), lambda: app.sugerir_avaliacoes(conn, termo))
+            for coluna in ("mes", "profissional", "cidade"):
+                app.em_cache(session, ("painel.opcoes", coluna), lambda: app.opcoes_resumos(conn, coluna))
+            app.em_cache(session, ("painel.resumos", None, None, None, None), lambda: app.consultar_resumos(conn))
+            paciente = pacientes[sessao_usuario % len(pacientes)]
+            app.em_cache(session, ("pacientes.linha_do_tempo", paciente),
+                         lambda: app.consultar_linha_do_tempo(conn, paciente))
+            return total, pagina[0]
+        finally:
+            session.close()
+
+    def cenario(nome, ligado):
+        cache = app.cache_consultas()
+        app.CACHE_CONSULTAS_MB = cache.max_bytes / 1024 / 1024 if ligado else 0
+        cache.limpar()
+        cache.zerar()
+        tempos = []
+        reruns = [0]
+        lock = threading.Lock()
+
+        def usuario(i):
+            for _ in range(args.reruns):
+                inicio = time.perf_counter()
+                rerun(i)
+                tempos.append(time.perf_counter() - inicio)
+                with lock:
+                    reruns[0] += 1
+                    gravar = args.gravar_a_cada and reruns[0] % args.gravar_a_cada == 0
+                if gravar:
+                    app.save_avaliacao({"paciente_nome": f"Paciente Cache {reruns[0]}", "data_criacao": date(2026, 7, 1),
+                                        "peso": 20.0, "altura": 1.1, "imc": 16.5})
+
+        threads = [threading.Thread(target=usuario, args=(i,)) for i in range(args.sessoes)]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - inicio
+        dados = cache.instantaneo()
+        print(f"{nome:<14} rerun p50 {statistics.median(tempos) * 1000:7.1f} ms  "
+              f"p95 {percentil(tempos, 0.95) * 1000:7.1f} ms  {len(tempos) / duracao:6.1f} reruns/s  "
+              f"acertos {dados['acertos']:5d}  faltas {dados['faltas']:4d} ({dados['taxa_acertos']:.0%})  "
+              f"{dados['bytes'] / 1024 / 1024:5.1f} MB em {dados['itens']} resultados")
+
+    cenario("sem cache", False)
+    cenario("com cache", True)
+
+    # Uma gravação é vista já na leitura seguinte
+    antes, _ = rerun(0)
+    app.save_avaliacao({"paciente_nome": "Paciente Cache Final", "data_criacao": date(2030, 1, 1)})
+    depois, pagina = rerun(0)
+    visto = depois == antes + 1 and pagina.iloc[0]["paciente_nome"] == "Paciente Cache Final"
+    print(f"gravação vista na leitura seguinte: {'sim' if visto else 'NÃO'}")
+    app.cache_consultas().fechar()
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
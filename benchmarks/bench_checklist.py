@@ -0,0 +1,62 @@
+# Benchmark da leitura do histórico com o checklist em máscaras de bits.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_checklist [--linhas 100000]
+#
+# Importa um CSV sintético num banco temporário e lê a tabela inteira de
+# duas formas: com os 21 campos Boolean (como era o histórico) e com uma
+# máscara por seção decodificada com NumPy. Mostra tempo e memória do
+# DataFrame resultante.
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+def medir(rotulo, ler):
+    inicio = time.perf_counter()
+    df = ler()
+    duracao = time.perf_counter() - inicio
+    memoria = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{rotulo}: {len(df)} linhas em {duracao:.2f} s, {memoria:.1f} MB")
+    return df
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=100_000)
+    args = parser.parse_args()
+
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    import checklist
+    from benchmarks.bench_importacao import gerar_csv
+
+    app.importar_csv(gerar_csv(args.linhas, app.COLUNAS_EXPORTACAO))
+
+    session = app.Session()
+    try:
+        booleanos = medir("campos Boolean", lambda: app.pd.read_sql(session.query(app.Avaliacao).statement, session.bind))
+        compacto = medir("máscaras + NumPy", lambda: checklist.decodificar_flags(
+            app.pd.read_sql(session.query(*app.COLUNAS_HISTORICO).statement, session.bind), app.COLUNAS_GRADE,
+        ))
+    finally:
+        session.close()
+
+    iguais = (booleanos[checklist.CAMPOS_CHECKLIST].eq(True).to_numpy() == compacto[checklist.CAMPOS_CHECKLIST].to_numpy()).all()
+    print(f"mesmos valores: {iguais}")
+
+    inicio = time.perf_counter()
+    mascaras = checklist.codificar_flags(compacto)
+    codificar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    checklist.decodificar_flags(mascaras)
+    decodificar = time.perf_counter() - inicio
+    print(f"NumPy: codificar {codificar * 1000:.1f} ms, decodificar {decodificar * 1000:.1f} ms")
+    print(f"checklist em memória: {compacto[checklist.CAMPOS_CHECKLIST].memory_usage().sum() / 1024:.0f} KB como bool, "
+          f"{mascaras[list(checklist.COLUNAS_MASCARA.values())].memory_usage().sum() / 1024:.0f} KB como máscaras")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Teste de estresse de escrita concorrente no SQLite.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_concorrencia [--escritores 8] [--leitores 4] [--salvamentos 200]
+#     python -m benchmarks.bench_concorrencia --sem-perfil   # engine simples, para comparação
+#
+# Cada escritor chama save_avaliacao repetidamente enquanto os leitores
+# paginam o histórico, como várias profissionais usando o app ao mesmo
+# tempo. Usa um banco temporário; o caps_data.db não é tocado.
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escritores", type=int, default=8)
+    parser.add_argument("--leitores", type=int, default=4)
+    parser.add_argument("--salvamentos", type=int, default=200, help="por escritor")
+    parser.add_argument("--sem-perfil", action="store_true", help="create_engine sem pragmas nem pool ajustado")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    os.environ["CAPS_DATABASE_URL"] = url
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+
+    if args.sem_perfil:
+        from sqlalchemy import create_engine
+        app.Session.configure(bind=create_engine(url))
+
+    latencias = []
+    falhas = []
+    lock = threading.Lock()
+    parar = threading.Event()
+
+    def escritor(n):
+        for i in range(args.salvamentos):
+            dados = {
+                "data_criacao": date(2025, 1 + i % 12, 1 + n % 28),
+                "profissional_responsavel": f"Profissional {n}",
+                "paciente_nome": f"Paciente {n}-{i}",
+                "motivo_atendimento": "Avaliação inicial " * 10,
+                "vacinas_atraso": i % 3 == 0,
+                "peso": 20.0, "altura": 1.1, "imc": 16.5,
+            }
+            inicio = time.perf_counter()
+            ok = app.save_avaliacao(dados)
+            duracao = time.perf_counter() - inicio
+            with lock:
+                (latencias if ok else falhas).append(duracao)
+
+    def leitor():
+        while not parar.is_set():
+            session = app.Session()
+            try:
+                app.carregar_pagina_historico(session, tamanho_pagina=50)
+            finally:
+                session.close()
+
+    leitores = [threading.Thread(target=leitor) for _ in range(args.leitores)]
+    escritores = [threading.Thread(target=escritor, args=(n,)) for n in range(args.escritores)]
+    for t in leitores:
+        t.start()
+    inicio = time.perf_counter()
+    for t in escritores:
+        t.start()
+    for t in escritores:
+        t.join()
+    total = time.perf_counter() - inicio
+    parar.set()
+    for t in leitores:
+        t.join()
+
+    print(f"perfil: {'simples' if args.sem_perfil else 'produção (WAL)'}")
+    print(f"salvamentos: {len(latencias)} ok, {len(falhas)} falhas em {total:.2f} s")
+    print(f"vazão: {len(latencias) / total:.1f} salvamentos/s")
+    if latencias:
+        print(f"latência: p50 {statistics.median(latencias) * 1000:.1f} ms, "
+              f"p99 {percentil(latencias, 0.99) * 1000:.1f} ms, máx {max(latencias) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
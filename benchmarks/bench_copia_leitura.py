@@ -0,0 +1,89 @@
+# Benchmark da cópia somente leitura: salvamentos durante relatórios pesados.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_copia_leitura [--avaliacoes 100000] [--leitores 2] [--salvamentos 300]
+#
+# Gera um banco sintético e mede a latência de save_avaliacao em três
+# cenários: sem relatórios; com leitores varrendo a tabela inteira (como
+# uma exportação do histórico) direto do banco principal; e com os mesmos
+# leitores lendo de uma CopiaLeitura em memória (atraso máximo de --atraso
+# segundos). Mostra também o tamanho do WAL no fim de cada cenário:
+# leituras longas no principal impedem o checkpoint e o arquivo cresce.
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=100_000)
+    parser.add_argument("--leitores", type=int, default=2)
+    parser.add_argument("--salvamentos", type=int, default=300)
+    parser.add_argument("--atraso", type=float, default=5.0, help="atraso máximo da cópia, em segundos")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, "copia.db")
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{caminho}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+    from copia_leitura import CopiaLeitura
+    from sqlalchemy import text
+
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+
+    def cenario(nome, leitores, engine_leitura=lambda: app.engine):
+        with app.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        parar = threading.Event()
+        relatorios = []
+
+        def leitor():
+            # Varre a tabela inteira, como uma exportação do histórico
+            while not parar.is_set():
+                inicio = time.perf_counter()
+                with engine_leitura().connect() as conn:
+                    for _ in conn.execution_options(stream_results=True).execute(text("SELECT * FROM avaliacoes")):
+                        pass
+                relatorios.append(time.perf_counter() - inicio)
+
+        threads = [threading.Thread(target=leitor) for _ in range(leitores)]
+        for t in threads:
+            t.start()
+        latencias = []
+        for i in range(args.salvamentos):
+            inicio = time.perf_counter()
+            app.save_avaliacao({"paciente_nome": f"Paciente Bench {i}", "data_criacao": date(2026, 7, 1),
+                                "peso": 20.0, "altura": 1.1, "imc": 16.5})
+            latencias.append(time.perf_counter() - inicio)
+        parar.set()
+        for t in threads:
+            t.join()
+        wal = os.path.getsize(caminho + "-wal") if os.path.exists(caminho + "-wal") else 0
+        print(f"{nome:<28} p50 {statistics.median(latencias) * 1000:6.1f} ms  "
+              f"p99 {percentil(latencias, 0.99) * 1000:6.1f} ms  "
+              f"relatórios {len(relatorios):3d}  WAL {wal / 1e6:6.1f} MB")
+
+    cenario("sem relatórios", 0)
+    cenario("relatórios no principal", args.leitores)
+    copia = CopiaLeitura(app.engine, max_atraso=args.atraso)
+    cenario("relatórios na cópia", args.leitores, copia.engine_leitura)
+    print(f"cópia: {copia.renovacoes} renovações, a última em {copia.ultima_duracao_ms:.0f} ms")
+    copia.fechar()
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Benchmark da edição de avaliações com linhas largas (textos grandes).
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_edicao [--linhas 2000] [--edicoes 1000] [--tamanho-texto 20000]
+#
+# Compara o caminho antigo (buscar a linha e fazer setattr de todos os campos
+# do formulário) com save_avaliacao recebendo a linha original: um único
+# UPDATE só com o campo alterado, protegido pela versão. Usa um banco
+# temporário. No fim confere que corrigir só a data de nascimento leva a
+# avaliação para o cadastro certo quando há homônimos.
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=2000)
+    parser.add_argument("--edicoes", type=int, default=1000)
+    parser.add_argument("--tamanho-texto", type=int, default=20_000)
+    args = parser.parse_args()
+
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from modelos import Paciente
+
+    texto = "Relato detalhado do atendimento. " * (args.tamanho_texto // 33)
+    session = app.Session()
+    session.add_all([
+        app.Avaliacao(
+            data_criacao=date(2025, 1 + i % 12, 1), paciente_nome=f"Paciente {i}", profissional_responsavel="Ana",
+            motivo_atendimento=texto, observacao_comportamento=texto, queixa_alimentar=texto[:2000],
+            vacinas_atraso=False, peso=20.0, altura=1.1, imc=16.5,
+        )
+        for i in range(args.linhas)
+    ])
+    session.commit()
+    session.close()
+
+    campos = [c.name for c in app.Avaliacao.__table__.columns if c.name not in app.COLUNAS_CONTROLE]
+    rng = random.Random(42)
+    ids = rng.sample(range(1, args.linhas + 1), min(args.edicoes, args.linhas))
+
+    def linha(avaliacao_id):
+        session = app.Session()
+        try:
+            a = session.get(app.Avaliacao, avaliacao_id)
+            return {c.name: getattr(a, c.name) for c in a.__table__.columns}
+        finally:
+            session.close()
+
+    # A linha de cada edição é lida antes (o botão "Editar"), fora da medição
+    originais = [linha(i) for i in ids]
+
+    def salvar_antigo(data, avaliacao_id):
+        session = app.Session()
+        try:
+            avaliacao = session.query(app.Avaliacao).filter_by(id=avaliacao_id).first()
+            for key, value in data.items():
+                setattr(avaliacao, key, value)
+            session.commit()
+        finally:
+            session.close()
+
+    for rotulo, salvar in [
+        ("buscar + setattr de todos os campos", lambda o, d: salvar_antigo(d, o["id"])),
+        ("UPDATE só do campo alterado + versão", lambda o, d: app.save_avaliacao(d, o["id"], o)),
+    ]:
+        inicio = time.perf_counter()
+        for n, original in enumerate(originais):
+            dados = {c: original[c] for c in campos}
+            dados["peso"] = 20.0 + n
+            salvar(original, dados)
+            original["versao"] += 1
+            original["peso"] = dados["peso"]
+        duracao = time.perf_counter() - inicio
+        print(f"{rotulo}: {len(originais) / duracao:,.0f} edições/s ({duracao / len(originais) * 1000:.2f} ms por edição)")
+
+    # Duas crianças com o mesmo nome; a avaliação da mais velha foi gravada
+    # com a data de nascimento da mais nova e é corrigida só na data
+    for nascimento in (date(2019, 3, 1), date(2020, 5, 5)):
+        app.save_avaliacao({"paciente_nome": "Maria Homônima", "data_nascimento": nascimento,
+                            "data_criacao": date(2025, 6, 1), "profissional_responsavel": "Ana"})
+    app.save_avaliacao({"paciente_nome": "Maria Homônima", "data_nascimento": date(2020, 5, 5),
+                        "data_criacao": date(2025, 7, 1), "profissional_responsavel": "Ana"})
+    session = app.Session()
+    try:
+        cadastros = dict(session.query(Paciente.data_nascimento, Paciente.id)
+                         .filter(Paciente.nome == "Maria Homônima"))
+        errada = session.query(app.Avaliacao.id).filter_by(
+            paciente_nome="Maria Homônima", data_criacao=date(2025, 7, 1)).scalar()
+    finally:
+        session.close()
+    original = linha(errada)
+    app.save_avaliacao(dict(original, data_nascimento=date(2019, 3, 1)), errada, original)
+    corrigida = linha(errada)
+    if corrigida["paciente_id"] != cadastros[date(2019, 3, 1)]:
+        raise SystemExit(f"avaliação {errada} ficou no paciente {corrigida['paciente_id']} depois de corrigir "
+                         f"a data de nascimento (esperado {cadastros[date(2019, 3, 1)]})")
+    print("correção só da data de nascimento: avaliação no cadastro certo")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Benchmark da exportação Parquet (completa e incremental) contra o CSV.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_exportacao [--avaliacoes 100000] [--alteradas 500]
+#
+# Gera um banco sintético, faz a exportação completa em Parquet e o CSV do
+# histórico, depois simula um dia de trabalho (avaliações novas, editadas e
+# excluídas) e mede a exportação incremental, inclusive sem nenhuma
+# mudança. No fim confere se ler_exportacao reproduz o banco.
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+def tamanho_pasta(pasta):
+    return sum(os.path.getsize(os.path.join(raiz, a)) for raiz, _, arquivos in os.walk(pasta) for a in arquivos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=100_000)
+    parser.add_argument("--alteradas", type=int, default=500, help="avaliações novas e editadas no 'dia' simulado")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'exportacao.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+    from exportacao import exportar_parquet, ler_exportacao
+    from sqlalchemy import text
+
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+    destino = os.path.join(pasta, "secretaria")
+    sem_margem = timedelta(0)
+
+    inicio = time.perf_counter()
+    arquivo = app.gerar_csv_avaliacoes()
+    duracao_csv = time.perf_counter() - inicio
+    arquivo.seek(0, os.SEEK_END)
+    print(f"{'CSV (histórico)':<28} {duracao_csv:8.2f} s  {arquivo.tell() / 1e6:8.1f} MB")
+    arquivo.close()
+
+    resumo = exportar_parquet(app.engine, destino, margem=sem_margem)
+    print(f"{'Parquet completo':<28} {resumo['segundos']:8.2f} s  {tamanho_pasta(destino) / 1e6:8.1f} MB  "
+          f"({resumo['linhas']} linhas, {len(resumo['arquivos'])} meses)")
+
+    # Um "dia": avaliações novas, edições em meses antigos e exclusões
+    rng = random.Random(42)
+    session = app.Session()
+    try:
+        ids = [i for (i,) in session.query(app.Avaliacao.id)]
+    finally:
+        session.close()
+    for i in range(args.alteradas):
+        app.save_avaliacao({"paciente_nome": f"Paciente Novo {i}", "peso": 20.0, "altura": 1.1, "imc": 16.5})
+    session = app.Session()
+    try:
+        for avaliacao_id in rng.sample(ids, args.alteradas):
+            app.atualizar_avaliacao(session, avaliacao_id, {"peso": 30.0})
+            session.commit()
+    finally:
+        session.close()
+    for avaliacao_id in rng.sample(ids, args.alteradas // 10):
+        app.delete_avaliacao(avaliacao_id)
+
+    resumo = exportar_parquet(app.engine, destino, margem=sem_margem)
+    print(f"{'Parquet incremental':<28} {resumo['segundos']:8.2f} s  "
+          f"({resumo['linhas']} linhas, {resumo['exclusoes']} exclusões, {len(resumo['arquivos'])} arquivos)")
+    resumo = exportar_parquet(app.engine, destino, margem=sem_margem)
+    print(f"{'Parquet incremental vazio':<28} {resumo['segundos']:8.2f} s  ({resumo['linhas']} linhas)")
+
+    exportado = ler_exportacao(destino)
+    with app.engine.connect() as conn:
+        no_banco = dict(conn.execute(text("SELECT id, versao FROM avaliacoes")).all())
+    confere = dict(zip(exportado["id"].tolist(), exportado["versao"].tolist())) == no_banco
+    print(f"ler_exportacao reproduz o banco: {'sim' if confere else 'NÃO'} ({len(exportado)} avaliações)")
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Benchmark da memória do histórico: projeção de colunas e tipos compactos.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_historico_memoria [--avaliacoes 100000]
+#
+# Gera um banco sintético e carrega --avaliacoes linhas do histórico numa
+# "página" só, de duas formas: como era (todas as colunas da tabela, textos
+# livres inclusive, com os tipos que o pandas escolher) e como a grade
+# carrega agora (carregar_pagina_historico). Mostra o tempo, o pico de
+# memória durante a carga (tracemalloc) e o tamanho do DataFrame
+# resultante, por 100 mil linhas. Mede também a busca dos textos de uma
+# avaliação escolhida.
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+def medir(rotulo, carregar, linhas):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    df = carregar()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    escala = 100_000 / linhas
+    print(f"{rotulo:<24} {len(df)} linhas em {duracao:5.2f} s  pico {pico * escala / 1024 ** 2:6.1f} MB  "
+          f"DataFrame {df.memory_usage(index=True, deep=True).sum() * escala / 1024 ** 2:6.1f} MB  (por 100 mil linhas)")
+    return df
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=100_000)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'historico.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+    from checklist import colunas_mascara, decodificar_flags
+
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+    colunas_antes = [c for c in app.Avaliacao.__table__.columns if c.name not in app.CAMPOS_CHECKLIST] + colunas_mascara()
+
+    session = app.Session()
+    try:
+        antes = medir("todas as colunas", lambda: decodificar_flags(app.pd.read_sql(
+            session.query(*colunas_antes).order_by(app.Avaliacao.data_criacao.desc(), app.Avaliacao.id.desc())
+            .limit(args.avaliacoes).statement, session.bind), app.COLUNAS_EXPORTACAO), args.avaliacoes)
+        depois = medir("grade (projeção + tipos)",
+                       lambda: app.carregar_pagina_historico(session, tamanho_pagina=args.avaliacoes)[0], args.avaliacoes)
+        print(f"mesmas linhas: {'sim' if antes['id'].tolist() == depois['id'].tolist() else 'NÃO'}")
+
+        print("por coluna (MB por 100 mil linhas):")
+        escala = 100_000 / args.avaliacoes
+        uso_antes = antes.memory_usage(index=False, deep=True)
+        uso_depois = depois.memory_usage(index=False, deep=True)
+        for coluna in sorted(uso_antes.index, key=lambda c: -uso_antes[c])[:12]:
+            agora = f"{uso_depois[coluna] * escala / 1024 ** 2:6.2f} ({depois[coluna].dtype})" if coluna in uso_depois else "  fora"
+            print(f"  {coluna:<28} {uso_antes[coluna] * escala / 1024 ** 2:6.2f} -> {agora}")
+
+        ids = depois['id'].sample(200, random_state=1).tolist()
+        tempos = []
+        for avaliacao_id in ids:
+            inicio = time.perf_counter()
+            app.carregar_textos(session, avaliacao_id)
+            tempos.append(time.perf_counter() - inicio)
+        print(f"textos da avaliação escolhida: mediana {statistics.median(tempos) * 1000:.2f} ms")
+    finally:
+        session.close()
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark da importação de CSV em lote.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_importacao [--linhas 100000] [--amostra-orm 1000]
+#
+# Gera um CSV no mesmo layout do "Baixar CSV", importa com importar_csv e
+# compara com o caminho antigo (session.add + commit por linha), medido numa
+# amostra e extrapolado. Usa um banco temporário.
+
+import argparse
+import csv
+import io
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+def gerar_csv(linhas, colunas):
+    rng = random.Random(42)
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(colunas)
+    inicio = date(2020, 1, 1)
+    for i in range(linhas):
+        valores = {
+            "id": i + 1,
+            "data_criacao": (inicio + timedelta(days=rng.randrange(1800))).isoformat(),
+            "cidade": "Angicos", "estado": "RN",
+            "profissional_responsavel": rng.choice(["Ana Souza", "Bruno Lima", "Carla Dias"]),
+            "paciente_nome": f"Paciente {i}", "responsavel_nome": f"Responsável {i}",
+            "data_nascimento": (inicio - timedelta(days=rng.randrange(365, 6000))).isoformat(),
+            "sexo": rng.choice("MF"), "imc_escore_z": "",
+            "motivo_atendimento": "Avaliação inicial encaminhada pela escola.",
+            "peso": f"{rng.uniform(10, 60):.1f}", "altura": f"{rng.uniform(0.8, 1.7):.2f}", "imc": "17.5",
+            "classificacao_nutricional": "Eutrofia (Peso adequado)", "classificacao_odonto": "Rotina",
+            "encaminhamento_origem": "UBS", "observacao_comportamento": "", "queixa_alimentar": "",
+            "proxima_avaliacao": (inicio + timedelta(days=rng.randrange(1900))).isoformat(),
+        }
+        escritor.writerow([valores.get(c, rng.choice(["True", "False"])) for c in colunas])
+    saida.seek(0)
+    return saida
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--amostra-orm", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+
+    arquivo = gerar_csv(args.linhas, app.COLUNAS_EXPORTACAO)
+    inicio = time.perf_counter()
+    inseridas, erros, _ = app.importar_csv(arquivo)
+    duracao = time.perf_counter() - inicio
+    print(f"importar_csv: {inseridas} linhas em {duracao:.2f} s ({inseridas / duracao:,.0f} linhas/s), {len(erros)} erros")
+
+    # Caminho antigo: um objeto ORM e um commit por linha
+    amostra = app.pd.read_csv(gerar_csv(args.amostra_orm, app.COLUNAS_EXPORTACAO))
+    registros = amostra.drop(columns=[*app.COLUNAS_CONTROLE, "data_criacao", "proxima_avaliacao", "data_nascimento"],
+                            errors="ignore").to_dict("records")
+    inicio = time.perf_counter()
+    for registro in registros:
+        session = app.Session()
+        session.add(app.Avaliacao(**registro))
+        session.commit()
+        session.close()
+    duracao_orm = time.perf_counter() - inicio
+    taxa_orm = len(registros) / duracao_orm
+    print(f"ORM por linha: {taxa_orm:,.0f} linhas/s (estimado {args.linhas / taxa_orm:.1f} s para {args.linhas} linhas)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Benchmark de inicialização: tempo até a tela de login e custo por rerun.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_inicio [--execucoes 5] [--reruns 20]
+#
+# Cada execução roda num interpretador novo (importações "frias"): importa o
+# Streamlit e executa streamlit_app.py uma vez com o AppTest (tela de login,
+# banco temporário). O custo de um rerun é medido reexecutando o script
+# compilado, como o Streamlit faz a cada interação (o AppTest acrescenta
+# esperas próprias). Mostra também quais dependências pesadas já estavam
+# carregadas ao fim da tela de login.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CODIGO = r"""
+import json, logging, os, statistics, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+importado = time.perf_counter()
+at = AppTest.from_file("streamlit_app.py", default_timeout=120)
+at.run()
+login = time.perf_counter()
+assert not at.exception, at.exception
+pesados = [m for m in ("pandas", "numpy", "fpdf", "pyarrow") if m in sys.modules]
+with open("streamlit_app.py", encoding="utf-8") as f:
+    script = compile(f.read(), "streamlit_app.py", "exec")
+reruns = []
+for _ in range(int(sys.argv[1])):
+    t = time.perf_counter()
+    exec(script, {"__name__": "__main__"})
+    reruns.append(time.perf_counter() - t)
+print(json.dumps({
+    "streamlit_ms": (importado - inicio) * 1000,
+    "tela_login_ms": (login - importado) * 1000,
+    "rerun_ms": statistics.median(reruns) * 1000,
+    "pesados": pesados,
+}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--execucoes", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    medidas = []
+    for _ in range(args.execucoes):
+        ambiente = dict(os.environ, CAPS_DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'inicio.db')}")
+        saida = subprocess.run([sys.executable, "-c", CODIGO, str(args.reruns)], capture_output=True, text=True,
+                               env=ambiente, check=True).stdout
+        medidas.append(json.loads(saida.strip().splitlines()[-1]))
+
+    for chave, rotulo in [("streamlit_ms", "import streamlit"), ("tela_login_ms", "até a tela de login"),
+                          ("rerun_ms", "rerun da tela de login")]:
+        print(f"{rotulo:<24} mediana {statistics.median(m[chave] for m in medidas):8.1f} ms")
+    print(f"{'já carregados':<24} {', '.join(medidas[-1]['pesados']) or '(nenhum)'}")
+
+if __name__ == "__main__":
+    main()
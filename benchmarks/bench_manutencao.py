@@ -0,0 +1,125 @@
+# Benchmark das rotinas de manutenção do banco.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_manutencao [--avaliacoes 200000] [--excluir 0.3] [--salvamentos 200]
+#
+# Gera um banco sintético, exclui a fração --excluir das avaliações (como
+# muitos delete_avaliacao) e mede cada rotina de manutencao.py:
+#   - estatisticas: tempo do ANALYZE e das consultas do dia a dia (contagem
+#     e página filtrada do histórico, typeahead, linha do tempo) antes e
+#     depois das estatísticas;
+#   - backup: tempo da cópia e latência de save_avaliacao enquanto ela
+#     roda, contra a latência sem backup (em WAL o backup não deve travar
+#     quem grava);
+#   - vacuum: páginas devolvidas pelo incremental e, depois, o que um VACUUM
+#     completo ainda ganha (exclusões espalhadas deixam páginas meio vazias,
+#     que só ele junta), com o tamanho do arquivo depois de cada um;
+#   - verificacao: tempo do quick_check.
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+
+TERMOS = ["ana", "silva", "pedro", "mar", "agitação", "escola", "joão souza", "cardoso"]
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def mediana_ms(funcao, argumentos):
+    tempos = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcao(argumento)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=200_000)
+    parser.add_argument("--excluir", type=float, default=0.3, help="fração das avaliações excluídas antes das medições")
+    parser.add_argument("--salvamentos", type=int, default=200)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, "manutencao.db")
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{caminho}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # as rotinas rodam na hora certa, chamadas daqui
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+    from busca import sugerir_avaliacoes
+    from manutencao import Manutencao
+    from pacientes import consultar_linha_do_tempo
+    from sqlalchemy import text
+
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+    with app.engine.begin() as conn:
+        excluidas = conn.execute(text("DELETE FROM avaliacoes WHERE abs(random()) % 1000 < :limite"),
+                                 {"limite": int(args.excluir * 1000)}).rowcount
+        pacientes = [p for (p,) in conn.execute(text(
+            "SELECT id FROM pacientes WHERE unificado_em IS NULL ORDER BY random() LIMIT 200"))]
+    print(f"{args.avaliacoes} avaliações geradas, {excluidas} excluídas; arquivo com "
+          f"{os.path.getsize(caminho) / 1024 ** 2:.1f} MB")
+    manutencao = Manutencao(app.engine, os.path.join(pasta, "backups"), agendar=False)
+
+    def rotina(nome, **opcoes):
+        inicio = time.perf_counter()
+        resultado, detalhes = manutencao.executar(nome, **opcoes)
+        print(f"{nome:<13} {resultado:<9} {time.perf_counter() - inicio:6.2f} s  {detalhes}")
+
+    def consultas(rotulo):
+        session = app.Session()
+        try:
+            conn = session.connection()
+            contagem = mediana_ms(lambda termo: app.contar_avaliacoes(session, termo), TERMOS)
+            pagina = mediana_ms(lambda termo: app.carregar_pagina_historico(session, termo), TERMOS)
+            busca = mediana_ms(lambda termo: sugerir_avaliacoes(conn, termo), TERMOS * 3)
+            linhas = mediana_ms(lambda p: consultar_linha_do_tempo(conn, p), pacientes)
+        finally:
+            session.close()
+        print(f"{rotulo:<13} contagem {contagem:7.2f} ms  página filtrada {pagina:7.2f} ms  "
+              f"typeahead {busca:6.2f} ms  linha do tempo {linhas:6.2f} ms  (medianas)")
+
+    consultas("sem ANALYZE")
+    rotina("estatisticas")
+    consultas("com ANALYZE")
+
+    def salvar(quantidade):
+        latencias = []
+        for i in range(quantidade):
+            inicio = time.perf_counter()
+            app.save_avaliacao({"paciente_nome": f"Paciente Bench {i}", "data_criacao": date(2026, 7, 1),
+                                "peso": 20.0, "altura": 1.1, "imc": 16.5})
+            latencias.append(time.perf_counter() - inicio)
+        return latencias
+
+    sem_backup = salvar(args.salvamentos)
+    durante = []
+    backup = threading.Thread(target=rotina, args=("backup",))
+    backup.start()
+    while backup.is_alive():
+        durante += salvar(1)
+    backup.join()
+    for rotulo, latencias in (("sem backup", sem_backup), ("durante", durante)):
+        if latencias:
+            print(f"{rotulo:<13} {len(latencias):5d} salvamentos  p50 {percentil(latencias, 0.5) * 1000:6.1f} ms  "
+                  f"p95 {percentil(latencias, 0.95) * 1000:6.1f} ms  máx {max(latencias) * 1000:6.1f} ms")
+
+    rotina("vacuum")
+    print(f"arquivo com {os.path.getsize(caminho) / 1024 ** 2:.1f} MB depois do vacuum incremental")
+    rotina("vacuum", completo=True)
+    print(f"arquivo com {os.path.getsize(caminho) / 1024 ** 2:.1f} MB depois do vacuum completo")
+    rotina("verificacao")
+    manutencao.fechar()
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
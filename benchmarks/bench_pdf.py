@@ -0,0 +1,86 @@
+# Benchmark da geração de fichas em PDF (PDFs por segundo).
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_pdf [--quantidade 500]
+#
+# Mede a renderização a partir do modelo pré-calculado, os acertos do
+# CachePDF, o lote em ZIP com o pool de processos e o PDF único. Parte dos
+# registros vem sem peso, altura e IMC (importações antigas) e parte vem
+# repetida (a mesma avaliação no arquivo morto e no principal); o lote
+# confere que cada avaliação entrou uma vez no ZIP e o PDF único, que passa
+# de MAX_LOTE_UNICO é recusado.
+
+import argparse
+import io
+import time
+import zipfile
+from datetime import date
+from types import SimpleNamespace
+
+from ficha_pdf import MAX_LOTE_UNICO, CachePDF, gerar_pdf, gerar_lote_unico, gerar_lote_zip, modelo_ficha
+
+def registro_exemplo(i):
+    medidas = dict(peso=None, altura=None, imc=None) if i % 50 == 7 else dict(peso=22.5, altura=1.18, imc=16.16)
+    return dict(
+        id=i, data_criacao=date(2025, 1, 1 + i % 28), cidade="Angicos", estado="RN",
+        profissional_responsavel="Ana Souza", paciente_nome=f"João da Silva {i}",
+        data_nascimento=date(2018, 3, 1 + i % 28), sexo="MF"[i % 2],
+        crianca_identificada=True, responsavel_presente=True, responsavel_nome="Maria da Conceição",
+        motivo_atendimento="Dificuldade de interação na escola " * 3, encaminhamento_origem="UBS Centro",
+        observacao_comportamento="Calmo, colaborativo", caderneta_apresentada=True,
+        vacinas_conferidas=True, esquema_completo=i % 2 == 0, vacinas_atraso=i % 2 == 1,
+        orientacao_responsavel_vacina=True, encaminhamento_ubs_vacina=False,
+        **medidas, classificacao_nutricional="Eutrofia (Peso adequado)",
+        queixa_alimentar="Seletividade", orientacao_nutricional=True, encaminhamento_nutricao=False,
+        higiene_bucal=True, carie_visivel=i % 3 == 0, dor_relatada=False, orientacao_higiene_bucal=True,
+        encaminhamento_odontologico=False, classificacao_odonto="Rotina", inserido_caps=True,
+        encaminhamento_ubs_plano=False, encaminhamento_nutricao_plano=False,
+        encaminhamento_odonto_plano=False, encaminhamento_assistencia_social=True,
+        proxima_avaliacao=date(2025, 6, 1), registro_prontuario=True, imc_escore_z=None,
+    )
+
+def medir(nome, quantidade, funcao):
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<28} {quantidade / duracao:10.1f} PDFs/s  ({duracao * 1000 / quantidade:.3f} ms/PDF)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quantidade", type=int, default=500)
+    args = parser.parse_args()
+    n = args.quantidade
+    registros = [registro_exemplo(i) for i in range(n)]
+    dados = [SimpleNamespace(**r) for r in registros]
+
+    inicio = time.perf_counter()
+    modelo_ficha()
+    print(f"{'modelo (uma vez)':<28} {(time.perf_counter() - inicio) * 1000:10.1f} ms")
+
+    medir("gerar_pdf", n, lambda: [gerar_pdf(d) for d in dados])
+
+    cache = CachePDF()
+    for d in dados:
+        cache.obter(d.id, 1, lambda: gerar_pdf(d))
+    medir("CachePDF (acertos)", n, lambda: [cache.obter(d.id, 1, None) for d in dados])
+
+    destino = io.BytesIO()
+    repetidos = registros[:n // 10] + registros
+    medir("lote ZIP (processos)", n, lambda: gerar_lote_zip(iter(repetidos), destino))
+    with zipfile.ZipFile(destino) as zf:
+        nomes = zf.namelist()
+    if len(nomes) != n or len(set(nomes)) != n:
+        raise SystemExit(f"lote ZIP com {len(nomes)} fichas ({len(set(nomes))} distintas) de {n}")
+
+    unico = min(n, MAX_LOTE_UNICO)
+    medir("PDF único", unico, lambda: gerar_lote_unico(iter(repetidos[:unico + n // 10]), io.BytesIO()))
+    if n > MAX_LOTE_UNICO:
+        try:
+            gerar_lote_unico(iter(registros), io.BytesIO())
+        except ValueError:
+            pass
+        else:
+            raise SystemExit(f"PDF único aceitou {n} avaliações (limite {MAX_LOTE_UNICO})")
+
+if __name__ == "__main__":
+    main()
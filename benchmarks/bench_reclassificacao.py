@@ -0,0 +1,87 @@
+# Benchmark do escore z de IMC para idade e da reclassificação em lote.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_reclassificacao [--avaliacoes 1000000] [--amostra 20000]
+#
+# Gera um banco sintético e mede:
+#   - o escore z e a classificação de todas as avaliações de uma vez
+#     (NumPy), contra avaliar() linha a linha numa --amostra, extrapolado;
+#   - a passada completa de reclassificar_avaliacoes, só relatório e
+#     gravando as correções, e uma segunda passada (que não deve corrigir
+#     mais nada).
+#
+# As tabelas L, M, S usadas aqui são SINTÉTICAS (formato das tabelas da
+# OMS, valores inventados): servem só para medir tempo, não para
+# classificar ninguém. O custo não depende dos valores.
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+def gravar_tabelas_sinteticas(pasta):
+    meses = np.arange(0, 229)
+    anos = meses / 12
+    for sexo, prefixo, ajuste in (("M", "imc_idade_meninos", 0.0), ("F", "imc_idade_meninas", -0.2)):
+        mediana = 15.5 + ajuste + 0.35 * np.maximum(anos - 6, 0) - 0.15 * np.minimum(anos, 6) + 0.9 * np.exp(-anos)
+        with open(os.path.join(pasta, f"{prefixo}_sintetica.csv"), "w") as f:
+            f.write("Month\tL\tM\tS\n")
+            for m, a, med in zip(meses, anos, mediana):
+                f.write(f"{m}\t{-1.6 + 0.05 * a:.4f}\t{med:.4f}\t{0.08 + 0.002 * a:.5f}\n")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=1_000_000)
+    parser.add_argument("--amostra", type=int, default=20_000, help="linhas do cálculo linha a linha")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(pasta, 'reclassificacao.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+    from benchmarks.dados_sinteticos import popular_banco
+    from crescimento import ReferenciaIMC, avaliar, calcular_imc, classificar_imc, idade_em_meses, reclassificar_avaliacoes
+
+    inicio = time.perf_counter()
+    popular_banco(app.engine, args.avaliacoes, ate=date(2026, 6, 30))
+    print(f"{args.avaliacoes} avaliações geradas em {time.perf_counter() - inicio:.1f} s")
+    gravar_tabelas_sinteticas(pasta)
+    referencia = ReferenciaIMC.carregar(pasta)
+
+    df = app.pd.read_sql("SELECT data_criacao, data_nascimento, sexo, peso, altura FROM avaliacoes", app.engine)
+    inicio = time.perf_counter()
+    imc = calcular_imc(df["peso"], df["altura"])
+    idade = idade_em_meses(df["data_nascimento"], df["data_criacao"])
+    z = referencia.escore_z(imc, idade, df["sexo"])
+    classes = classificar_imc(z, idade)
+    vetorizado = time.perf_counter() - inicio
+    print(f"vetorizado      {len(df)} linhas em {vetorizado:6.2f} s  ({len(df) / vetorizado:10,.0f} linhas/s)")
+
+    amostra = df.head(args.amostra)
+    inicio = time.perf_counter()
+    por_linha = [avaliar(referencia, l.peso, l.altura, l.data_nascimento, l.data_criacao, l.sexo)
+                 for l in amostra.itertuples(index=False)]
+    duracao = time.perf_counter() - inicio
+    print(f"linha a linha   {len(amostra)} linhas em {duracao:6.2f} s  ({len(amostra) / duracao:10,.0f} linhas/s; "
+          f"{len(df) * duracao / len(amostra):.0f} s estimados para todas, {len(df) * duracao / len(amostra) / vetorizado:.0f}x)")
+    iguais = all((c or None) == (classes[i] or None) for i, (_, _, c) in enumerate(por_linha))
+    print(f"mesmas classificações: {'sim' if iguais else 'NÃO'}")
+
+    for rotulo, corrigir in (("relatório", False), ("corrigindo", True), ("de novo", True)):
+        inicio = time.perf_counter()
+        contagem, divergentes = reclassificar_avaliacoes(app.engine, referencia, corrigir)
+        duracao = time.perf_counter() - inicio
+        print(f"{rotulo:<15} {contagem['avaliacoes']} linhas em {duracao:6.2f} s  "
+              f"({contagem['avaliacoes'] / duracao:10,.0f} linhas/s)  classificadas {contagem['classificadas']}  "
+              f"divergentes {len(divergentes)}  corrigidas {contagem['corrigidas']}")
+    app.engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Benchmark da sincronização entre unidades.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_sincronizacao [--avaliacoes 100000] [--alteradas 500] [--banda 1000]
+#
+# Gera dois bancos sintéticos (duas unidades, --avaliacoes cada) e mede:
+# a primeira sincronização completa nos dois sentidos; um "dia" de trabalho
+# em cada unidade (avaliações novas, edições, exclusões e algumas avaliações
+# editadas nas duas) sincronizado de forma incremental; uma sincronização
+# sem nenhuma mudança; e a reaplicação do mesmo pacote. Mostra o tamanho de
+# cada pacote e quanto ele levaria num link de --banda kbit/s, e no fim
+# confere se as duas unidades ficaram com o mesmo conteúdo.
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avaliacoes", type=int, default=100_000, help="por unidade")
+    parser.add_argument("--alteradas", type=int, default=500, help="avaliações novas e editadas por unidade no 'dia'")
+    parser.add_argument("--banda", type=int, default=1000, help="velocidade do link, em kbit/s")
+    args = parser.parse_args()
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from banco import criar_engine
+    from benchmarks.dados_sinteticos import popular_banco
+    from esquema import preparar_banco
+    from sincronizacao import aplicar_alteracoes, colunas_sincronizadas, exportar_alteracoes, hash_conteudo, unidade
+    from sqlalchemy import text
+
+    pasta = tempfile.mkdtemp()
+    sem_margem = timedelta(0)
+    unidades = {}
+    for nome, semente in [("angicos", 1), ("lajes", 2)]:
+        engine = criar_engine(f"sqlite:///{os.path.join(pasta, nome + '.db')}")
+        preparar_banco(engine)
+        inicio = time.perf_counter()
+        popular_banco(engine, args.avaliacoes, semente=semente, ate=date(2026, 6, 30))
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE sincronizacao_site SET nome = :nome"), {"nome": nome})
+        print(f"{nome}: {args.avaliacoes} avaliações geradas em {time.perf_counter() - inicio:.1f} s")
+        unidades[nome] = engine
+    a, b = unidades["angicos"], unidades["lajes"]
+    with a.connect() as conn:
+        site_a = unidade(conn)[0]
+    with b.connect() as conn:
+        site_b = unidade(conn)[0]
+    marcas = {}
+
+    def enviar(rotulo, origem, destino, site_destino, reaplicar=False):
+        caminho = os.path.join(pasta, "pacote.jsonl.gz")
+        exportado = exportar_alteracoes(origem, caminho, desde=marcas.get((origem, destino)), para=site_destino,
+                                        margem=sem_margem)
+        aplicado = aplicar_alteracoes(destino, caminho)
+        marcas[(origem, destino)] = exportado["ate"]
+        link = exportado["bytes"] * 8 / 1000 / args.banda
+        print(f"{rotulo:<34} {exportado['avaliacoes']:7d} aval. {exportado['exclusoes']:4d} excl.  "
+              f"{exportado['bytes'] / 1024:8.0f} KB ({link:6.1f} s no link)  "
+              f"exportar {exportado['segundos']:5.2f} s  aplicar {aplicado['segundos']:5.2f} s  "
+              f"conflitos {aplicado['conflitos']}")
+        if reaplicar:
+            de_novo = aplicar_alteracoes(destino, caminho)
+            mudou = de_novo["inseridas"] + de_novo["atualizadas"] + de_novo["excluidas"]
+            print(f"{'  mesmo pacote de novo':<34} {mudou} mudanças em {de_novo['segundos']:.2f} s")
+
+    enviar("completa angicos -> lajes", a, b, site_b)
+    enviar("completa lajes -> angicos", b, a, site_a)
+
+    # Um "dia" em cada unidade; parte das avaliações é editada nas duas
+    rng = random.Random(42)
+    with a.connect() as conn:
+        comuns = [u for (u,) in conn.execute(text("SELECT uuid FROM avaliacoes"))]
+    editadas_nas_duas = rng.sample(comuns, args.alteradas // 10)
+    for engine, nome in [(a, "angicos"), (b, "lajes")]:
+        escolhidas = rng.sample(comuns, args.alteradas) + editadas_nas_duas
+        excluidas = rng.sample(comuns, args.alteradas // 10)
+        agora = lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO avaliacoes (paciente_nome, data_criacao, peso, altura, imc, versao, atualizado_em) "
+                "VALUES (:nome, '2026-07-01', 20.0, 1.1, 16.5, 1, :agora)"
+            ), [{"nome": f"Paciente Novo {nome} {i}", "agora": agora()} for i in range(args.alteradas)])
+            conn.execute(text(
+                "UPDATE avaliacoes SET peso = :peso, versao = versao + 1, atualizado_em = :agora WHERE uuid = :uuid"
+            ), [{"uuid": u, "peso": rng.uniform(10, 40), "agora": agora()} for u in escolhidas])
+            conn.execute(text("DELETE FROM avaliacoes WHERE uuid = :uuid"),
+                         [{"uuid": u} for u in excluidas if u not in escolhidas])
+
+    enviar("incremental angicos -> lajes", a, b, site_b, reaplicar=True)
+    enviar("incremental lajes -> angicos", b, a, site_a)
+    enviar("incremental angicos -> lajes", a, b, site_b)
+    enviar("sem mudanças lajes -> angicos", b, a, site_a)
+
+    colunas = colunas_sincronizadas()
+    conteudos = []
+    for engine in (a, b):
+        with engine.connect() as conn:
+            conteudos.append({u: hash_conteudo(colunas, v) for u, *v in conn.execute(
+                text(f"SELECT uuid, {', '.join(colunas)} FROM avaliacoes"))})
+    print(f"unidades iguais: {'sim' if conteudos[0] == conteudos[1] else 'NÃO'} "
+          f"({len(conteudos[0])} e {len(conteudos[1])} avaliações)")
+    for engine in (a, b):
+        engine.dispose()
+    shutil.rmtree(pasta)
+
+if __name__ == "__main__":
+    main()
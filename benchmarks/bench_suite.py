@@ -0,0 +1,209 @@
+# Suíte de benchmarks de ponta a ponta do app.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.bench_suite [--tamanhos 10000 100000] [--repeticoes 20] > resultados.json
+#     python -m benchmarks.bench_suite --comparar base.json [--tolerancia 0.2] > novo.json
+#
+# Para cada tamanho, gera um banco sintético (benchmarks.dados_sinteticos)
+# num diretório temporário e mede os caminhos quentes de streamlit_app.py:
+# histórico, busca por nome, exportação CSV, PDF, salvar/editar/excluir,
+# login, painel, retornos e linha do tempo do paciente. A tabela legível vai para stderr e o JSON para
+# stdout (ou --saida), um registro por (tamanho, operação). Com --comparar,
+# lista as operações cuja mediana piorou além da tolerância e sai com
+# código 1, para uso em CI.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+def versao_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def resumir(tempos):
+    ordenados = sorted(tempos)
+    return {
+        "n": len(tempos),
+        "mediana_ms": round(statistics.median(tempos) * 1000, 3),
+        "p95_ms": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 3),
+        "min_ms": round(ordenados[0] * 1000, 3),
+        "media_ms": round(statistics.fmean(tempos) * 1000, 3),
+    }
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    # `preparar` roda antes de cada repetição, fora da medição, e o que ela
+    # retorna é passado para `funcao`
+    tempos = []
+    for i in range(repeticoes):
+        argumento = preparar(i) if preparar else None
+        inicio = time.perf_counter()
+        funcao(argumento) if preparar else funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+def medir_tamanho(app, tamanho, repeticoes, semente, ate):
+    from benchmarks.dados_sinteticos import SENHA_PADRAO, popular_banco
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'suite_{tamanho}.db')}"
+    app.engine, app.Session = app.iniciar_banco(url)
+    inicio = time.perf_counter()
+    usuarios = popular_banco(app.engine, tamanho, semente=semente, ate=ate)
+    resultados = {"popular_banco": [time.perf_counter() - inicio]}
+
+    rng = random.Random(semente)
+    session = app.Session()
+    try:
+        ids = [i for (i,) in session.query(app.Avaliacao.id)]
+        nomes = [n for (n,) in session.query(app.Avaliacao.paciente_nome).limit(1000)]
+        pacientes = [i for (i,) in session.query(app.Avaliacao.paciente_id).limit(1000)]
+        # Cursor do meio do histórico, para medir uma página "profunda"
+        meio = session.query(app.Avaliacao.data_criacao, app.Avaliacao.id).order_by(
+            app.Avaliacao.data_criacao.desc(), app.Avaliacao.id.desc()).offset(tamanho // 2).first()
+        cursor_meio = (meio.data_criacao, meio.id)
+
+        def pagina(cursor=None, filtro=None):
+            app.contar_avaliacoes(session, filtro)
+            app.carregar_pagina_historico(session, filtro, tamanho_pagina=50, cursor=cursor)
+
+        resultados["historico_primeira_pagina"] = cronometrar(lambda: pagina(), repeticoes)
+        resultados["historico_pagina_profunda"] = cronometrar(lambda: pagina(cursor_meio), repeticoes)
+        resultados["busca_nome"] = cronometrar(
+            lambda termo: (pagina(filtro=termo), app.sugerir_avaliacoes(session.connection(), termo)),
+            repeticoes, preparar=lambda i: rng.choice(nomes).split()[rng.randrange(3)][:4],
+        )
+
+        hoje = ate or date.today()
+        resultados["painel"] = cronometrar(lambda: app.consultar_resumos(session.connection()), repeticoes)
+        resultados["retornos"] = cronometrar(lambda: (
+            app.atualizar_agenda(app.engine, hoje),
+            app.contar_agenda(session.connection(), hoje),
+            app.consultar_agenda(session.connection(), "Atrasados", hoje),
+        ), repeticoes)
+
+        resultados["linha_do_tempo"] = cronometrar(
+            lambda paciente_id: app.consultar_linha_do_tempo(session.connection(), paciente_id),
+            repeticoes, preparar=lambda i: rng.choice(pacientes),
+        )
+
+        resultados["gerar_pdf"] = cronometrar(
+            app.gerar_pdf, repeticoes, preparar=lambda i: session.get(app.Avaliacao, rng.choice(ids)),
+        )
+    finally:
+        session.close()
+
+    # O CSV inteiro é caro nos tamanhos grandes: poucas repetições
+    resultados["exportar_csv"] = cronometrar(lambda: app.gerar_csv_avaliacoes().close(), max(1, repeticoes // 10))
+
+    dados = {
+        "paciente_nome": "Paciente Benchmark", "profissional_responsavel": "Ana Souza",
+        "motivo_atendimento": "Avaliação inicial.", "peso": 20.0, "altura": 1.1, "imc": 16.5,
+    }
+    novos = []
+
+    def salvar():
+        app.save_avaliacao(dict(dados))
+        novos.append(None)
+    resultados["save_avaliacao_nova"] = cronometrar(salvar, repeticoes)
+
+    def linha_original(i):
+        session = app.Session()
+        try:
+            a = session.get(app.Avaliacao, rng.choice(ids))
+            return {c.name: getattr(a, c.name) for c in a.__table__.columns}
+        finally:
+            session.close()
+    resultados["save_avaliacao_edicao"] = cronometrar(
+        lambda o: app.save_avaliacao(
+            {k: v for k, v in o.items() if k not in app.COLUNAS_CONTROLE} | {"peso": (o["peso"] or 0) + 1}, o["id"], o,
+        ),
+        repeticoes, preparar=linha_original,
+    )
+
+    session = app.Session()
+    try:
+        ids_novos = [i for (i,) in session.query(app.Avaliacao.id).order_by(app.Avaliacao.id.desc()).limit(len(novos))]
+    finally:
+        session.close()
+    resultados["delete_avaliacao"] = cronometrar(app.delete_avaliacao, len(ids_novos), preparar=lambda i: ids_novos[i])
+
+    resultados["login"] = cronometrar(
+        lambda u: app.login_user(u, SENHA_PADRAO), repeticoes,
+        preparar=lambda i: usuarios[i % len(usuarios)]["username"],
+    )
+    app.engine.dispose()
+    return resultados
+
+def comparar(atual, base, tolerancia):
+    anteriores = {(r["tamanho"], r["operacao"]): r for r in base["resultados"]}
+    pioras = []
+    for r in atual["resultados"]:
+        antes = anteriores.get((r["tamanho"], r["operacao"]))
+        if antes and r["mediana_ms"] > antes["mediana_ms"] * (1 + tolerancia):
+            pioras.append((r, antes))
+    return pioras
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--ate", type=date.fromisoformat, default=date(2026, 6, 30),
+                        help="data da avaliação mais recente nos dados gerados")
+    parser.add_argument("--saida", help="grava o JSON neste arquivo em vez do stdout")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora relativa aceita na mediana")
+    args = parser.parse_args()
+
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'inicial.db')}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # sem backup nem vacuum no meio das medições
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+
+    saida = {
+        "versao": versao_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "parametros": {"tamanhos": args.tamanhos, "repeticoes": args.repeticoes,
+                       "semente": args.semente, "ate": args.ate.isoformat()},
+        "resultados": [],
+    }
+    for tamanho in args.tamanhos:
+        print(f"--- {tamanho} avaliações ---", file=sys.stderr)
+        for operacao, tempos in medir_tamanho(app, tamanho, args.repeticoes, args.semente, args.ate).items():
+            r = {"tamanho": tamanho, "operacao": operacao, **resumir(tempos)}
+            saida["resultados"].append(r)
+            print(f"{operacao:<28} mediana {r['mediana_ms']:10.2f} ms   p95 {r['p95_ms']:10.2f} ms   (n={r['n']})",
+                  file=sys.stderr)
+
+    texto = json.dumps(saida, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            pioras = comparar(saida, json.load(f), args.tolerancia)
+        for r, antes in pioras:
+            print(f"PIORA {r['tamanho']} {r['operacao']}: {antes['mediana_ms']:.2f} -> {r['mediana_ms']:.2f} ms",
+                  file=sys.stderr)
+        if pioras:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Gerador de dados sintéticos para testes de carga.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m benchmarks.dados_sinteticos --banco /tmp/caps_100k.db [--avaliacoes 100000]
+#         [--usuarios 20] [--semente 42] [--ate 2026-06-30]
+#
+# Preenche users e avaliacoes com dados plausíveis: nomes em português,
+# crianças de 2 a 17 anos com data de nascimento, sexo (pelo nome), altura,
+# peso e IMC coerentes com a idade,
+# cada paciente com várias avaliações ao longo de cinco anos, marcações do
+# checklist com frequências realistas e textos livres. A mesma semente e a
+# mesma data final geram exatamente os mesmos dados. Grava em lotes com
+# executemany; os gatilhos (busca, resumos, agenda) rodam normalmente e, no
+# fim, as avaliações são ligadas ao cadastro de pacientes.
+
+import argparse
+import logging
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+NOMES = [
+    "Ana", "Maria", "Júlia", "Beatriz", "Larissa", "Gabriela", "Letícia", "Mariana", "Camila", "Isabela",
+    "Sofia", "Alice", "Helena", "Valentina", "Laura", "Manuela", "Lívia", "Yasmin", "Clara", "Heloísa",
+    "João", "Pedro", "Lucas", "Gabriel", "Matheus", "Enzo", "Miguel", "Arthur", "Davi", "Bernardo",
+    "Heitor", "Rafael", "Gustavo", "Felipe", "Samuel", "Thiago", "Caio", "Vinícius", "Luiz", "Otávio",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues", "Almeida",
+    "Nascimento", "Araújo", "Carvalho", "Gomes", "Martins", "Rocha", "Ribeiro", "Alves", "Monteiro", "Mendes",
+    "Barros", "Freitas", "Barbosa", "Pinto", "Moura", "Cavalcanti", "Dias", "Castro", "Campos", "Cardoso",
+]
+CIDADES = ["Angicos"] * 12 + ["Pedro Avelino", "Fernando Pedroza", "Lajes", "Afonso Bezerra", "Caiçara do Rio do Vento"]
+ORIGENS = ["UBS Centro", "UBS Alto da Alegria", "Escola Municipal", "Conselho Tutelar", "Demanda espontânea",
+           "CRAS", "Hospital Regional", "Pediatria"]
+MOTIVOS = [
+    "Dificuldade de interação com colegas na escola.",
+    "Atraso na fala relatado pela família.",
+    "Agitação e dificuldade de concentração em sala de aula.",
+    "Episódios de choro frequente e isolamento.",
+    "Comportamento agressivo em casa.",
+    "Suspeita de transtorno do espectro autista.",
+    "Baixo rendimento escolar.",
+    "Alterações do sono e irritabilidade.",
+    "Encaminhada após avaliação pediátrica.",
+    "Seletividade alimentar importante.",
+]
+OBSERVACOES = [
+    "Criança calma e colaborativa durante o acolhimento.",
+    "Pouco contato visual, brincou sozinha a maior parte do tempo.",
+    "Muito agitada, não permaneceu sentada.",
+    "Interagiu bem com a equipe após alguns minutos.",
+    "Chorou na separação do responsável.",
+    "Respondeu às perguntas com frases curtas.",
+    "",
+]
+QUEIXAS = ["Seletividade alimentar", "Recusa de verduras", "Come pouco", "Excesso de doces", "Engasgos frequentes"]
+
+# Probabilidade de cada item do checklist vir marcado
+PROBABILIDADES = {
+    "crianca_identificada": 0.97, "responsavel_presente": 0.92,
+    "caderneta_apresentada": 0.75, "vacinas_conferidas": 0.72, "esquema_completo": 0.62,
+    "vacinas_atraso": 0.18, "orientacao_responsavel_vacina": 0.55, "encaminhamento_ubs_vacina": 0.15,
+    "orientacao_nutricional": 0.45, "encaminhamento_nutricao": 0.12,
+    "higiene_bucal": 0.70, "carie_visivel": 0.28, "dor_relatada": 0.09,
+    "orientacao_higiene_bucal": 0.60, "encaminhamento_odontologico": 0.22,
+    "inserido_caps": 0.65, "encaminhamento_ubs_plano": 0.20, "encaminhamento_nutricao_plano": 0.10,
+    "encaminhamento_odonto_plano": 0.15, "encaminhamento_assistencia_social": 0.12, "registro_prontuario": 0.90,
+}
+
+TAMANHO_LOTE = 10_000
+AVALIACOES_POR_PACIENTE = 3  # em média
+SENHA_PADRAO = "senha123"
+
+def nome_paciente(pid):
+    # Determinístico: o mesmo paciente tem sempre o mesmo nome
+    return (f"{NOMES[pid % len(NOMES)]} {SOBRENOMES[pid // len(NOMES) % len(SOBRENOMES)]} "
+            f"{SOBRENOMES[pid // (len(NOMES) * len(SOBRENOMES)) % len(SOBRENOMES)]}")
+
+def nome_responsavel(pid):
+    return f"{NOMES[(pid * 7 + 3) % 20]} {SOBRENOMES[pid // len(NOMES) % len(SOBRENOMES)]}"
+
+def gerar_usuarios(quantidade, semente=42):
+    rng = np.random.default_rng(semente)
+    usuarios = []
+    for i in range(quantidade):
+        nome = f"{NOMES[rng.integers(len(NOMES))]} {SOBRENOMES[rng.integers(len(SOBRENOMES))]}"
+        usuarios.append({
+            "username": f"{nome.lower().replace(' ', '.')}{i}",
+            "nome": nome,
+            "role": "admin" if i == 0 else "user",
+        })
+    return usuarios
+
+def gerar_lote(inicio, quantidade, total, profissionais, semente=42, ate=None):
+    # Colunas (listas) das avaliações inicio..inicio+quantidade-1 de `total`
+    rng = np.random.default_rng([semente, inicio])
+    ate = ate or date.today()
+    n = quantidade
+    pacientes = rng.integers(0, max(1, total // AVALIACOES_POR_PACIENTE), n)
+
+    # Idade de cada paciente na data final; avaliações antigas o pegam mais novo
+    dias_atras = rng.integers(0, 5 * 365, n)
+    datas = [ate - timedelta(days=int(d)) for d in dias_atras]
+    idade_final = 3 + pacientes * 2654435761 % 1500 / 100
+    idade = np.maximum(idade_final - dias_atras / 365, 2)
+    nascimentos = [ate - timedelta(days=int(a * 365)) for a in idade_final]
+    altura = np.round(0.86 + 0.055 * (idade - 2) + rng.normal(0, 0.04, n), 2)
+    mediana_imc = 15.8 + 0.22 * np.maximum(idade - 5, 0)
+    imc = np.clip(rng.normal(mediana_imc, 2.3), 11, 38)
+    peso = np.round(imc * altura ** 2, 1)
+    imc = np.round(peso / altura ** 2, 2)
+    z = (imc - mediana_imc) / 2.3
+    classificacao = np.select(
+        [z < -2, z > 2, z > 1], ["Baixo peso", "Obesidade", "Sobrepeso"], "Eutrofia (Peso adequado)"
+    ).astype(object)
+    nao_avaliado = rng.random(n) < 0.05
+    classificacao[nao_avaliado] = "Não avaliado"
+    peso = np.where(nao_avaliado, 0.0, peso)
+    altura = np.where(nao_avaliado, 0.0, altura)
+    imc = np.where(nao_avaliado, 0.0, imc)
+
+    colunas = {
+        "data_criacao": [d.isoformat() for d in datas],
+        "cidade": [CIDADES[i] for i in rng.integers(len(CIDADES), size=n)],
+        "estado": ["RN"] * n,
+        "profissional_responsavel": [profissionais[i] for i in rng.integers(len(profissionais), size=n)],
+        "paciente_nome": [nome_paciente(int(p)) for p in pacientes],
+        "data_nascimento": [d.isoformat() for d in nascimentos],
+        "sexo": ["F" if p % len(NOMES) < len(NOMES) // 2 else "M" for p in pacientes],
+        "responsavel_nome": [nome_responsavel(int(p)) for p in pacientes],
+        "motivo_atendimento": [
+            " ".join(MOTIVOS[(int(s) + passo) % len(MOTIVOS)] for passo in (0, 3, 7)[:k])
+            for s, k in zip(rng.integers(len(MOTIVOS), size=n), rng.integers(1, 4, n))
+        ],
+        "encaminhamento_origem": [ORIGENS[i] for i in rng.integers(len(ORIGENS), size=n)],
+        "observacao_comportamento": [OBSERVACOES[i] for i in rng.integers(len(OBSERVACOES), size=n)],
+        "peso": peso.tolist(),
+        "altura": altura.tolist(),
+        "imc": imc.tolist(),
+        "classificacao_nutricional": classificacao.tolist(),
+        "queixa_alimentar": [QUEIXAS[i] if q < 0.3 else "" for i, q in
+                             zip(rng.integers(len(QUEIXAS), size=n), rng.random(n))],
+    }
+    for campo, p in PROBABILIDADES.items():
+        colunas[campo] = (rng.random(n) < p).astype(int).tolist()
+    urgencia = (np.array(colunas["dor_relatada"]) == 1) | (rng.random(n) < 0.05)
+    colunas["classificacao_odonto"] = np.where(urgencia, "Urgência", "Rotina").tolist()
+    retorno = rng.choice([30, 60, 90, 180], n)
+    sem_retorno = rng.random(n) < 0.15
+    colunas["proxima_avaliacao"] = [
+        None if s else (d + timedelta(days=int(r))).isoformat() for d, r, s in zip(datas, retorno, sem_retorno)
+    ]
+    colunas["atualizado_em"] = [f"{d.isoformat()} 12:00:00.000000" for d in datas]
+    return colunas
+
+def popular_banco(engine, avaliacoes, usuarios=20, semente=42, ate=None, progresso=None):
+    # Grava usuários e avaliações; retorna a lista de usuários criados
+    from modelos import make_hash
+    from pacientes import vincular_pacientes
+
+    lista = gerar_usuarios(usuarios, semente)
+    senha = make_hash(SENHA_PADRAO)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+            [(u["username"], senha, u["role"]) for u in lista],
+        )
+        conn.commit()
+        profissionais = [u["nome"] for u in lista] or ["Profissional"]
+        for inicio in range(0, avaliacoes, TAMANHO_LOTE):
+            colunas = gerar_lote(inicio, min(TAMANHO_LOTE, avaliacoes - inicio), avaliacoes, profissionais, semente, ate)
+            nomes = list(colunas)
+            cursor.executemany(
+                f"INSERT INTO avaliacoes ({', '.join(nomes)}) VALUES ({', '.join('?' * len(nomes))})",
+                list(zip(*colunas.values())),
+            )
+            conn.commit()
+            if progresso:
+                progresso(min(inicio + TAMANHO_LOTE, avaliacoes))
+        cursor.close()
+    finally:
+        conn.close()
+    with engine.begin() as conexao:
+        vincular_pacientes(conexao)
+    return lista
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--banco", required=True, help="arquivo SQLite de destino (criado se não existir)")
+    parser.add_argument("--avaliacoes", type=int, default=100_000)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--ate", type=date.fromisoformat, default=None, help="data da avaliação mais recente (padrão: hoje)")
+    args = parser.parse_args()
+
+    os.environ["CAPS_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.banco)}"
+    os.environ["CAPS_MANUTENCAO"] = "0"  # só gera os dados
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import streamlit_app as app
+
+    inicio = time.perf_counter()
+    popular_banco(app.engine, args.avaliacoes, args.usuarios, args.semente, args.ate,
+                  progresso=lambda n: print(f"\r{n} avaliações", end="", flush=True))
+    duracao = time.perf_counter() - inicio
+    print(f"\n{args.avaliacoes} avaliações e {args.usuarios} usuários (senha '{SENHA_PADRAO}') "
+          f"em {duracao:.1f} s -> {args.banco}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import re
+from sqlalchemy import text, Integer, String, Date
+
+# --- BUSCA POR NOME (SQLite FTS5) ---
+#
+# Índice de texto completo sobre os nomes das avaliações. O tokenizador
+# unicode61 com remove_diacritics ignora acentos e maiúsculas, então "joao"
+# encontra "João". O conteúdo é externo (a própria tabela avaliacoes) e os
+# gatilhos abaixo atualizam o índice na mesma transação de cada INSERT,
+# UPDATE ou DELETE, inclusive os feitos por save_avaliacao e delete_avaliacao.
+
+DDL_BUSCA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS avaliacoes_fts USING fts5(
+        paciente_nome, responsavel_nome, profissional_responsavel,
+        content='avaliacoes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS avaliacoes_fts_ai AFTER INSERT ON avaliacoes BEGIN
+        INSERT INTO avaliacoes_fts(rowid, paciente_nome, responsavel_nome, profissional_responsavel)
+        VALUES (new.id, new.paciente_nome, new.responsavel_nome, new.profissional_responsavel);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS avaliacoes_fts_ad AFTER DELETE ON avaliacoes BEGIN
+        INSERT INTO avaliacoes_fts(avaliacoes_fts, rowid, paciente_nome, responsavel_nome, profissional_responsavel)
+        VALUES ('delete', old.id, old.paciente_nome, old.responsavel_nome, old.profissional_responsavel);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS avaliacoes_fts_au
+    AFTER UPDATE OF paciente_nome, responsavel_nome, profissional_responsavel ON avaliacoes BEGIN
+        INSERT INTO avaliacoes_fts(avaliacoes_fts, rowid, paciente_nome, responsavel_nome, profissional_responsavel)
+        VALUES ('delete', old.id, old.paciente_nome, old.responsavel_nome, old.profissional_responsavel);
+        INSERT INTO avaliacoes_fts(rowid, paciente_nome, responsavel_nome, profissional_responsavel)
+        VALUES (new.id, new.paciente_nome, new.responsavel_nome, new.profissional_responsavel);
+    END""",
+]
+
+def criar_indice_busca(engine):
+    with engine.begin() as conn:
+        existia = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'avaliacoes_fts'")).first()
+        for ddl in DDL_BUSCA:
+            conn.execute(text(ddl))
+        # Bancos que já tinham avaliações antes do índice existir
+        if not existia:
+            conn.execute(text("INSERT INTO avaliacoes_fts(avaliacoes_fts) VALUES ('rebuild')"))
+
+def expressao_busca(termo):
+    # Cada palavra vira um prefixo: "jo silva" -> "jo"* "silva"* (todas obrigatórias)
+    palavras = re.findall(r"\w+", termo or "")
+    return " ".join(f'"{p}"*' for p in palavras)
+
+def filtro_busca(termo):
+    # Condição para usar em query.filter(); None se o termo não tem palavras
+    expressao = expressao_busca(termo)
+    if not expressao:
+        return None
+    return text(
+        "avaliacoes.id IN (SELECT rowid FROM avaliacoes_fts WHERE avaliacoes_fts MATCH :busca)"
+    ).bindparams(busca=expressao)
+
+def sugerir_avaliacoes(conn, termo, limite=20):
+    # Typeahead: melhores correspondências, com peso maior para o nome do paciente
+    expressao = expressao_busca(termo)
+    if not expressao:
+        return []
+    consulta = text("""
+        SELECT a.id, a.paciente_nome, a.data_criacao
+        FROM avaliacoes_fts
+        JOIN avaliacoes a ON a.id = avaliacoes_fts.rowid
+        WHERE avaliacoes_fts MATCH :busca
+        ORDER BY bm25(avaliacoes_fts, 10.0, 2.0, 1.0), a.data_criacao DESC
+        LIMIT :limite
+    """).columns(id=Integer, paciente_nome=String, data_criacao=Date)
+    return conn.execute(consulta, {"busca": expressao, "limite": limite}).all()
@@ -0,0 +1,148 @@
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from banco import PRAGMAS_SQLITE
+
+# --- CACHE DE CONSULTAS (COMPARTILHADO ENTRE SESSÕES) ---
+#
+# Páginas do histórico, buscas e agregados do painel, guardados uma vez por
+# processo e servidos a todas as sessões enquanto o banco não mudar. Cada
+# resultado fica indexado pela consulta e pela geração dos dados que a
+# sessão vê:
+#   - no banco principal, (PRAGMA data_version de uma conexão só de
+#     observação, contador de gravações). O data_version muda a cada commit
+#     de qualquer outra conexão, deste processo ou não (ex.: sincronização
+#     pela linha de comando); o contador, incrementado pelas gravações do
+#     app, cobre bancos em que não há como observar (SQLite em memória);
+#   - na cópia de leitura, o número da geração da cópia, que não muda.
+# A geração é lida antes das consultas: um commit no meio do caminho pode
+# guardar dados mais novos sob a geração anterior, nunca mais velhos.
+# Quando aparece uma geração nova de uma origem, os resultados das
+# anteriores saem na hora; o resto é limitado em bytes (LRU). Sessões que
+# pedem ao mesmo tempo um resultado que falta esperam uma única consulta.
+#
+# Os resultados são compartilhados: quem recebe não pode alterá-los.
+
+MAX_BYTES_CONSULTAS = 64 * 1024 * 1024
+
+def tamanho(valor):
+    # Estimativa do que o resultado ocupa em memória
+    if hasattr(valor, "memory_usage"):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho(v) for v in valor)
+    return sys.getsizeof(valor)
+
+class CacheConsultas:
+    def __init__(self, engine, max_bytes=MAX_BYTES_CONSULTAS):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+        self.invalidados = 0
+        self.gravacoes = 0
+        self._itens = OrderedDict()
+        self._vigentes = {}      # origem -> geração mais nova vista
+        self._calculando = {}    # chave -> Event, enquanto uma sessão consulta
+        self._lock = threading.Lock()
+        self._observador = None
+        banco = engine.url.database
+        if engine.dialect.name == "sqlite" and banco not in (None, "", ":memory:"):
+            self._observador = sqlite3.connect(banco, check_same_thread=False,
+                                               timeout=PRAGMAS_SQLITE["busy_timeout"] / 1000)
+
+    def geracao(self):
+        # Geração do banco principal, agora
+        with self._lock:
+            versao = self._observador.execute("PRAGMA data_version").fetchone()[0] if self._observador else None
+            return ("principal", versao, self.gravacoes)
+
+    def registrar_gravacao(self):
+        with self._lock:
+            self.gravacoes += 1
+
+    def obter(self, chave, geracao, consultar):
+        chave = (geracao, chave)
+        while True:
+            with self._lock:
+                item = self._itens.get(chave)
+                if item:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return item[0]
+                vigente = self._vigente(geracao)
+                calculando = self._calculando.get(chave)
+                if calculando is None:
+                    self.faltas += 1
+                    if vigente:
+                        self._calculando[chave] = threading.Event()
+                    break
+            calculando.wait()
+
+        if not vigente:
+            # Geração já superada: consulta, mas não guarda
+            return consultar()
+        try:
+            resultado = consultar()
+        finally:
+            with self._lock:
+                self._calculando.pop(chave).set()
+        ocupado = tamanho(resultado)
+        with self._lock:
+            self._remover(chave)
+            if ocupado <= self.max_bytes and self._vigentes.get(geracao[0]) == geracao:
+                self._itens[chave] = (resultado, ocupado)
+                self.bytes += ocupado
+                while self.bytes > self.max_bytes:
+                    _, (_, liberado) = self._itens.popitem(last=False)
+                    self.bytes -= liberado
+                    self.descartes += 1
+        return resultado
+
+    def _vigente(self, geracao):
+        # Com o lock. Uma geração nova da origem descarta as anteriores.
+        atual = self._vigentes.get(geracao[0])
+        if atual == geracao:
+            return True
+        if atual is not None and geracao < atual:
+            return False
+        self._vigentes[geracao[0]] = geracao
+        for antiga in [c for c in self._itens if c[0][0] == geracao[0]]:
+            self._remover(antiga)
+            self.invalidados += 1
+        return True
+
+    def _remover(self, chave):
+        item = self._itens.pop(chave, None)
+        if item:
+            self.bytes -= item[1]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes = 0
+
+    def zerar(self):
+        with self._lock:
+            self.acertos = self.faltas = self.descartes = self.invalidados = 0
+
+    def instantaneo(self):
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "itens": len(self._itens),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acertos": round(self.acertos / consultas, 3) if consultas else 0.0,
+                "descartes": self.descartes,
+                "invalidados": self.invalidados,
+                "gravacoes": self.gravacoes,
+            }
+
+    def fechar(self):
+        if self._observador:
+            self._observador.close()
@@ -0,0 +1,105 @@
+from sqlalchemy import Integer, column, func, literal_column, select, table, text
+from dependencias import np, pd
+
+# --- CHECKLIST COMPACTO (MÁSCARAS DE BITS) ---
+#
+# Os itens de checklist continuam gravados como colunas Boolean: o
+# formulário, os gatilhos dos resumos, a importação e a exportação usam os
+# nomes dos campos. Para leituras em massa, cada seção da ficha vira um
+# inteiro (bit i = i-ésimo campo da seção) calculado pelo próprio SQLite na
+# consulta, e o pandas recebe 5 colunas inteiras em vez de 21 colunas de
+# objetos. decodificar_flags devolve os campos como colunas bool.
+# Valores nulos contam como desmarcados.
+#
+# A posição na tupla define o bit: itens novos só entram no fim da seção.
+SECOES_CHECKLIST = {
+    "acolhimento": ("crianca_identificada", "responsavel_presente"),
+    "vacinal": (
+        "caderneta_apresentada", "vacinas_conferidas", "esquema_completo",
+        "vacinas_atraso", "orientacao_responsavel_vacina", "encaminhamento_ubs_vacina",
+    ),
+    "nutricional": ("orientacao_nutricional", "encaminhamento_nutricao"),
+    "odonto": (
+        "higiene_bucal", "carie_visivel", "dor_relatada",
+        "orientacao_higiene_bucal", "encaminhamento_odontologico",
+    ),
+    "plano": (
+        "inserido_caps", "encaminhamento_ubs_plano", "encaminhamento_nutricao_plano",
+        "encaminhamento_odonto_plano", "encaminhamento_assistencia_social", "registro_prontuario",
+    ),
+}
+
+TIPO_MASCARA = "uint8"  # até 8 itens por seção
+COLUNAS_MASCARA = {secao: f"checklist_{secao}" for secao in SECOES_CHECKLIST}
+CAMPOS_CHECKLIST = [campo for campos in SECOES_CHECKLIST.values() for campo in campos]
+BITS_CHECKLIST = {
+    campo: (secao, bit)
+    for secao, campos in SECOES_CHECKLIST.items()
+    for bit, campo in enumerate(campos)
+}
+
+# --- NUMPY ---
+
+def codificar_flags(df):
+    # Troca os campos Boolean do DataFrame por uma coluna de máscara por seção
+    mascaras = {}
+    for secao, campos in SECOES_CHECKLIST.items():
+        matriz = df[list(campos)].eq(True).to_numpy()
+        pesos = (1 << np.arange(len(campos))).astype(TIPO_MASCARA)
+        mascaras[COLUNAS_MASCARA[secao]] = matriz.astype(TIPO_MASCARA) @ pesos
+    return df.drop(columns=CAMPOS_CHECKLIST).assign(**mascaras)
+
+def decodificar_flags(df, colunas=None):
+    # Inverso de codificar_flags; `colunas` reordena o resultado (ex.: na
+    # ordem da tabela), senão os campos vão para o fim
+    expandidos = []
+    for secao, campos in SECOES_CHECKLIST.items():
+        mascaras = df[COLUNAS_MASCARA[secao]].to_numpy(dtype=TIPO_MASCARA)
+        bits = (mascaras[:, None] >> np.arange(len(campos), dtype=TIPO_MASCARA)) & 1
+        expandidos.append(pd.DataFrame(bits.astype(bool), columns=list(campos), index=df.index))
+    df = pd.concat([df.drop(columns=list(COLUNAS_MASCARA.values()))] + expandidos, axis=1)
+    return df[colunas] if colunas is not None else df
+
+# --- SQL ---
+
+def mascara_sql(secao, r="avaliacoes"):
+    # Expressão SQL com a máscara de uma seção, a partir dos campos da linha
+    return "(" + " | ".join(
+        f"(COALESCE({r}.{campo}, 0) << {bit})" for bit, campo in enumerate(SECOES_CHECKLIST[secao])
+    ) + ")"
+
+def colunas_mascara(r="avaliacoes"):
+    # Para usar no SELECT no lugar dos 21 campos Boolean
+    return [
+        literal_column(mascara_sql(secao, r), Integer).label(coluna)
+        for secao, coluna in COLUNAS_MASCARA.items()
+    ]
+
+def condicao_flags(marcados=(), desmarcados=(), r="avaliacoes"):
+    # Um teste de bits por seção: (máscara & (marcados|desmarcados)) = marcados
+    exigidos, testados = {}, {}
+    for campo in marcados:
+        secao, bit = BITS_CHECKLIST[campo]
+        exigidos[secao] = exigidos.get(secao, 0) | 1 << bit
+        testados[secao] = testados.get(secao, 0) | 1 << bit
+    for campo in desmarcados:
+        secao, bit = BITS_CHECKLIST[campo]
+        testados[secao] = testados.get(secao, 0) | 1 << bit
+    condicoes = [
+        f"({mascara_sql(secao, r)} & {testados[secao]}) = {exigidos.get(secao, 0)}"
+        for secao in SECOES_CHECKLIST if secao in testados
+    ]
+    return text(" AND ".join(condicoes)) if condicoes else None
+
+_AVALIACOES = table("avaliacoes", *[column(campo) for campo in CAMPOS_CHECKLIST])
+
+def contar_flags(conn, *condicoes):
+    # Quantas avaliações têm cada item marcado, numa única varredura.
+    # Aceita as mesmas condições do histórico (filtro_busca, condicao_flags)
+    query = select(*[func.sum(func.coalesce(_AVALIACOES.c[campo], 0)) for campo in CAMPOS_CHECKLIST])
+    query = query.select_from(_AVALIACOES)
+    for condicao in condicoes:
+        if condicao is not None:
+            query = query.where(condicao)
+    linha = conn.execute(query).one()
+    return {campo: int(valor or 0) for campo, valor in zip(CAMPOS_CHECKLIST, linha)}
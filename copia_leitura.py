@@ -0,0 +1,159 @@
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from itertools import count
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from banco import MAX_OVERFLOW, POOL_SIZE, PRAGMAS_SQLITE
+
+# --- CÓPIA SOMENTE LEITURA ---
+#
+# Histórico, busca, painel e relatórios podem ler de uma cópia do banco em
+# vez do arquivo principal, para que consultas grandes não disputem com os
+# salvamentos. A cópia é feita com a API de backup do SQLite (uma transação
+# de leitura no principal, que em WAL não bloqueia quem grava), em memória
+# ou num arquivo à parte, e renovada em segundo plano. Garantias:
+#   - atraso máximo: a cópia nunca é usada se a última conferência com o
+#     principal for mais antiga que `max_atraso` segundos (é renovada na hora);
+#   - quem acabou de gravar lê o que gravou: com `desde` (instante da última
+#     gravação do usuário) posterior à cópia, a leitura vai para o principal.
+# Cada renovação cria uma geração nova (outro banco em memória ou outro
+# arquivo) e só então troca a engine; leituras em andamento terminam na
+# geração antiga. Se nada foi gravado desde a última cópia (PRAGMA
+# data_version), a renovação só marca a cópia como conferida.
+
+logger = logging.getLogger(__name__)
+
+MEMORIA = "memoria"
+MAX_ATRASO_SEGUNDOS = 30
+
+PRAGMAS_COPIA = {
+    "query_only": 1,
+    "cache_size": PRAGMAS_SQLITE["cache_size"],
+    "temp_store": "MEMORY",
+}
+
+class Geracao:
+    def __init__(self, numero, engine, guardia, caminho, copiada_em, versao):
+        self.numero = numero          # identifica o conteúdo da cópia (cache de consultas)
+        self.engine = engine
+        self.guardia = guardia        # conexão que mantém o banco em memória vivo
+        self.caminho = caminho        # arquivo da cópia (None em memória)
+        self.copiada_em = copiada_em  # time.time() antes da cópia começar
+        self.conferida_em = copiada_em
+        self.versao = versao          # data_version do principal na cópia
+
+class CopiaLeitura:
+    def __init__(self, engine, destino=MEMORIA, max_atraso=MAX_ATRASO_SEGUNDOS, ao_criar_engine=None):
+        # engine: a principal (SQLite em arquivo). destino: MEMORIA ou o
+        # caminho base dos arquivos de cópia. ao_criar_engine(engine) é
+        # chamado para cada geração (ex.: instrumentação).
+        self.engine = engine
+        self.destino = destino
+        self.max_atraso = max_atraso
+        self.ao_criar_engine = ao_criar_engine
+        self.renovacoes = 0
+        self.ultima_duracao_ms = 0.0
+        self._origem = sqlite3.connect(engine.url.database, check_same_thread=False,
+                                       timeout=PRAGMAS_SQLITE["busy_timeout"] / 1000)
+        self._geracoes = count(1)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._atual = None
+        if destino != MEMORIA:
+            for antigo in glob.glob(f"{glob.escape(destino)}-*"):
+                os.remove(antigo)
+        self.renovar()
+        # Renova antes de estourar o atraso, para a leitura quase nunca esperar
+        self._thread = threading.Thread(target=self._renovar_periodicamente, name="copia-leitura", daemon=True)
+        self._thread.start()
+
+    def _nova_geracao(self):
+        numero = next(self._geracoes)
+        if self.destino == MEMORIA:
+            uri = f"file:caps_copia_{id(self)}_{numero}?mode=memory&cache=shared"
+            caminho = None
+        else:
+            caminho = f"{self.destino}-{numero}"
+            uri = f"file:{caminho}"
+        guardia = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        versao = self._origem.execute("PRAGMA data_version").fetchone()[0]
+        copiada_em = time.time()
+        self._origem.backup(guardia)
+        # A cópia herda o modo WAL do principal; para leitura não precisa
+        guardia.execute("PRAGMA journal_mode=DELETE")
+
+        def conectar():
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            for nome, valor in PRAGMAS_COPIA.items():
+                conn.execute(f"PRAGMA {nome}={valor}")
+            return conn
+
+        engine = create_engine("sqlite://", creator=conectar, poolclass=QueuePool,
+                               pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
+        if self.ao_criar_engine:
+            self.ao_criar_engine(engine)
+        return Geracao(numero, engine, guardia, caminho, copiada_em, versao)
+
+    def renovar(self, forcar=False):
+        # Copia de novo se o principal mudou (ou se `forcar`); senão só
+        # marca a cópia atual como conferida agora
+        with self._lock:
+            atual = self._atual
+            if atual and not forcar:
+                conferida_em = time.time()
+                if self._origem.execute("PRAGMA data_version").fetchone()[0] == atual.versao:
+                    atual.conferida_em = conferida_em
+                    return False
+            inicio = time.perf_counter()
+            self._atual = self._nova_geracao()
+            self.renovacoes += 1
+            self.ultima_duracao_ms = (time.perf_counter() - inicio) * 1000
+        if atual:
+            self._descartar(atual)
+        return True
+
+    def _descartar(self, geracao):
+        # Conexões emprestadas da geração antiga são fechadas ao voltar ao pool
+        geracao.engine.dispose()
+        geracao.guardia.close()
+        if geracao.caminho:
+            try:
+                os.remove(geracao.caminho)
+            except OSError:
+                # Windows não apaga arquivo aberto; sai na próxima inicialização
+                logger.warning("Cópia antiga ainda em uso: %s", geracao.caminho)
+
+    def _renovar_periodicamente(self):
+        while not self._parar.wait(self.max_atraso / 2):
+            try:
+                self.renovar()
+            except Exception:
+                logger.exception("Falha ao renovar a cópia de leitura")
+
+    def atraso(self):
+        return time.time() - self._atual.conferida_em
+
+    def engine_leitura(self, desde=None):
+        # desde: time.time() da última gravação de quem vai ler
+        return self.fonte_leitura(desde)[0]
+
+    def fonte_leitura(self, desde=None):
+        # (engine, número da geração), ou (principal, None) para quem
+        # acabou de gravar
+        if desde is not None and desde >= self._atual.copiada_em:
+            return self.engine, None
+        if self.atraso() > self.max_atraso:
+            self.renovar()
+        atual = self._atual
+        return atual.engine, atual.numero
+
+    def fechar(self):
+        self._parar.set()
+        self._thread.join()
+        with self._lock:
+            self._descartar(self._atual)
+            self._origem.close()
@@ -0,0 +1,221 @@
+import glob
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import text
+from dependencias import np, pd
+
+# --- IMC PARA IDADE (OMS) ---
+#
+# Escore z do IMC para a idade pelo método LMS da OMS, vetorizado com NumPy:
+#     z = ((IMC / M) ** L - 1) / (L * S)
+# com L, M e S da tabela do sexo interpolados na idade em meses. Acima de
+# +3 e abaixo de -3 vale o ajuste da OMS para indicadores de peso (a
+# distância é medida em DPs da faixa entre 2 e 3). |z| > 5 é tratado como
+# medida biologicamente implausível e não classifica.
+#
+# Tabelas de referência: referencias_oms/imc_idade_meninos*.csv e
+# imc_idade_meninas*.csv, como publicadas pela OMS (Padrões de Crescimento
+# 0-5 anos e Referência 5-19 anos, "BMI-for-age", tabelas de escore z):
+# uma coluna Month (ou Day, nas tabelas expandidas), e as colunas L, M e S;
+# as demais são ignoradas. Separador vírgula ou tabulação. Vários arquivos
+# por sexo são juntados (ex.: _0_5 e _5_19); numa idade repetida vale o
+# último. Sem as tabelas, a classificação continua manual.
+
+logger = logging.getLogger(__name__)
+
+PASTA_REFERENCIAS_OMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "referencias_oms")
+ARQUIVOS_SEXO = {"M": "imc_idade_meninos", "F": "imc_idade_meninas"}
+SEXOS = {"Não informado": None, "Feminino": "F", "Masculino": "M"}
+DIAS_POR_MES = 30.4375
+Z_IMPLAUSIVEL = 5
+TAMANHO_LOTE_RECLASSIFICACAO = 50_000
+FORMATO_DATA_HORA = '%Y-%m-%d %H:%M:%S.%f'  # como o SQLAlchemy grava DateTime no SQLite
+
+# Mesmos rótulos do formulário e dos resumos do painel
+NAO_AVALIADO = "Não avaliado"
+BAIXO_PESO = "Baixo peso"
+EUTROFIA = "Eutrofia (Peso adequado)"
+SOBREPESO = "Sobrepeso"
+OBESIDADE = "Obesidade"
+CLASSIFICACOES_NUTRICIONAIS = [NAO_AVALIADO, BAIXO_PESO, EUTROFIA, SOBREPESO, OBESIDADE]
+
+class TabelasAusentes(Exception):
+    pass
+
+class ReferenciaIMC:
+    def __init__(self, tabelas):
+        # tabelas: sexo -> (idades em meses, L, M, S), arrays em ordem de idade
+        self.tabelas = tabelas
+
+    @classmethod
+    def carregar(cls, pasta=PASTA_REFERENCIAS_OMS):
+        tabelas = {}
+        for sexo, prefixo in ARQUIVOS_SEXO.items():
+            arquivos = sorted(glob.glob(os.path.join(glob.escape(pasta), f"{prefixo}*.csv")))
+            if not arquivos:
+                raise TabelasAusentes(f"Tabelas da OMS de IMC para idade não encontradas em {pasta} ({prefixo}*.csv)")
+            partes = []
+            for arquivo in arquivos:
+                df = pd.read_csv(arquivo, sep=None, engine="python")
+                df.columns = [str(c).strip() for c in df.columns]
+                idade = df["Month"] if "Month" in df else df["Day"] / DIAS_POR_MES
+                partes.append(pd.DataFrame({"idade": idade, "L": df["L"], "M": df["M"], "S": df["S"]}))
+            tabela = pd.concat(partes).drop_duplicates("idade", keep="last").sort_values("idade")
+            tabelas[sexo] = tuple(tabela[c].to_numpy(dtype=float) for c in ("idade", "L", "M", "S"))
+        return cls(tabelas)
+
+    def lms(self, idade_meses, sexo):
+        # L, M e S de cada linha; NaN fora da faixa das tabelas ou sem sexo
+        idade = np.asarray(idade_meses, dtype=float)
+        sexo = np.asarray(sexo, dtype=object)
+        L, M, S = (np.full(idade.shape, np.nan) for _ in range(3))
+        for codigo, (idades, tl, tm, ts) in self.tabelas.items():
+            alvo = (sexo == codigo) & (idade >= idades[0]) & (idade <= idades[-1])
+            L[alvo] = np.interp(idade[alvo], idades, tl)
+            M[alvo] = np.interp(idade[alvo], idades, tm)
+            S[alvo] = np.interp(idade[alvo], idades, ts)
+        return L, M, S
+
+    def escore_z(self, imc, idade_meses, sexo):
+        imc = np.asarray(imc, dtype=float)
+        L, M, S = self.lms(idade_meses, sexo)
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            z = np.where(L != 0, ((imc / M) ** L - 1) / (L * S), np.log(imc / M) / S)
+
+            def dp(k):
+                # IMC a k desvios-padrão da mediana
+                return np.where(L != 0, M * (1 + L * S * k) ** (1 / L), M * np.exp(S * k))
+            dp2, dp3 = dp(2), dp(3)
+            z = np.where(z > 3, 3 + (imc - dp3) / (dp3 - dp2), z)
+            dpm2, dpm3 = dp(-2), dp(-3)
+            z = np.where(z < -3, -3 + (imc - dpm3) / (dpm2 - dpm3), z)
+        z[~(imc > 0)] = np.nan
+        return z
+
+def carregar_referencia(pasta=PASTA_REFERENCIAS_OMS):
+    # None (com aviso no log) se as tabelas não estão instaladas
+    try:
+        return ReferenciaIMC.carregar(pasta)
+    except TabelasAusentes as e:
+        logger.warning("%s; classificação nutricional manual", e)
+        return None
+
+def idade_em_meses(data_nascimento, data_avaliacao):
+    # Vetorizado; NaN sem data ou com nascimento depois da avaliação
+    nascimento = pd.to_datetime(pd.Series(data_nascimento), errors="coerce").to_numpy("datetime64[D]")
+    avaliacao = pd.to_datetime(pd.Series(data_avaliacao), errors="coerce").to_numpy("datetime64[D]")
+    dias = avaliacao - nascimento
+    meses = dias.astype(float) / DIAS_POR_MES
+    meses[np.isnat(dias) | (meses < 0)] = np.nan
+    return meses
+
+def calcular_imc(peso, altura):
+    peso = np.asarray(peso, dtype=float)
+    altura = np.asarray(altura, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((peso > 0) & (altura > 0), peso / (altura * altura), np.nan)
+
+def classificar_imc(z, idade_meses):
+    # Pontos de corte da OMS (usados pelo SISVAN) nas classes do formulário:
+    # abaixo de 5 anos, sobrepeso acima de +2 e obesidade acima de +3; de 5
+    # a 19, acima de +1 e de +2. None quando não há escore (ou implausível).
+    z = np.asarray(z, dtype=float)
+    menor_5_anos = np.asarray(idade_meses, dtype=float) < 60
+    corte_sobrepeso = np.where(menor_5_anos, 2, 1)
+    corte_obesidade = np.where(menor_5_anos, 3, 2)
+    valido = np.abs(z) <= Z_IMPLAUSIVEL
+    return np.select(
+        [~valido, z < -2, z <= corte_sobrepeso, z <= corte_obesidade],
+        [None, BAIXO_PESO, EUTROFIA, SOBREPESO],
+        default=OBESIDADE,
+    )
+
+def avaliar(referencia, peso, altura, data_nascimento, data_avaliacao, sexo):
+    # Uma avaliação: (imc, escore z, classificação), com None no que não dá
+    # para calcular
+    imc = calcular_imc([peso], [altura])
+    idade = idade_em_meses([data_nascimento], [data_avaliacao])
+    z = referencia.escore_z(imc, idade, [sexo]) if referencia else np.array([np.nan])
+    classificacao = classificar_imc(z, idade)[0] if not np.isnan(z[0]) else None
+    return (None if np.isnan(imc[0]) else float(imc[0]), None if np.isnan(z[0]) else round(float(z[0]), 2),
+            classificacao)
+
+# --- RECLASSIFICAÇÃO EM LOTE ---
+
+def reclassificar_avaliacoes(engine, referencia, corrigir=False, tamanho_lote=TAMANHO_LOTE_RECLASSIFICACAO,
+                             progresso=None):
+    # Uma passada pela tabela, em lotes pelo id: recalcula IMC, escore z e
+    # classificação e compara com o que está gravado. Com `corrigir`, grava
+    # nas avaliações divergentes (nova versão, então exportação e
+    # sincronização levam a correção). Retorna (contagem, divergências).
+    # progresso(linhas_lidas, total) após cada lote.
+    contagem = dict(avaliacoes=0, sem_dados=0, fora_da_faixa=0, implausiveis=0, classificadas=0,
+                    imc_divergente=0, classificacao_divergente=0, corrigidas=0)
+    divergencias = []
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT COUNT(*) FROM avaliacoes")).scalar()
+    ultimo = 0
+    while True:
+        with engine.begin() as conn:
+            df = pd.read_sql(text("""
+                SELECT id, data_criacao, data_nascimento, sexo, peso, altura, imc, imc_escore_z,
+                       classificacao_nutricional
+                FROM avaliacoes WHERE id > :ultimo ORDER BY id LIMIT :limite
+            """), conn, params={"ultimo": ultimo, "limite": tamanho_lote})
+            if df.empty:
+                break
+            ultimo = int(df["id"].iloc[-1])
+            contagem["avaliacoes"] += len(df)
+
+            imc = calcular_imc(df["peso"], df["altura"])
+            idade = idade_em_meses(df["data_nascimento"], df["data_criacao"])
+            z = referencia.escore_z(imc, idade, df["sexo"])
+            classe = classificar_imc(z, idade)
+            sem_dados = np.isnan(imc) | np.isnan(idade) | ~df["sexo"].isin(list(ARQUIVOS_SEXO)).to_numpy()
+            calculado = ~np.isnan(z)
+            implausivel = calculado & (np.abs(z) > Z_IMPLAUSIVEL)
+            contagem["sem_dados"] += int(sem_dados.sum())
+            contagem["fora_da_faixa"] += int((~sem_dados & ~calculado).sum())
+            contagem["implausiveis"] += int(implausivel.sum())
+            classificada = calculado & ~implausivel
+            contagem["classificadas"] += int(classificada.sum())
+
+            imc_gravado = df["imc"].to_numpy(dtype=float)
+            imc_divergente = ~np.isnan(imc) & ~(np.abs(imc_gravado - imc) < 0.01)
+            classe_divergente = classificada & (df["classificacao_nutricional"].to_numpy(dtype=object) != classe)
+            z_gravado = df["imc_escore_z"].to_numpy(dtype=float)
+            z_arredondado = np.round(z, 2)
+            z_divergente = classificada & ~(np.abs(z_gravado - z_arredondado) < 0.005)
+            contagem["imc_divergente"] += int(imc_divergente.sum())
+            contagem["classificacao_divergente"] += int(classe_divergente.sum())
+
+            mudou = imc_divergente | classe_divergente | z_divergente
+            if mudou.any():
+                divergencias.append(pd.DataFrame({
+                    "id": df["id"].to_numpy()[mudou],
+                    "imc_gravado": imc_gravado[mudou], "imc_calculado": np.round(imc[mudou], 2),
+                    "escore_z": z_arredondado[mudou],
+                    "classificacao_gravada": df["classificacao_nutricional"].to_numpy(dtype=object)[mudou],
+                    "classificacao_oms": np.where(classificada, classe, None)[mudou],
+                }))
+                if corrigir:
+                    agora = datetime.now().strftime(FORMATO_DATA_HORA)
+                    conn.execute(text("""
+                        UPDATE avaliacoes SET imc = COALESCE(:imc, imc), imc_escore_z = :z,
+                            classificacao_nutricional = COALESCE(:classe, classificacao_nutricional),
+                            versao = versao + 1, atualizado_em = :agora
+                        WHERE id = :id
+                    """), [
+                        {"id": int(i), "imc": None if np.isnan(m) else float(m), "z": None if np.isnan(zi) else float(zi),
+                         "classe": c, "agora": agora}
+                        for i, m, zi, c in zip(df["id"].to_numpy()[mudou], imc[mudou],
+                                               np.where(classificada, z_arredondado, np.nan)[mudou],
+                                               np.where(classificada, classe, None)[mudou])
+                    ])
+                    contagem["corrigidas"] += int(mudou.sum())
+        if progresso:
+            progresso(contagem["avaliacoes"], total)
+    divergentes = pd.concat(divergencias, ignore_index=True) if divergencias else pd.DataFrame(
+        columns=["id", "imc_gravado", "imc_calculado", "escore_z", "classificacao_gravada", "classificacao_oms"])
+    return contagem, divergentes
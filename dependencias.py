@@ -0,0 +1,25 @@
+import importlib
+
+# --- DEPENDÊNCIAS PESADAS (IMPORTAÇÃO SOB DEMANDA) ---
+#
+# pandas, numpy, fpdf e pyarrow custam centenas de ms para importar e a tela
+# de login não usa nenhum deles. Estes objetos só importam o módulo no primeiro acesso
+# a um atributo (pd.read_sql, np.arange, fpdf.FPDF...). Não entram em
+# sys.modules antes disso, para não enganar quem verifica se o pandas já foi
+# carregado (o próprio Streamlit faz isso).
+
+class SobDemanda:
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+
+    def __getattr__(self, atributo):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome)
+        return getattr(self._modulo, atributo)
+
+pd = SobDemanda("pandas")
+np = SobDemanda("numpy")
+fpdf = SobDemanda("fpdf")
+pa = SobDemanda("pyarrow")
+pq = SobDemanda("pyarrow.parquet")
@@ -0,0 +1,74 @@
+from sqlalchemy.orm import sessionmaker
+from banco import adicionar_colunas
+from modelos import Base, User, Avaliacao, make_hash
+from arquivo_morto import criar_arquivo_morto
+from busca import criar_indice_busca
+from resumos import criar_resumos
+from agenda import criar_agenda
+from pacientes import criar_pacientes, vincular_pacientes
+from exportacao import criar_exclusoes
+from tarefas import criar_tarefas
+from manutencao import criar_manutencao
+from sincronizacao import criar_sincronizacao
+
+# Criação e atualização do esquema: as tabelas dos modelos (modelos.py) e
+# as tabelas, índices e gatilhos de cada recurso, na ordem em que dependem
+# uns dos outros. Usado pelos apps e pelas linhas de comando.
+
+def init_db(Session):
+    session = Session()
+    # Criar admin padrão se não existir
+    admin = session.query(User).filter_by(username='admin').first()
+    if not admin:
+        admin_user = User(username='admin', password_hash=make_hash('admin'), role='admin')
+        session.add(admin_user)
+        session.commit()
+    session.close()
+
+def preparar_banco(engine):
+    # Cria ou atualiza o esquema e retorna a fábrica de sessões
+    
+    # Criar tabelas
+    Base.metadata.create_all(engine)
+    
+    # Registro do arquivo morto (antes dos gatilhos que consultam a movimentação)
+    criar_arquivo_morto(engine)
+    
+    # Colunas novas do modelo em bancos antigos
+    adicionar_colunas(engine, Avaliacao.__table__)
+    
+    # create_all não cria índices novos em tabelas que já existem
+    for indice in Avaliacao.__table__.indexes:
+        indice.create(engine, checkfirst=True)
+    
+    # Índice de busca por nome (FTS5), mantido por gatilhos
+    criar_indice_busca(engine)
+    
+    # Resumos mensais do painel, mantidos por gatilhos
+    criar_resumos(engine)
+    
+    # Agenda de retornos (foto diária da última avaliação por paciente)
+    criar_agenda(engine)
+    
+    # Registro de exclusões, para a exportação incremental
+    criar_exclusoes(engine)
+    
+    # Fila de tarefas em segundo plano
+    criar_tarefas(engine)
+    
+    # Registro das execuções de backup e manutenção
+    criar_manutencao(engine)
+    
+    # Identificação da unidade, uuid das avaliações e estado da sincronização
+    criar_sincronizacao(engine)
+    
+    # Cadastro de pacientes: liga avaliações que ainda não têm paciente_id
+    criar_pacientes(engine)
+    with engine.begin() as conn:
+        vincular_pacientes(conn)
+    
+    Session = sessionmaker(bind=engine)
+    
+    # Inicializa usuário admin
+    init_db(Session)
+    return Session
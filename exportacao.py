@@ -0,0 +1,233 @@
+# Exportação colunar (Parquet) para a Secretaria de Saúde.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m exportacao --destino /caminho/secretaria [--banco sqlite:///caps_data.db] [--completo]
+#
+# Grava as avaliações em Parquet com os tipos da tabela (datas, booleanos,
+# inteiros, decimais), particionadas pelo mês da avaliação em
+# destino/avaliacoes/mes=AAAA-MM/parte-<execução>.parquet, um dataset que
+# pyarrow e pandas leem direto. A primeira execução (ou
+# --completo) exporta tudo; as seguintes só as linhas criadas ou alteradas
+# desde a marca d'água (destino/marca_dagua.json), lidas pelo índice de
+# atualizado_em, então o custo acompanha o volume novo e não o total.
+# Uma avaliação alterada reaparece numa parte nova: vale a maior versao de
+# cada id. Exclusões vão para destino/exclusoes/. ler_exportacao junta
+# tudo isso num DataFrame.
+
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, text
+from arquivo_morto import SEM_MOVIMENTACAO, ArquivoMorto
+from banco import recriar_gatilhos
+from dependencias import pa, pd, pq
+
+# Linhas gravadas há menos tempo que isto ficam para a próxima execução: o
+# atualizado_em é calculado antes do commit, então uma transação ainda em
+# andamento pode gravar um valor anterior ao corte.
+MARGEM_SEGUNDOS = 60
+TAMANHO_LOTE_PARQUET = 50_000
+ARQUIVO_MARCA = "marca_dagua.json"
+PASTA_AVALIACOES = "avaliacoes"
+PASTA_EXCLUSOES = "exclusoes"
+FORMATO_DATA_HORA = '%Y-%m-%d %H:%M:%S.%f'  # como o SQLAlchemy grava DateTime no SQLite
+
+# --- EXCLUSÕES ---
+
+DDL_EXCLUSOES = [
+    """CREATE TABLE IF NOT EXISTS avaliacoes_excluidas (
+        id INTEGER NOT NULL,
+        excluida_em DATETIME NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_avaliacoes_excluidas_excluida_em ON avaliacoes_excluidas (excluida_em)",
+    f"""CREATE TRIGGER IF NOT EXISTS avaliacoes_excluidas_ad AFTER DELETE ON avaliacoes
+    WHEN {SEM_MOVIMENTACAO} BEGIN
+        INSERT INTO avaliacoes_excluidas (id, excluida_em)
+        VALUES (old.id, strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'));
+    END""",
+]
+
+def criar_exclusoes(engine):
+    with engine.begin() as conn:
+        recriar_gatilhos(conn, DDL_EXCLUSOES)
+        for ddl in DDL_EXCLUSOES:
+            conn.execute(text(ddl))
+
+# --- ESQUEMA ---
+
+def tipo_arrow(coluna):
+    if isinstance(coluna.type, Boolean):
+        return pa.bool_()
+    if isinstance(coluna.type, Integer):
+        return pa.int64()
+    if isinstance(coluna.type, Float):
+        return pa.float64()
+    if isinstance(coluna.type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(coluna.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def converter_coluna(valores, tipo):
+    # Valores crus do SQLite (datas em texto ISO, booleanos 0/1) -> array Arrow
+    if tipo == pa.bool_():
+        return pa.array(valores, pa.int64()).cast(tipo)
+    if pa.types.is_temporal(tipo):
+        return pa.array(valores, pa.string()).cast(tipo)
+    return pa.array(valores, tipo)
+
+# --- EXPORTAÇÃO ---
+
+def ler_marca(destino):
+    caminho = os.path.join(destino, ARQUIVO_MARCA)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def limpar_destino(destino):
+    # Só apaga o que uma exportação anterior gravou
+    for caminho in glob.glob(os.path.join(destino, PASTA_AVALIACOES, "mes=*", "parte-*.parquet")) + \
+            glob.glob(os.path.join(destino, PASTA_EXCLUSOES, "parte-*.parquet")):
+        os.remove(caminho)
+    for pasta in glob.glob(os.path.join(destino, PASTA_AVALIACOES, "mes=*")):
+        if not os.listdir(pasta):
+            os.rmdir(pasta)
+    if os.path.exists(os.path.join(destino, ARQUIVO_MARCA)):
+        os.remove(os.path.join(destino, ARQUIVO_MARCA))
+
+def exportar_parquet(engine, destino, completo=False, margem=timedelta(seconds=MARGEM_SEGUNDOS),
+                     tamanho_lote=TAMANHO_LOTE_PARQUET):
+    # Retorna um resumo da execução (também gravado na marca d'água)
+    from modelos import Avaliacao
+
+    inicio = time.perf_counter()
+    os.makedirs(destino, exist_ok=True)
+    marca = None if completo else ler_marca(destino)
+    if marca is None:
+        limpar_destino(destino)
+    instante = datetime.now() - margem
+    corte = instante.strftime(FORMATO_DATA_HORA)
+    execucao = instante.strftime('%Y%m%dT%H%M%S%f')
+
+    colunas = list(Avaliacao.__table__.columns)
+    nomes = [c.name for c in colunas]
+    esquema = pa.schema([pa.field(c.name, tipo_arrow(c)) for c in colunas])
+    posicao_data = nomes.index('data_criacao')
+    if marca is None:
+        # Tudo, inclusive linhas antigas sem atualizado_em, na ordem dos meses
+        sql = (f"SELECT {', '.join(nomes)} FROM avaliacoes WHERE atualizado_em IS NULL OR atualizado_em < :corte "
+               "ORDER BY data_criacao, id")
+        parametros = {"corte": corte}
+    else:
+        sql = (f"SELECT {', '.join(nomes)} FROM avaliacoes WHERE atualizado_em >= :desde AND atualizado_em < :corte "
+               "ORDER BY atualizado_em, id")
+        parametros = {"desde": marca["ate"], "corte": corte}
+
+    # Grava em .tmp e só renomeia no fim: uma execução interrompida não deixa
+    # partes pela metade nem move a marca d'água
+    escritores = {}
+    linhas = 0
+
+    def gravar(conn, sql, parametros):
+        nonlocal linhas
+        resultado = conn.execution_options(stream_results=True).execute(text(sql), parametros)
+        while True:
+            lote = resultado.fetchmany(tamanho_lote)
+            if not lote:
+                break
+            valores = list(zip(*lote))
+            tabela = pa.table([converter_coluna(list(v), f.type) for v, f in zip(valores, esquema)], schema=esquema)
+            meses = [d[:7] if d else "sem-data" for d in valores[posicao_data]]
+            for mes in dict.fromkeys(meses):
+                if mes not in escritores:
+                    pasta = os.path.join(destino, PASTA_AVALIACOES, f"mes={mes}")
+                    os.makedirs(pasta, exist_ok=True)
+                    escritores[mes] = pq.ParquetWriter(os.path.join(pasta, f"parte-{execucao}.parquet.tmp"), esquema)
+                filtro = pa.array([m == mes for m in meses])
+                escritores[mes].write_table(tabela.filter(filtro))
+            linhas += len(lote)
+
+    with engine.connect() as conn:
+        gravar(conn, sql, parametros)
+        if marca is None:
+            # As avaliações do arquivo morto entram só na exportação completa
+            # (as incrementais já as tinham quando foram arquivadas)
+            arquivo = ArquivoMorto(engine)
+            try:
+                arquivo.consultar(lambda c: gravar(c, f"SELECT {', '.join(nomes)} FROM avaliacoes ORDER BY data_criacao, id", {}))
+            finally:
+                arquivo.fechar()
+
+        excluidas = []
+        if marca is not None:
+            excluidas = conn.execute(text(
+                "SELECT id, excluida_em FROM avaliacoes_excluidas WHERE excluida_em >= :desde AND excluida_em < :corte"
+            ), parametros).all()
+
+    arquivos = []
+    for mes, escritor in escritores.items():
+        escritor.close()
+        arquivos.append(os.path.join(PASTA_AVALIACOES, f"mes={mes}", f"parte-{execucao}.parquet"))
+    if excluidas:
+        os.makedirs(os.path.join(destino, PASTA_EXCLUSOES), exist_ok=True)
+        ids, quando = zip(*excluidas)
+        pq.write_table(pa.table({"id": pa.array(ids, pa.int64()),
+                                 "excluida_em": pa.array(quando, pa.string()).cast(pa.timestamp('us'))}),
+                       os.path.join(destino, PASTA_EXCLUSOES, f"parte-{execucao}.parquet.tmp"))
+        arquivos.append(os.path.join(PASTA_EXCLUSOES, f"parte-{execucao}.parquet"))
+    for arquivo in arquivos:
+        os.replace(os.path.join(destino, arquivo + ".tmp"), os.path.join(destino, arquivo))
+
+    resumo = {
+        "ate": corte,
+        "desde": marca["ate"] if marca else None,
+        "modo": "incremental" if marca else "completo",
+        "linhas": linhas,
+        "exclusoes": len(excluidas),
+        "arquivos": arquivos,
+        "exportado_em": datetime.now().isoformat(timespec="seconds"),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+    caminho_marca = os.path.join(destino, ARQUIVO_MARCA)
+    with open(caminho_marca + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_marca + ".tmp", caminho_marca)
+    return resumo
+
+def ler_exportacao(destino):
+    # Estado atual a partir das partes: a última versão de cada avaliação,
+    # sem as excluídas depois dela
+    partes = sorted(glob.glob(os.path.join(destino, PASTA_AVALIACOES, "mes=*", "parte-*.parquet")))
+    if not partes:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_parquet(p) for p in partes], ignore_index=True)
+    df = df.sort_values(["id", "versao"]).drop_duplicates("id", keep="last")
+    exclusoes = sorted(glob.glob(os.path.join(destino, PASTA_EXCLUSOES, "parte-*.parquet")))
+    if exclusoes:
+        excluidas = pd.concat([pd.read_parquet(p) for p in exclusoes]).groupby("id")["excluida_em"].max()
+        quando = df["id"].map(excluidas)
+        df = df[quando.isna() | (df["atualizado_em"] > quando)]
+    return df.sort_values(["data_criacao", "id"]).reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta as avaliações em Parquet, particionadas por mês.")
+    parser.add_argument("--destino", required=True, help="pasta de saída (criada se não existir)")
+    parser.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    parser.add_argument("--completo", action="store_true", help="ignora a marca d'água e exporta tudo de novo")
+    args = parser.parse_args()
+
+    from banco import criar_engine
+    from esquema import preparar_banco
+
+    engine = criar_engine(args.banco)
+    preparar_banco(engine)
+    resumo = exportar_parquet(engine, args.destino, completo=args.completo)
+    print(f"{resumo['modo']}: {resumo['linhas']} avaliações e {resumo['exclusoes']} exclusões "
+          f"em {len(resumo['arquivos'])} arquivo(s), {resumo['segundos']:.2f} s -> {args.destino}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import os
+import threading
+import zipfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from types import SimpleNamespace
+from dependencias import fpdf
+
+# --- FICHA EM PDF ---
+
+def latin1(texto):
+    # As fontes padrão do FPDF só cobrem latin-1; caracteres fora dele
+    # (travessões, aspas curvas, emojis digitados no formulário) viram "?"
+    return texto.encode('latin-1', 'replace').decode('latin-1')
+
+# O layout da ficha é fixo: toda linha é uma célula de altura fixa e linha
+# única, então a posição de cada elemento não depende dos dados. O modelo
+# (títulos, seções, rótulos, linha de assinatura) é desenhado uma única vez
+# por processo; para cada avaliação só as marcações e os textos variáveis são
+# posicionados por cima dele. O conteúdo do modelo é lido e copiado pelos
+# internos do FPDF 1.7 (pages, _out), por isso a versão fica fixa em
+# requirements.txt.
+
+# Cada item: (rótulo fixo, texto variável após o rótulo, marcação).
+# Marcação True é fixa ("[X]" sempre); uma função é avaliada por registro.
+SECOES = [
+    ("ACOLHIMENTO INICIAL", [
+        ("Criança/adolescente identificado: ", lambda d: d.paciente_nome or '', lambda d: d.crianca_identificada),
+        ("Data de nascimento: ", lambda d: d.data_nascimento.strftime('%d/%m/%Y') if d.data_nascimento else '',
+         lambda d: d.data_nascimento),
+        ("Sexo: ", lambda d: {"F": "Feminino", "M": "Masculino"}.get(d.sexo, ''), lambda d: d.sexo),
+        ("Responsável legal presente: ", lambda d: d.responsavel_nome or '', lambda d: d.responsavel_presente),
+        ("Motivo do atendimento: ", lambda d: d.motivo_atendimento or '', lambda d: d.motivo_atendimento),
+        ("Encaminhamento de origem: ", lambda d: d.encaminhamento_origem or '', lambda d: d.encaminhamento_origem),
+        ("Observação do comportamento: ", lambda d: d.observacao_comportamento or '', lambda d: d.observacao_comportamento),
+        ("Profissional responsável: ", lambda d: d.profissional_responsavel or '', lambda d: d.profissional_responsavel),
+    ]),
+    ("CADERNETA VACINAL", [
+        ("Caderneta apresentada", None, lambda d: d.caderneta_apresentada),
+        ("Vacinas conferidas conforme idade", None, lambda d: d.vacinas_conferidas),
+        ("Esquema vacinal completo", None, lambda d: d.esquema_completo),
+        ("Vacinas em atraso", None, lambda d: d.vacinas_atraso),
+        ("Orientação ao responsável realizada", None, lambda d: d.orientacao_responsavel_vacina),
+        ("Encaminhamento à UBS (se necessário)", None, lambda d: d.encaminhamento_ubs_vacina),
+    ]),
+    ("AVALIAÇÃO NUTRICIONAL", [
+        ("Peso aferido: ", lambda d: f"{d.peso} kg" if d.peso is not None else '', True),
+        ("Altura aferida: ", lambda d: f"{d.altura} m" if d.altura is not None else '', True),
+        ("IMC calculado: ", lambda d: f"{d.imc:.2f}" if d.imc is not None else '', True),
+        ("IMC para idade (OMS): ",
+         lambda d: f"escore z {d.imc_escore_z:+.2f}" if d.imc_escore_z is not None else "não calculado",
+         lambda d: d.imc_escore_z is not None),
+        ("Classificação nutricional: ", lambda d: f"{d.classificacao_nutricional}", True),
+        ("Queixa alimentar: ", lambda d: d.queixa_alimentar or 'Nenhuma', lambda d: d.queixa_alimentar),
+        ("Orientação nutricional realizada", None, lambda d: d.orientacao_nutricional),
+        ("Encaminhamento realizado (se necessário)", None, lambda d: d.encaminhamento_nutricao),
+    ]),
+    ("AVALIAÇÃO ODONTOLÓGICA", [
+        ("Higiene bucal adequada", None, lambda d: d.higiene_bucal),
+        ("Presença de cárie visível", None, lambda d: d.carie_visivel),
+        ("Dor ou desconforto relatado", None, lambda d: d.dor_relatada),
+        ("Orientação de higiene bucal realizada", None, lambda d: d.orientacao_higiene_bucal),
+        ("Encaminhamento odontológico", None, lambda d: d.encaminhamento_odontologico),
+        ("Classificação: ", lambda d: f"{d.classificacao_odonto}", True),
+    ]),
+    ("PLANO INICIAL DE CUIDADO", [
+        ("Inserido no acompanhamento CAPS", None, lambda d: d.inserido_caps),
+        ("Encaminhamento para UBS", None, lambda d: d.encaminhamento_ubs_plano),
+        ("Encaminhamento para Nutrição", None, lambda d: d.encaminhamento_nutricao_plano),
+        ("Encaminhamento para Odontologia", None, lambda d: d.encaminhamento_odonto_plano),
+        ("Encaminhamento para Assistência Social", None, lambda d: d.encaminhamento_assistencia_social),
+        ("Próxima avaliação agendada: ",
+         lambda d: d.proxima_avaliacao.strftime('%d/%m/%Y') if d.proxima_avaliacao else "Não agendada",
+         lambda d: d.proxima_avaliacao),
+        ("Registro em prontuário realizado", None, lambda d: d.registro_prontuario),
+    ]),
+]
+
+# Estado de fonte em que toda página do modelo termina (ver desenhar_ficha)
+FONTE_BASE = ("Arial", "", 10)
+
+class _Campo:
+    __slots__ = ("x", "y", "w", "h", "estilo", "tamanho", "alinhamento", "texto")
+
+    def __init__(self, pdf, w, h, alinhamento, texto):
+        self.x, self.y = pdf.x, pdf.y
+        self.w, self.h = w, h
+        self.estilo, self.tamanho = pdf.font_style, pdf.font_size_pt
+        self.alinhamento = alinhamento
+        self.texto = texto
+
+def _registrar_fontes(pdf):
+    # A ordem de registro define os nomes /F1, /F2 usados no conteúdo do modelo
+    if not pdf.fonts:
+        pdf.set_font("Arial", "", 10)
+        pdf.set_font("Arial", "B", 10)
+
+class _Modelo:
+    def __init__(self):
+        pdf = fpdf.FPDF()
+        _registrar_fontes(pdf)
+        self.pdf = pdf
+        self.campos = []    # por página: posições dos textos variáveis
+        self._nova_pagina()
+        self._desenhar()
+        pdf.set_font(*FONTE_BASE)
+        self.paginas = [pdf.pages[n] for n in range(1, pdf.page + 1)]   # conteúdo fixo
+        del self.pdf
+
+    def _nova_pagina(self):
+        self.pdf.add_page()
+        self.campos.append([])
+
+    def _linha(self, h):
+        # Mesma regra da quebra automática do FPDF, aplicada antes de cada linha
+        pdf = self.pdf
+        if pdf.y + h > pdf.page_break_trigger:
+            estilo, tamanho = pdf.font_style, pdf.font_size_pt
+            pdf.set_font(*FONTE_BASE)
+            self._nova_pagina()
+            pdf.set_font("Arial", estilo, tamanho)
+
+    def _variavel(self, w, h, texto, ln=0, alinhamento=''):
+        self.campos[-1].append(_Campo(self.pdf, w, h, alinhamento, texto))
+        self.pdf.cell(w, h, txt='', ln=ln)
+
+    def _desenhar(self):
+        pdf = self.pdf
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(200, 10, txt="CHECKLIST RÁPIDO - AVALIAÇÃO INICIAL", ln=True, align='C')
+        pdf.cell(200, 10, txt="CAPS INFANTIL", ln=True, align='C')
+        pdf.ln(5)
+        
+        for i, (titulo, itens) in enumerate(SECOES):
+            pdf.set_font("Arial", 'B', 11)
+            self._linha(8)
+            pdf.cell(0, 8, txt=titulo, ln=1)
+            pdf.set_font("Arial", size=10)
+            for rotulo, texto, marcacao in itens:
+                self._linha(5)
+                if marcacao is True:
+                    pdf.cell(10, 5, txt="[X]", ln=0)
+                else:
+                    self._variavel(10, 5, lambda d, m=marcacao: "[X]" if m(d) else "[ ]")
+                if texto:
+                    # O texto variável começa onde o rótulo fixo termina
+                    x_rotulo = pdf.x
+                    pdf.x = x_rotulo + pdf.get_string_width(rotulo)
+                    self._variavel(0, 5, texto)
+                    pdf.x = x_rotulo
+                pdf.cell(0, 5, txt=rotulo, ln=1)
+            pdf.ln(10 if i == len(SECOES) - 1 else 3)
+        
+        self._linha(10)
+        self._variavel(0, 10, lambda d: f"Angicos/RN, {d.data_criacao.strftime('%d de %B de %Y')}." if d.data_criacao else "Angicos/RN.", ln=1, alinhamento='R')
+        pdf.ln(15)
+        self._linha(10)
+        pdf.cell(0, 10, txt="__________________________________________", ln=1, align='C')
+        self._linha(5)
+        self._variavel(0, 5, lambda d: d.profissional_responsavel or 'Profissional Responsável', ln=1, alinhamento='C')
+
+_modelo = None
+
+def modelo_ficha():
+    global _modelo
+    if _modelo is None:
+        _modelo = _Modelo()
+    return _modelo
+
+def desenhar_ficha(pdf, dados):
+    # Acrescenta as páginas da ficha de uma avaliação ao documento
+    modelo = modelo_ficha()
+    _registrar_fontes(pdf)
+    for conteudo, campos in zip(modelo.paginas, modelo.campos):
+        pdf.add_page()
+        # O conteúdo fixo termina em FONTE_BASE; o FPDF precisa estar no mesmo
+        # estado para emitir corretamente as trocas de fonte dos campos
+        pdf.set_font(*FONTE_BASE)
+        pdf._out(conteudo)
+        for campo in campos:
+            pdf.set_font("Arial", campo.estilo, campo.tamanho)
+            pdf.set_xy(campo.x, campo.y)
+            pdf.cell(campo.w, campo.h, txt=latin1(campo.texto(dados)), align=campo.alinhamento)
+
+def gerar_pdf(dados):
+    pdf = fpdf.FPDF()
+    desenhar_ficha(pdf, dados)
+    return pdf.output(dest='S').encode('latin-1')
+
+# --- CACHE DE PDFs ---
+
+class CachePDF:
+    # LRU limitado pelo total de bytes guardados. Cada entrada é indexada pelo
+    # id da avaliação e guarda a versão (hash do conteúdo) com que foi gerada:
+    # uma versão diferente é tratada como falta e substitui a antiga.
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, avaliacao_id, versao, gerar):
+        with self._lock:
+            item = self._itens.get(avaliacao_id)
+            if item and item[0] == versao:
+                self._itens.move_to_end(avaliacao_id)
+                self.acertos += 1
+                return item[1]
+            self.faltas += 1
+        
+        pdf_bytes = gerar()
+        with self._lock:
+            self._remover(avaliacao_id)
+            if len(pdf_bytes) <= self.max_bytes:
+                self._itens[avaliacao_id] = (versao, pdf_bytes)
+                self.bytes += len(pdf_bytes)
+                while self.bytes > self.max_bytes:
+                    _, (_, antigo) = self._itens.popitem(last=False)
+                    self.bytes -= len(antigo)
+        return pdf_bytes
+
+    def invalidar(self, avaliacao_id):
+        with self._lock:
+            self._remover(avaliacao_id)
+
+    def _remover(self, avaliacao_id):
+        item = self._itens.pop(avaliacao_id, None)
+        if item:
+            self.bytes -= len(item[1])
+
+    def __len__(self):
+        return len(self._itens)
+
+# --- GERAÇÃO EM LOTE ---
+#
+# Os registros chegam como dicts (picklable) e são renderizados em paralelo
+# num pool de processos. Só uma janela de documentos fica em memória: cada
+# PDF pronto é gravado no ZIP de destino e descartado. O PDF único é montado
+# inteiro em memória (o FPDF 1.7 só grava o documento pronto), por isso vale
+# só até MAX_LOTE_UNICO avaliações; lotes maiores vão para o ZIP.
+
+JANELA_LOTE = 64
+MAX_LOTE_UNICO = 500
+
+def _gerar_pdf_registro(registro):
+    return registro['id'], gerar_pdf(SimpleNamespace(**registro))
+
+def _sem_repetidos(registros):
+    # Uma ficha por avaliação: a primeira que chega com cada id
+    vistos = set()
+    for registro in registros:
+        if registro['id'] not in vistos:
+            vistos.add(registro['id'])
+            yield registro
+
+def gerar_lote_zip(registros, destino, max_workers=None, progresso=None):
+    concluidos = 0
+    # spawn: seguro com o servidor multithread do Streamlit e igual no Windows
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=contexto) as pool, \
+            zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as zf:
+        pendentes = set()
+        
+        def gravar(prontos):
+            nonlocal concluidos
+            for futuro in prontos:
+                avaliacao_id, pdf_bytes = futuro.result()
+                zf.writestr(f"ficha_{avaliacao_id}.pdf", pdf_bytes)
+                concluidos += 1
+                if progresso:
+                    progresso(concluidos)
+        
+        for registro in _sem_repetidos(registros):
+            pendentes.add(pool.submit(_gerar_pdf_registro, registro))
+            if len(pendentes) >= JANELA_LOTE:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                gravar(prontos)
+        gravar(wait(pendentes).done)
+    return concluidos
+
+def gerar_lote_unico(registros, destino, progresso=None):
+    # Um único PDF com uma página por avaliação. Um documento FPDF não pode
+    # ser dividido entre processos, então este modo renderiza em sequência.
+    pdf = fpdf.FPDF()
+    concluidos = 0
+    for registro in _sem_repetidos(registros):
+        if concluidos == MAX_LOTE_UNICO:
+            raise ValueError(f"PDF único limitado a {MAX_LOTE_UNICO} avaliações; gere o lote em ZIP.")
+        desenhar_ficha(pdf, SimpleNamespace(**registro))
+        concluidos += 1
+        if progresso:
+            progresso(concluidos)
+    destino.write(pdf.output(dest='S').encode('latin-1'))
+    return concluidos
@@ -0,0 +1,163 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+
+# --- INSTRUMENTAÇÃO (TEMPOS DE SQL E DAS SEÇÕES DO APP) ---
+#
+# Cada trecho medido ("span") alimenta um histograma de faixas fixas em ms.
+# As consultas SQL são medidas pelos eventos da engine; as que passam do
+# limite guardam o texto e o EXPLAIN QUERY PLAN (nunca os parâmetros, que
+# trazem nomes de pacientes). Dentro de um rerun, o tempo de SQL também é
+# somado e registrado como "rerun.sql", para comparar com o rerun inteiro.
+# Os eventos só cercam o cursor.execute: no SQLite isso vai até a primeira
+# linha, e a leitura das demais (fetch, stream_results/yield_per) fica de
+# fora de sql.*, de rerun.sql e do registro de consultas lentas. O tempo
+# completo de uma leitura está no span de quem a faz (aba.*, pdf_lote...).
+
+FAIXAS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+LIMITE_CONSULTA_LENTA_MS = 100
+MAX_CONSULTAS_LENTAS = 50
+
+class Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(FAIXAS_MS) + 1)  # a última faixa é "acima de 10 s"
+        self.quantidade = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def registrar(self, ms):
+        faixa = next((i for i, limite in enumerate(FAIXAS_MS) if ms <= limite), len(FAIXAS_MS))
+        self.contagens[faixa] += 1
+        self.quantidade += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentil(self, p):
+        # Aproximado: limite superior da faixa onde o percentil cai
+        alvo = p * self.quantidade
+        acumulado = 0
+        for i, qtd in enumerate(self.contagens):
+            acumulado += qtd
+            if qtd and acumulado >= alvo:
+                return min(FAIXAS_MS[i], self.max_ms) if i < len(FAIXAS_MS) else self.max_ms
+        return 0.0
+
+    def resumo(self):
+        return {
+            "quantidade": self.quantidade,
+            "media_ms": round(self.total_ms / self.quantidade, 2) if self.quantidade else 0.0,
+            "p50_ms": self.percentil(0.5),
+            "p95_ms": self.percentil(0.95),
+            "max_ms": round(self.max_ms, 2),
+            "total_ms": round(self.total_ms, 1),
+        }
+
+class Metricas:
+    def __init__(self, limite_lento_ms=LIMITE_CONSULTA_LENTA_MS):
+        self.limite_lento_ms = limite_lento_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.histogramas = {}
+            self.consultas_lentas = deque(maxlen=MAX_CONSULTAS_LENTAS)
+            self.desde = datetime.now()
+
+    def registrar(self, nome, ms):
+        with self._lock:
+            if nome not in self.histogramas:
+                self.histogramas[nome] = Histograma()
+            self.histogramas[nome].registrar(ms)
+
+    @contextmanager
+    def span(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, (time.perf_counter() - inicio) * 1000)
+
+    def medir(self, nome):
+        # Decorador: mede cada chamada da função como um span
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.span(nome):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    @contextmanager
+    def rerun(self):
+        # Soma o SQL executado nesta thread enquanto o script roda
+        self._local.sql = 0.0
+        try:
+            with self.span("rerun"):
+                yield
+        finally:
+            self.registrar("rerun.sql", self._local.sql)
+            self._local.sql = None
+
+    def registrar_consulta(self, statement, ms, plano=None):
+        tipo = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+        self.registrar(f"sql.{tipo}", ms)
+        if getattr(self._local, "sql", None) is not None:
+            self._local.sql += ms
+        if plano is not None:
+            with self._lock:
+                self.consultas_lentas.appendleft({
+                    "quando": datetime.now().isoformat(timespec="seconds"),
+                    "ms": round(ms, 1),
+                    "sql": statement,
+                    "plano": plano,
+                })
+
+    def instantaneo(self):
+        with self._lock:
+            return {
+                "desde": self.desde.isoformat(timespec="seconds"),
+                "gerado_em": datetime.now().isoformat(timespec="seconds"),
+                "faixas_ms": FAIXAS_MS,
+                "spans": {
+                    nome: {**h.resumo(), "contagens": list(h.contagens)}
+                    for nome, h in sorted(self.histogramas.items())
+                },
+                "consultas_lentas": list(self.consultas_lentas),
+            }
+
+    def salvar(self, caminho):
+        # Acrescenta uma linha JSON por chamada (histórico de instantâneos)
+        with open(caminho, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.instantaneo(), ensure_ascii=False) + "\n")
+
+def plano_consulta(cursor, statement, parameters):
+    try:
+        return [linha[-1] for linha in cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    except Exception as e:
+        return [f"(sem plano: {e})"]
+
+def instrumentar_engine(engine, metricas):
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    def depois(conn, cursor, statement, parameters, context, executemany):
+        ms = (time.perf_counter() - conn.info["inicio_consulta"].pop()) * 1000
+        plano = None
+        if ms >= metricas.limite_lento_ms and not executemany and engine.dialect.name == "sqlite":
+            plano = plano_consulta(cursor, statement, parameters)
+        metricas.registrar_consulta(statement, ms, plano)
+
+    def erro(contexto):
+        if contexto.connection is not None and contexto.connection.info.get("inicio_consulta"):
+            contexto.connection.info["inicio_consulta"].pop()
+
+    event.listen(engine, "before_cursor_execute", antes)
+    event.listen(engine, "after_cursor_execute", depois)
+    event.listen(engine, "handle_error", erro)
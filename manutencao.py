@@ -0,0 +1,424 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from banco import PRAGMAS_SQLITE, aplicar_pragmas
+from arquivo_morto import PASTA_ARQUIVO_MORTO, lock_movimentacao
+
+# --- MANUTENÇÃO DO BANCO (BACKUP, ESTATÍSTICAS, VACUUM, VERIFICAÇÃO) ---
+#
+# Uso, a partir da raiz do projeto:
+#     python -m manutencao executar [--banco sqlite:///caps_data.db] [--pasta ...] [--completo]
+#         [backup estatisticas vacuum verificacao]
+#     python -m manutencao listar [--banco ...] [--limite 20]
+#
+# Um agendador em segundo plano (uma thread por processo) roda quatro rotinas:
+#   - backup: cópia online pela API de backup do SQLite, numa transação de
+#     leitura só (em WAL não bloqueia quem grava nem recomeça por causa
+#     dele), para backups_caps/AAAAMMDD_HHMMSS_mmm/ ao lado do banco. A cópia é
+#     conferida com quick_check antes de a pasta receber o nome final.
+#     Incremental: não copia nada se o banco não mudou desde o último
+#     backup, e os arquivos do arquivo morto que não mudaram desde o backup
+#     anterior entram por hard link, sem ocupar espaço de novo. Ficam os
+#     MANTER_BACKUPS mais recentes;
+#   - estatisticas: ANALYZE por amostragem (analysis_limit) para o
+#     planejador de consultas;
+#   - vacuum: devolve ao disco, em passos curtos, as páginas livres deixadas
+#     por exclusões e pelo arquivo morto (incremental_vacuum) e trunca o
+#     WAL. Páginas meio vazias continuam como estão: só um VACUUM completo
+#     as junta (--completo na linha de comando), e é com ele que bancos
+#     criados antes do auto_vacuum são convertidos, uma vez só;
+#   - verificacao: PRAGMA quick_check no banco e nos arquivos do arquivo morto.
+# O backup roda quando vence, com o banco em uso ou não. As demais só numa
+# janela ociosa (nenhuma gravação há `ocioso_segundos`, pelo PRAGMA
+# data_version), e o vacuum para no meio se alguém voltar a gravar. Toda
+# execução fica registrada na tabela manutencao (início, duração, resultado
+# e detalhes), que os administradores veem na aba Desempenho.
+# A thread grava só pela própria conexão, que não conta para o seu
+# data_version: o registro das execuções não parece atividade.
+# Para restaurar um backup: parar o app e copiar o banco da pasta do backup
+# por cima do principal e os arquivos de arquivo_morto/ para os caminhos que
+# estão em manifesto.json.
+
+logger = logging.getLogger(__name__)
+
+PASTA_BACKUPS = "backups_caps"  # ao lado do banco principal
+MANTER_BACKUPS = 14
+SUFIXO_PARCIAL = ".parcial"
+MANIFESTO = "manifesto.json"
+
+ROTINAS = ["backup", "estatisticas", "vacuum", "verificacao"]
+INTERVALOS = {  # s entre execuções de cada rotina
+    "backup": 6 * 3600,
+    "estatisticas": 24 * 3600,
+    "vacuum": 24 * 3600,
+    "verificacao": 24 * 3600,
+}
+OCIOSO_SEGUNDOS = 300
+INTERVALO_VERIFICACAO = 30  # s entre verificações do agendador
+LIMITE_ANALISE = 1000       # linhas examinadas por índice no ANALYZE
+PAGINAS_POR_PASSO = 256     # páginas devolvidas por incremental_vacuum
+MAX_PROBLEMAS = 20          # mensagens do quick_check guardadas
+DIAS_RETENCAO = 90
+
+OK, PROBLEMAS, ERRO = "ok", "problemas", "erro"
+INCREMENTAL = 2  # PRAGMA auto_vacuum
+
+DDL_MANUTENCAO = [
+    """CREATE TABLE IF NOT EXISTS manutencao (
+        id INTEGER PRIMARY KEY,
+        rotina TEXT NOT NULL,
+        iniciada_em DATETIME NOT NULL,
+        duracao_ms REAL NOT NULL,
+        resultado TEXT NOT NULL,
+        detalhes TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_manutencao_rotina_id ON manutencao (rotina, id)",
+]
+
+def criar_manutencao(engine):
+    with engine.begin() as conn:
+        for ddl in DDL_MANUTENCAO:
+            conn.execute(text(ddl))
+
+def _agora():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def _mb(paginas, tamanho):
+    return paginas * tamanho / 1024 / 1024
+
+def listar_execucoes(conn, limite=50):
+    return conn.execute(text(
+        "SELECT id, rotina, iniciada_em, duracao_ms, resultado, detalhes FROM manutencao ORDER BY id DESC LIMIT :limite"
+    ), {"limite": limite}).all()
+
+def ultimas_execucoes(conn):
+    # {rotina: última execução}
+    return {l.rotina: l for l in conn.execute(text("""
+        SELECT m.rotina, m.iniciada_em, m.duracao_ms, m.resultado, m.detalhes FROM manutencao m
+        WHERE m.id = (SELECT MAX(id) FROM manutencao WHERE rotina = m.rotina)
+    """))}
+
+def verificar(conn):
+    # Mensagens do quick_check ([] se estiver tudo certo)
+    problemas = [m for (m,) in conn.execute(f"PRAGMA quick_check({MAX_PROBLEMAS})")]
+    return [] if problemas == ["ok"] else problemas
+
+def copiar_banco(origem, caminho):
+    # Cópia consistente de `origem` (conexão sqlite3) em `caminho`, num
+    # arquivo só (sem WAL); retorna os problemas do quick_check da cópia
+    destino = sqlite3.connect(caminho)
+    try:
+        origem.backup(destino)
+        destino.execute("PRAGMA journal_mode=DELETE")
+        return verificar(destino)
+    finally:
+        destino.close()
+
+def backups(pasta):
+    # Pastas de backup completas, da mais antiga à mais recente
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(os.path.join(pasta, nome) for nome in os.listdir(pasta)
+                  if not nome.endswith(SUFIXO_PARCIAL) and os.path.exists(os.path.join(pasta, nome, MANIFESTO)))
+
+class Manutencao:
+    def __init__(self, engine, pasta_backups=None, intervalos=None, ocioso_segundos=OCIOSO_SEGUNDOS,
+                 manter_backups=MANTER_BACKUPS, ao_executar=None, agendar=True):
+        # engine: a principal (SQLite em arquivo). ao_executar(rotina, ms,
+        # resultado) é chamado depois de cada execução (ex.: métricas).
+        # agendar=False não inicia a thread (linha de comando).
+        banco = engine.url.database
+        if engine.dialect.name != "sqlite" or banco in (None, "", ":memory:"):
+            raise ValueError("A manutenção só funciona com SQLite em arquivo.")
+        self.engine = engine
+        self.banco = os.path.abspath(banco)
+        self.pasta_backups = pasta_backups or os.path.join(os.path.dirname(self.banco), PASTA_BACKUPS)
+        self.intervalos = {**INTERVALOS, **(intervalos or {})}
+        self.ocioso_segundos = ocioso_segundos
+        self.manter_backups = manter_backups
+        self.ao_executar = ao_executar
+        self.em_execucao = None
+        # Conexão própria, usada só por quem executa as rotinas
+        self._conn = sqlite3.connect(self.banco, isolation_level=None, check_same_thread=False,
+                                     timeout=PRAGMAS_SQLITE["busy_timeout"] / 1000)
+        aplicar_pragmas(self._conn)
+        self._versao = self._data_version()
+        self._gravado_em = time.monotonic()  # última gravação vista (de outra conexão)
+        self._versao_backup = None
+        self._pedidos = set()
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._thread = None
+        if agendar:
+            self._thread = threading.Thread(target=self._agendar, name="manutencao", daemon=True)
+            self._thread.start()
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _observar(self):
+        # Atualiza o instante da última gravação vista; True se houve uma agora
+        versao = self._data_version()
+        if versao == self._versao:
+            return False
+        self._versao = versao
+        self._gravado_em = time.monotonic()
+        return True
+
+    def ocioso_ha(self):
+        # Segundos sem gravações no banco (atualizado pelo agendador)
+        return time.monotonic() - self._gravado_em
+
+    def proximas(self, ultimas):
+        # {rotina: datetime em que vence}; None se nunca rodou (vence já)
+        return {
+            rotina: (datetime.strptime(ultimas[rotina].iniciada_em[:19], '%Y-%m-%d %H:%M:%S')
+                     + timedelta(seconds=self.intervalos[rotina])) if rotina in ultimas else None
+            for rotina in ROTINAS
+        }
+
+    def pedir(self, rotina):
+        # Executa `rotina` assim que o agendador acordar, mesmo fora da janela ociosa
+        with self._lock:
+            self._pedidos.add(rotina)
+        self._acordar.set()
+
+    def _agendar(self):
+        while True:
+            self._acordar.wait(INTERVALO_VERIFICACAO)
+            self._acordar.clear()
+            if self._parar:
+                return
+            try:
+                self.rodar_pendentes()
+            except Exception:
+                logger.exception("Falha no agendador de manutenção")
+
+    def rodar_pendentes(self):
+        with self._lock:
+            pedidos, self._pedidos = self._pedidos, set()
+        with self.engine.connect() as conn:
+            proximas = self.proximas(ultimas_execucoes(conn))
+        agora = datetime.now()
+        for rotina in ROTINAS:
+            self._observar()
+            vencida = proximas[rotina] is None or proximas[rotina] <= agora
+            ociosa = rotina == "backup" or self.ocioso_ha() >= self.ocioso_segundos
+            if rotina in pedidos or (vencida and ociosa):
+                self.executar(rotina)
+
+    def executar(self, rotina, **opcoes):
+        # Roda e registra uma rotina; retorna (resultado, detalhes)
+        iniciada_em = _agora()
+        inicio = time.perf_counter()
+        self.em_execucao = rotina
+        try:
+            resultado, detalhes = getattr(self, rotina)(**opcoes)
+        except Exception as e:
+            logger.exception("Manutenção %s falhou", rotina)
+            resultado, detalhes = ERRO, str(e)
+        finally:
+            self.em_execucao = None
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        limite = (datetime.now() - timedelta(days=DIAS_RETENCAO)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO manutencao (rotina, iniciada_em, duracao_ms, resultado, detalhes) VALUES (?, ?, ?, ?, ?)",
+                (rotina, iniciada_em, round(duracao_ms, 1), resultado, detalhes),
+            )
+            self._conn.execute("DELETE FROM manutencao WHERE iniciada_em < ?", (limite,))
+        nivel = logging.INFO if resultado == OK else logging.ERROR
+        logger.log(nivel, "Manutenção %s: %s em %.0f ms (%s)", rotina, resultado, duracao_ms, detalhes)
+        if self.ao_executar:
+            self.ao_executar(rotina, duracao_ms, resultado)
+        return resultado, detalhes
+
+    # --- ROTINAS ---
+
+    def backup(self):
+        versao = self._data_version()
+        if versao == self._versao_backup:
+            return OK, "Nada mudou desde o último backup."
+        os.makedirs(self.pasta_backups, exist_ok=True)
+        anteriores = backups(self.pasta_backups)
+        if anteriores:
+            with open(os.path.join(anteriores[-1], MANIFESTO)) as f:
+                manifesto_anterior = json.load(f)["arquivo_morto"]
+        else:
+            manifesto_anterior = {}
+        nome = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        destino = os.path.join(self.pasta_backups, nome)
+        parcial = destino + SUFIXO_PARCIAL
+        os.makedirs(parcial)
+        try:
+            manifesto, copiados, ligados = {}, 0, 0
+            with lock_movimentacao:
+                problemas = copiar_banco(self._conn, os.path.join(parcial, os.path.basename(self.banco)))
+                registrados = self._conn.execute("SELECT ano, arquivo FROM arquivo_morto ORDER BY ano").fetchall()
+                for ano, arquivo in registrados:
+                    origem = os.path.join(os.path.dirname(self.banco), arquivo)
+                    if not os.path.exists(origem):
+                        problemas.append(f"Arquivo morto de {ano} não encontrado: {origem}")
+                        continue
+                    info = os.stat(origem)
+                    estado = [info.st_size, info.st_mtime_ns]
+                    copia = os.path.join(PASTA_ARQUIVO_MORTO, os.path.basename(arquivo))
+                    os.makedirs(os.path.join(parcial, PASTA_ARQUIVO_MORTO), exist_ok=True)
+                    manifesto[arquivo] = {"copia": copia, "estado": estado}
+                    anterior = manifesto_anterior.get(arquivo)
+                    if anterior and anterior["estado"] == estado:
+                        try:
+                            os.link(os.path.join(anteriores[-1], anterior["copia"]), os.path.join(parcial, copia))
+                            ligados += 1
+                            continue
+                        except OSError:
+                            pass  # sistema de arquivos sem hard link: copia
+                    conn_arquivo = sqlite3.connect(f"file:{origem}?mode=ro", uri=True)
+                    try:
+                        problemas += [f"{ano}: {m}" for m in copiar_banco(conn_arquivo, os.path.join(parcial, copia))]
+                    finally:
+                        conn_arquivo.close()
+                    copiados += 1
+            if problemas:
+                shutil.rmtree(parcial)
+                return PROBLEMAS, "Backup descartado: " + "; ".join(problemas)
+            with open(os.path.join(parcial, MANIFESTO), "w") as f:
+                json.dump({"banco": os.path.basename(self.banco), "criado_em": _agora(), "arquivo_morto": manifesto}, f,
+                          ensure_ascii=False, indent=2)
+            os.rename(parcial, destino)
+        except BaseException:
+            shutil.rmtree(parcial, ignore_errors=True)
+            raise
+        self._versao_backup = versao
+        removidos = self._podar()
+        tamanho = os.path.getsize(os.path.join(destino, os.path.basename(self.banco)))
+        detalhes = f"{destino}: banco {tamanho / 1024 / 1024:.1f} MB"
+        if manifesto:
+            detalhes += f"; arquivo morto: {copiados} copiado(s), {ligados} sem mudança (hard link)"
+        if removidos:
+            detalhes += f"; {removidos} backup(s) antigo(s) removido(s)"
+        return OK, detalhes + "."
+
+    def _podar(self):
+        # Mantém os `manter_backups` mais recentes; sobras de backups
+        # interrompidos também saem (só um backup por vez)
+        antigos = backups(self.pasta_backups)[:-self.manter_backups]
+        for nome in os.listdir(self.pasta_backups):
+            if nome.endswith(SUFIXO_PARCIAL):
+                shutil.rmtree(os.path.join(self.pasta_backups, nome), ignore_errors=True)
+        for caminho in antigos:
+            shutil.rmtree(caminho)
+        return len(antigos)
+
+    def estatisticas(self):
+        # PRAGMA optimize só reanalisa tabelas consultadas pela própria
+        # conexão; esta não consulta nada, então o ANALYZE é explícito
+        self._conn.execute(f"PRAGMA analysis_limit={LIMITE_ANALISE}")
+        self._conn.execute("ANALYZE")
+        indices = self._conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+        return OK, f"{indices} índice(s) analisado(s) (até {LIMITE_ANALISE} linhas cada)."
+
+    def vacuum(self, completo=False):
+        # completo: VACUUM que reescreve o banco inteiro (também junta as
+        # páginas meio vazias, que o incremental não toca); trava quem grava
+        # enquanto dura
+        conn = self._conn
+        tamanho = conn.execute("PRAGMA page_size").fetchone()[0]
+        paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+        livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        convertendo = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != INCREMENTAL
+        if completo or convertendo:
+            # Bancos anteriores ao auto_vacuum são convertidos assim, uma vez só
+            conn.execute(f"PRAGMA auto_vacuum={INCREMENTAL}")
+            conn.execute("VACUUM")
+            depois = conn.execute("PRAGMA page_count").fetchone()[0]
+            detalhes = (("Convertido para auto_vacuum incremental (VACUUM completo)" if convertendo else "VACUUM completo")
+                        + f": {_mb(paginas, tamanho):.1f} MB -> {_mb(depois, tamanho):.1f} MB")
+        else:
+            # Gravações de antes de começar não interrompem
+            self._observar()
+            devolvidas, interrompido = 0, False
+            while livres > 0:
+                if self._observar():
+                    interrompido = True
+                    break
+                conn.execute(f"PRAGMA incremental_vacuum({PAGINAS_POR_PASSO})").fetchall()
+                restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                devolvidas += livres - restantes
+                livres = restantes
+            detalhes = f"{devolvidas} página(s) livre(s) devolvida(s) ({_mb(devolvidas, tamanho):.1f} MB)"
+            if interrompido:
+                detalhes += f"; interrompido porque o banco voltou a ser usado, faltam {livres}"
+        ocupado, _, copiado = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        detalhes += "; WAL truncado." if not ocupado else f"; WAL não truncado (leituras em andamento, {copiado} página(s) copiada(s))."
+        return OK, detalhes
+
+    def verificacao(self):
+        problemas = verificar(self._conn)
+        arquivos = self._conn.execute("SELECT ano, arquivo FROM arquivo_morto ORDER BY ano").fetchall()
+        for ano, arquivo in arquivos:
+            caminho = os.path.join(os.path.dirname(self.banco), arquivo)
+            if not os.path.exists(caminho):
+                problemas.append(f"Arquivo morto de {ano} não encontrado: {caminho}")
+                continue
+            conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+            try:
+                problemas += [f"{ano}: {m}" for m in verificar(conn)]
+            finally:
+                conn.close()
+        if problemas:
+            return PROBLEMAS, "; ".join(problemas)
+        return OK, "Banco íntegro" + (f", e os {len(arquivos)} arquivo(s) do arquivo morto." if arquivos else ".")
+
+    def fechar(self):
+        self._parar = True
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+        self._conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup e manutenção do banco SQLite.")
+    parser.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    executar = comandos.add_parser("executar", help="roda as rotinas agora (todas, se nenhuma for indicada)")
+    executar.add_argument("rotinas", nargs="*", choices=ROTINAS, default=ROTINAS)
+    executar.add_argument("--pasta", default=os.environ.get('CAPS_BACKUP_DIR') or None,
+                          help=f"pasta dos backups (padrão: {PASTA_BACKUPS}/ ao lado do banco)")
+    executar.add_argument("--completo", action="store_true",
+                          help="vacuum completo (reescreve o banco; quem grava espera até o fim)")
+    listar = comandos.add_parser("listar", help="mostra as últimas execuções")
+    listar.add_argument("--limite", type=int, default=20)
+    args = parser.parse_args()
+
+    from banco import criar_engine
+    from esquema import preparar_banco
+
+    engine = criar_engine(args.banco)
+    preparar_banco(engine)
+    if args.comando == "executar":
+        manutencao = Manutencao(engine, args.pasta, agendar=False)
+        try:
+            for rotina in args.rotinas:
+                inicio = time.perf_counter()
+                opcoes = {"completo": True} if rotina == "vacuum" and args.completo else {}
+                resultado, detalhes = manutencao.executar(rotina, **opcoes)
+                print(f"{rotina:<12} {resultado:<9} {time.perf_counter() - inicio:7.1f} s  {detalhes}")
+        finally:
+            manutencao.fechar()
+    else:
+        with engine.connect() as conn:
+            for _, rotina, iniciada_em, duracao_ms, resultado, detalhes in listar_execucoes(conn, args.limite):
+                print(f"{iniciada_em[:19]}  {rotina:<12} {resultado:<9} {duracao_ms / 1000:7.1f} s  {detalhes}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import hashlib
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, DateTime, Text, Index, ForeignKey
+from sqlalchemy.orm import declarative_base
+
+# Modelos do banco, compartilhados por streamlit_app.py, app.py e os módulos
+# de cada recurso. Ficam num módulo à parte porque o Streamlit reexecuta o
+# script a cada interação: aqui as classes são definidas e mapeadas uma única
+# vez por processo. Só declarações: a criação e a atualização do esquema
+# ficam em esquema.py, e dependências pesadas (pandas, fpdf) não entram aqui.
+
+Base = declarative_base()
+
+# --- MODELOS DO BANCO DE DADOS ---
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    username = Column(String, unique=True, nullable=False)
+    password_hash = Column(String, nullable=False)
+    role = Column(String, default="user") # user, admin
+
+class Paciente(Base):
+    __tablename__ = 'pacientes'
+    id = Column(Integer, primary_key=True)
+    nome = Column(String, nullable=False)
+    # Nome sem acentos, maiúsculas e espaços extras: um cadastro por chave
+    # (homônimos com outra data de nascimento têm a data na chave)
+    chave = Column(String, unique=True, nullable=False)
+    data_nascimento = Column(Date)
+    # Cadastro duplicado que foi unificado a outro (fica como apelido)
+    unificado_em = Column(Integer, ForeignKey('pacientes.id'))
+
+class Avaliacao(Base):
+    __tablename__ = 'avaliacoes'
+    __table_args__ = (
+        # Paginação por keyset no histórico (ORDER BY data_criacao, id)
+        Index('ix_avaliacoes_data_criacao_id', 'data_criacao', 'id'),
+        # Última avaliação de cada paciente (agenda de retornos)
+        Index('ix_avaliacoes_paciente_data_id', 'paciente_nome', 'data_criacao', 'id'),
+        # Linha do tempo de um paciente, já na ordem
+        Index('ix_avaliacoes_paciente_id_data_id', 'paciente_id', 'data_criacao', 'id'),
+        # Exportação incremental (o que mudou desde a última marca d'água)
+        Index('ix_avaliacoes_atualizado_em', 'atualizado_em'),
+        # Identificador global, para a sincronização entre unidades
+        Index('ix_avaliacoes_uuid', 'uuid', unique=True),
+        # ids de avaliações movidas para o arquivo morto nunca são reutilizados
+        {'sqlite_autoincrement': True},
+    )
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String, default=lambda: uuid4().hex)
+    data_criacao = Column(Date, default=datetime.today)
+    
+    # Cabeçalho
+    cidade = Column(String, default="Angicos")
+    estado = Column(String, default="RN")
+    profissional_responsavel = Column(String)
+    
+    # Acolhimento Inicial
+    paciente_id = Column(Integer, ForeignKey('pacientes.id'))
+    paciente_nome = Column(String)  # cópia do nome do cadastro
+    data_nascimento = Column(Date)
+    sexo = Column(String)  # "F", "M" ou nulo (não informado)
+    crianca_identificada = Column(Boolean)
+    responsavel_presente = Column(Boolean)
+    responsavel_nome = Column(String)
+    motivo_atendimento = Column(Text)
+    encaminhamento_origem = Column(String)
+    observacao_comportamento = Column(Text)
+    
+    # Caderneta Vacinal
+    caderneta_apresentada = Column(Boolean)
+    vacinas_conferidas = Column(Boolean)
+    esquema_completo = Column(Boolean)
+    vacinas_atraso = Column(Boolean)
+    orientacao_responsavel_vacina = Column(Boolean)
+    encaminhamento_ubs_vacina = Column(Boolean)
+    
+    # Avaliação Nutricional
+    peso = Column(Float)
+    altura = Column(Float)
+    imc = Column(Float)
+    imc_escore_z = Column(Float)  # IMC para idade (OMS), ver crescimento.py
+    classificacao_nutricional = Column(String)
+    queixa_alimentar = Column(String)
+    orientacao_nutricional = Column(Boolean)
+    encaminhamento_nutricao = Column(Boolean)
+    
+    # Avaliação Odontológica
+    higiene_bucal = Column(Boolean)
+    carie_visivel = Column(Boolean)
+    dor_relatada = Column(Boolean)
+    orientacao_higiene_bucal = Column(Boolean)
+    encaminhamento_odontologico = Column(Boolean)
+    classificacao_odonto = Column(String)
+    
+    # Plano Inicial
+    inserido_caps = Column(Boolean)
+    encaminhamento_ubs_plano = Column(Boolean)
+    encaminhamento_nutricao_plano = Column(Boolean)
+    encaminhamento_odonto_plano = Column(Boolean)
+    encaminhamento_assistencia_social = Column(Boolean)
+    proxima_avaliacao = Column(Date)
+    registro_prontuario = Column(Boolean)
+    
+    # Controle de edição concorrente: cada gravação incrementa a versão, e
+    # uma edição só é aplicada se a versão lida ainda for a atual
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
+    atualizado_em = Column(DateTime, default=datetime.now)
+    
+    __mapper_args__ = {"version_id_col": versao}
+
+# --- FUNÇÕES UTILITÁRIAS ---
+
+def make_hash(password):
+    return hashlib.sha256(str.encode(password)).hexdigest()
+
+def check_hash(password, hash_val):
+    return make_hash(password) == hash_val
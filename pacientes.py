@@ -0,0 +1,327 @@
+import difflib
+import unicodedata
+from datetime import datetime
+from sqlalchemy import bindparam, text, Date, Integer, String
+from busca import expressao_busca
+from dependencias import pd
+
+# --- PACIENTES ---
+#
+# Cada avaliação aponta para um paciente (avaliacoes.paciente_id, indexado
+# junto com data_criacao e id). paciente_nome continua gravado na avaliação
+# (busca, agenda, PDF e CSV o usam), sempre igual ao nome do cadastro. Nomes
+# que só diferem em acentos, maiúsculas ou espaços caem no mesmo paciente
+# pela chave; erros de digitação são corrigidos unificando os cadastros, e o
+# cadastro removido fica como apelido do que permaneceu. O nome sozinho não
+# basta para juntar duas crianças: homônimos com datas de nascimento
+# diferentes ficam em cadastros diferentes, com a data na chave
+# ("joao da silva|2019-03-01"). Sem data de nascimento vale o nome. Homônimos
+# que já caíram no mesmo cadastro são separados por separar_paciente.
+
+# Campo -> destino, para a coluna "Encaminhamentos" da linha do tempo
+ENCAMINHAMENTOS = {
+    "encaminhamento_ubs_vacina": "UBS (vacinas)",
+    "encaminhamento_nutricao": "Nutrição",
+    "encaminhamento_odontologico": "Odontologia",
+    "encaminhamento_ubs_plano": "UBS",
+    "encaminhamento_nutricao_plano": "Nutrição (plano)",
+    "encaminhamento_odonto_plano": "Odontologia (plano)",
+    "encaminhamento_assistencia_social": "Assistência Social",
+}
+
+COLUNAS_LINHA_DO_TEMPO = [
+    "id", "data_criacao", "profissional_responsavel", "peso", "altura", "imc",
+    "classificacao_nutricional", "classificacao_odonto", "proxima_avaliacao",
+] + list(ENCAMINHAMENTOS)
+
+SEPARADOR_CHAVE = "|"
+
+def criar_pacientes(engine):
+    # Bancos anteriores à data de nascimento no cadastro: a coluna é criada
+    # e preenchida com a da avaliação mais recente de cada paciente
+    with engine.begin() as conn:
+        colunas = [c for _, c, *_ in conn.exec_driver_sql("PRAGMA table_info(pacientes)")]
+        if "data_nascimento" in colunas:
+            return
+        conn.execute(text("ALTER TABLE pacientes ADD COLUMN data_nascimento DATE"))
+        conn.execute(text("""
+            UPDATE pacientes SET data_nascimento = (
+                SELECT a.data_nascimento FROM avaliacoes a
+                WHERE a.paciente_id = pacientes.id AND a.data_nascimento IS NOT NULL
+                ORDER BY a.data_criacao DESC, a.id DESC LIMIT 1
+            ) WHERE unificado_em IS NULL
+        """))
+
+def limpar_nome(nome):
+    return " ".join((nome or "").split())
+
+def chave_paciente(nome):
+    # "  JOÃO  da silva" -> "joao da silva"
+    decomposto = unicodedata.normalize("NFKD", limpar_nome(nome))
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+def _agora():
+    # Mesmo formato em que o SQLAlchemy grava DateTime no SQLite
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def _iso(data):
+    # Datas como o SQLAlchemy as grava no SQLite (texto ISO)
+    return data.isoformat() if hasattr(data, "isoformat") else data
+
+def _base(chave):
+    return chave.split(SEPARADOR_CHAVE)[0]
+
+def _homonimos(conn, chave):
+    # Cadastros cuja chave tem esta base: [chave, id, nome, data de nascimento]
+    # do cadastro que vale (o unificado, se for apelido)
+    return [list(linha) for linha in conn.execute(text("""
+        SELECT a.chave, p.id, p.nome, p.data_nascimento FROM pacientes a
+        JOIN pacientes p ON p.id = COALESCE(a.unificado_em, a.id)
+        WHERE a.chave = :chave OR (a.chave > :inicio AND a.chave < :fim)
+    """), {"chave": chave, "inicio": chave + SEPARADOR_CHAVE, "fim": chave + chr(ord(SEPARADOR_CHAVE) + 1)})]
+
+def _escolher(homonimos, chave, nascimento):
+    # O cadastro de mesma data de nascimento; sem ela, o do nome. Um cadastro
+    # ainda sem data serve para qualquer data. None: é preciso um cadastro novo.
+    base = next((h for h in homonimos if h[0] == chave), None)
+    if nascimento is None:
+        return base
+    mesma = next((h for h in homonimos if h[3] == nascimento), None)
+    if mesma:
+        return mesma
+    if base and base[3] is None:
+        return base
+    return next((h for h in homonimos if h[3] is None), None)
+
+def _chave_nova(homonimos, chave, nascimento):
+    if not any(h[0] == chave for h in homonimos):
+        return chave
+    ocupadas = {h[0] for h in homonimos}
+    nova = f"{chave}{SEPARADOR_CHAVE}{nascimento or 'sem data'}"
+    n = 2
+    while nova in ocupadas:
+        nova = f"{chave}{SEPARADOR_CHAVE}{nascimento or 'sem data'}{SEPARADOR_CHAVE}{n}"
+        n += 1
+    return nova
+
+def obter_paciente(conn, nome, data_nascimento=None):
+    # (id, nome do cadastro) do paciente com este nome e data de nascimento,
+    # criado se não existir. Nome vazio -> (None, nome).
+    nome = limpar_nome(nome)
+    if not nome:
+        return None, nome
+    chave = chave_paciente(nome)
+    nascimento = _iso(data_nascimento)
+    homonimos = _homonimos(conn, chave)
+    cadastro = _escolher(homonimos, chave, nascimento)
+    if cadastro is None:
+        paciente_id = conn.execute(text(
+            "INSERT INTO pacientes (nome, chave, data_nascimento) VALUES (:nome, :chave, :nascimento)"
+        ), {"nome": nome, "chave": _chave_nova(homonimos, chave, nascimento), "nascimento": nascimento}).lastrowid
+        return paciente_id, nome
+    if nascimento is not None and cadastro[3] is None:
+        conn.execute(text("UPDATE pacientes SET data_nascimento = :nascimento WHERE id = :id"),
+                     {"nascimento": nascimento, "id": cadastro[1]})
+    return cadastro[1], cadastro[2]
+
+def vincular_pacientes(conn):
+    # Liga ao cadastro as avaliações ainda sem paciente_id (bancos antigos,
+    # importação em lote, dados sintéticos), em lotes, pelas mesmas regras de
+    # obter_paciente. A grafia mais frequente de cada chave vira o nome do
+    # cadastro. Retorna quantas avaliações foram ligadas.
+    grupos = conn.execute(text("""
+        SELECT paciente_nome, data_nascimento, COUNT(*) FROM avaliacoes
+        WHERE paciente_id IS NULL AND paciente_nome <> ''
+        GROUP BY paciente_nome, data_nascimento ORDER BY COUNT(*) DESC, paciente_nome
+    """)).all()
+    if not grupos:
+        return 0
+    cadastros = {}  # chave base -> homônimos, como em _homonimos
+    for linha in conn.execute(text(
+        "SELECT a.chave, p.id, p.nome, p.data_nascimento FROM pacientes a JOIN pacientes p ON p.id = COALESCE(a.unificado_em, a.id)"
+    )):
+        cadastros.setdefault(_base(linha[0]), []).append(list(linha))
+    novos, datas, escolhas = [], {}, []
+    for grafia, nascimento, _ in grupos:
+        chave = chave_paciente(grafia)
+        homonimos = cadastros.setdefault(chave, [])
+        cadastro = _escolher(homonimos, chave, nascimento)
+        if cadastro is None:
+            # Sem id até o INSERT; os grupos seguintes já o encontram aqui
+            cadastro = [_chave_nova(homonimos, chave, nascimento), None, limpar_nome(grafia), nascimento]
+            homonimos.append(cadastro)
+            novos.append(cadastro)
+        elif nascimento is not None and cadastro[3] is None:
+            cadastro[3] = nascimento
+            if cadastro[1] is not None:
+                datas[cadastro[1]] = nascimento
+        escolhas.append((grafia, nascimento, cadastro))
+    if novos:
+        ultimo = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM pacientes")).scalar()
+        conn.execute(text("INSERT INTO pacientes (nome, chave, data_nascimento) VALUES (:nome, :chave, :nascimento)"),
+                     [{"nome": c[2], "chave": c[0], "nascimento": c[3]} for c in novos])
+        ids = dict(conn.execute(text("SELECT chave, id FROM pacientes WHERE id > :ultimo"), {"ultimo": ultimo}).all())
+        for cadastro in novos:
+            cadastro[1] = ids[cadastro[0]]
+    if datas:
+        conn.execute(text("UPDATE pacientes SET data_nascimento = :nascimento WHERE id = :id"),
+                     [{"id": i, "nascimento": n} for i, n in datas.items()])
+    mesmo_nome, renomear = [], []
+    for grafia, nascimento, (_, paciente_id, nome, _) in escolhas:
+        parametros = {"id": paciente_id, "grafia": grafia, "nascimento": nascimento, "agora": _agora()}
+        if grafia == nome:
+            mesmo_nome.append(parametros)
+        else:
+            renomear.append({**parametros, "nome": nome})
+    if mesmo_nome:
+        conn.execute(text("""
+            UPDATE avaliacoes SET paciente_id = :id, atualizado_em = :agora
+            WHERE paciente_nome = :grafia AND data_nascimento IS :nascimento AND paciente_id IS NULL
+        """), mesmo_nome)
+    if renomear:
+        conn.execute(text("""
+            UPDATE avaliacoes SET paciente_id = :id, paciente_nome = :nome, versao = versao + 1, atualizado_em = :agora
+            WHERE paciente_nome = :grafia AND data_nascimento IS :nascimento AND paciente_id IS NULL
+        """), renomear)
+    return sum(quantidade for _, _, quantidade in grupos)
+
+def sugerir_pacientes(conn, termo, limite=20):
+    # Pacientes cujo nome tem todas as palavras do termo (prefixos, sem
+    # acentos), pelo índice de busca das avaliações. A contagem inclui as
+    # avaliações no arquivo morto; a última de cada paciente nunca vai para lá.
+    expressao = expressao_busca(termo)
+    if not expressao:
+        return []
+    consulta = text("""
+        SELECT p.id, p.nome, p.data_nascimento,
+               COUNT(*) + COALESCE((SELECT SUM(x.avaliacoes) FROM arquivo_morto_pacientes x
+                                    WHERE x.paciente_id = p.id), 0) AS avaliacoes,
+               MAX(a.data_criacao) AS ultima
+        FROM pacientes p JOIN avaliacoes a ON a.paciente_id = p.id
+        WHERE p.id IN (
+            SELECT f.paciente_id FROM avaliacoes f
+            WHERE f.id IN (SELECT rowid FROM avaliacoes_fts WHERE avaliacoes_fts MATCH :busca)
+        )
+        GROUP BY p.id
+        ORDER BY p.nome
+        LIMIT :limite
+    """).columns(id=Integer, nome=String, data_nascimento=Date, avaliacoes=Integer, ultima=Date)
+    return conn.execute(consulta, {"busca": f"paciente_nome : ({expressao})", "limite": limite}).all()
+
+def consultar_linha_do_tempo(conn, paciente_id, apelidos=()):
+    # Todas as avaliações do paciente, da mais antiga para a mais recente,
+    # direto pelo índice (paciente_id, data_criacao, id). `apelidos`: ids de
+    # cadastros unificados a este cujas avaliações ainda os usam (arquivo morto).
+    df = pd.read_sql(
+        text(f"SELECT {', '.join(COLUNAS_LINHA_DO_TEMPO)} FROM avaliacoes "
+             "WHERE paciente_id IN :ids ORDER BY data_criacao, id").bindparams(bindparam("ids", expanding=True)),
+        conn, params={"ids": [paciente_id, *apelidos]}, parse_dates=["data_criacao", "proxima_avaliacao"],
+    )
+    # Peso/altura/IMC zerados são "não avaliado"
+    for coluna in ("peso", "altura", "imc"):
+        df[coluna] = df[coluna].where(df[coluna] > 0)
+    campos = list(ENCAMINHAMENTOS)
+    df["encaminhamentos"] = [
+        ", ".join(ENCAMINHAMENTOS[c] for c, marcado in zip(campos, linha) if marcado)
+        for linha in df[campos].itertuples(index=False)
+    ]
+    return df.drop(columns=campos)
+
+def possiveis_duplicados(conn, paciente_id, limite=5):
+    # Cadastros com nome parecido (mesma inicial), para unificar erros de
+    # digitação: (id, nome, data de nascimento). Homônimos entram também.
+    chave = conn.execute(text("SELECT chave FROM pacientes WHERE id = :id"), {"id": paciente_id}).scalar()
+    if not chave:
+        return []
+    candidatos = {}
+    for c, i, nome, nascimento in conn.execute(text("""
+        SELECT chave, id, nome, data_nascimento FROM pacientes
+        WHERE chave >= :inicio AND chave < :fim AND unificado_em IS NULL AND id <> :id
+    """).columns(chave=String, id=Integer, nome=String, data_nascimento=Date), {"inicio": chave[0], "fim": chr(ord(chave[0]) + 1), "id": paciente_id}):
+        candidatos.setdefault(_base(c), []).append((i, nome, nascimento))
+    parecidos = difflib.get_close_matches(_base(chave), list(candidatos), n=limite, cutoff=0.8)
+    return [cadastro for c in parecidos for cadastro in candidatos[c]][:limite]
+
+def renomear_paciente(conn, paciente_id, nome):
+    # Corrige o nome do cadastro e de todas as suas avaliações
+    nome = limpar_nome(nome)
+    if not nome:
+        return False, "Informe o nome."
+    chave = chave_paciente(nome)
+    nascimento = conn.execute(text("SELECT data_nascimento FROM pacientes WHERE id = :id"), {"id": paciente_id}).scalar()
+    # Só fica ao lado de um homônimo se as datas de nascimento diferem
+    homonimos = [h for h in _homonimos(conn, chave) if h[1] != paciente_id]
+    if any(nascimento is None or h[3] is None or h[3] == nascimento for h in homonimos):
+        return False, "Já existe um cadastro com este nome; unifique os dois em vez de renomear."
+    if homonimos:
+        chave = f"{chave}{SEPARADOR_CHAVE}{nascimento}"
+    if conn.execute(text("SELECT 1 FROM pacientes WHERE chave = :chave AND id <> :id"),
+                    {"chave": chave, "id": paciente_id}).first():
+        return False, "Já existe um cadastro com este nome; unifique os dois em vez de renomear."
+    conn.execute(text("UPDATE pacientes SET nome = :nome, chave = :chave WHERE id = :id"),
+                 {"nome": nome, "chave": chave, "id": paciente_id})
+    conn.execute(text("""
+        UPDATE avaliacoes SET paciente_nome = :nome, versao = versao + 1, atualizado_em = :agora
+        WHERE paciente_id = :id AND paciente_nome <> :nome
+    """), {"nome": nome, "id": paciente_id, "agora": _agora()})
+    return True, "Nome atualizado."
+
+def separar_paciente(conn, paciente_id, avaliacao_ids):
+    # Passa as avaliações escolhidas para um cadastro novo com o mesmo nome
+    # (homônimos que caíram no mesmo cadastro). Só as do banco principal: as
+    # do arquivo morto ficam com o cadastro original.
+    paciente = conn.execute(text("SELECT nome, chave, data_nascimento FROM pacientes WHERE id = :id"),
+                            {"id": paciente_id}).one_or_none()
+    if paciente is None:
+        return False, "Cadastro não encontrado."
+    ids = bindparam("ids", expanding=True)
+    escolhidas = conn.execute(text(
+        "SELECT id, data_nascimento FROM avaliacoes WHERE paciente_id = :id AND id IN :ids"
+    ).bindparams(ids), {"id": paciente_id, "ids": list(avaliacao_ids)}).all()
+    if not escolhidas:
+        return False, "Escolha avaliações deste paciente que não estejam no arquivo morto."
+    restantes = conn.execute(text(
+        "SELECT DISTINCT data_nascimento FROM avaliacoes WHERE paciente_id = :id AND id NOT IN :ids"
+    ).bindparams(ids), {"id": paciente_id, "ids": [i for i, _ in escolhidas]}).scalars().all()
+    if not restantes:
+        return False, "Deixe pelo menos uma avaliação no cadastro atual."
+    nascimentos = {n for _, n in escolhidas if n is not None}
+    nascimento = nascimentos.pop() if len(nascimentos) == 1 else None
+    base = _base(paciente.chave)
+    novo_id = conn.execute(text(
+        "INSERT INTO pacientes (nome, chave, data_nascimento) VALUES (:nome, :chave, :nascimento)"
+    ), {"nome": paciente.nome, "chave": _chave_nova(_homonimos(conn, base), base, nascimento),
+        "nascimento": nascimento}).lastrowid
+    conn.execute(text("""
+        UPDATE avaliacoes SET paciente_id = :novo, versao = versao + 1, atualizado_em = :agora
+        WHERE paciente_id = :id AND id IN :ids
+    """).bindparams(ids), {"novo": novo_id, "id": paciente_id, "ids": [i for i, _ in escolhidas], "agora": _agora()})
+    # A data do cadastro original passa a ser a das avaliações que ficaram
+    if nascimento is not None and paciente.data_nascimento == nascimento:
+        ficou = [n for n in restantes if n is not None]
+        conn.execute(text("UPDATE pacientes SET data_nascimento = :nascimento WHERE id = :id"),
+                     {"nascimento": ficou[0] if len(ficou) == 1 else None, "id": paciente_id})
+    return True, f"{len(escolhidas)} avaliação(ões) passaram para um novo cadastro de {paciente.nome}."
+
+def unificar_pacientes(conn, manter_id, remover_id):
+    # Passa as avaliações de `remover_id` para `manter_id`; o cadastro
+    # removido (e os apelidos dele) passa a apontar para o que ficou
+    if manter_id == remover_id:
+        return False, "Escolha dois cadastros diferentes."
+    nome = conn.execute(text("SELECT nome FROM pacientes WHERE id = :id"), {"id": manter_id}).scalar()
+    if nome is None:
+        return False, "Cadastro não encontrado."
+    movidas = conn.execute(text("""
+        UPDATE avaliacoes SET paciente_id = :manter, paciente_nome = :nome, versao = versao + 1, atualizado_em = :agora
+        WHERE paciente_id = :remover
+    """), {"manter": manter_id, "remover": remover_id, "nome": nome, "agora": _agora()}).rowcount
+    conn.execute(text("UPDATE pacientes SET unificado_em = :manter WHERE id = :remover OR unificado_em = :remover"),
+                 {"manter": manter_id, "remover": remover_id})
+    # Contagens do arquivo morto (as avaliações de lá continuam com o id antigo)
+    conn.execute(text("""
+        INSERT INTO arquivo_morto_pacientes (paciente_id, ano, avaliacoes)
+        SELECT :manter, ano, avaliacoes FROM arquivo_morto_pacientes WHERE paciente_id = :remover
+        ON CONFLICT (paciente_id, ano) DO UPDATE SET avaliacoes = avaliacoes + excluded.avaliacoes
+    """), {"manter": manter_id, "remover": remover_id})
+    conn.execute(text("DELETE FROM arquivo_morto_pacientes WHERE paciente_id = :remover"), {"remover": remover_id})
+    return True, f"{movidas} avaliação(ões) passaram para {nome}."
@@ -0,0 +1,145 @@
+import re
+from sqlalchemy import text
+from arquivo_morto import SEM_MOVIMENTACAO
+from banco import recriar_gatilhos
+from dependencias import pd
+
+# --- RESUMOS MENSAIS (PAINEL) ---
+#
+# Tabela de agregados por mês, profissional e cidade, mantida de forma
+# incremental por gatilhos: cada INSERT soma a linha ao seu grupo, cada
+# DELETE subtrai e cada UPDATE subtrai a versão antiga e soma a nova. O
+# painel consulta só esta tabela, nunca a tabela avaliacoes.
+
+# Métrica -> expressão SQL sobre a linha ({r} = new/old). Valores booleanos
+# nulos contam como 0.
+METRICAS_RESUMO = {
+    "total": "1",
+    # Encaminhamentos, por campo do formulário
+    "encaminhamento_ubs_vacina": "{r}.encaminhamento_ubs_vacina",
+    "encaminhamento_nutricao": "{r}.encaminhamento_nutricao",
+    "encaminhamento_odontologico": "{r}.encaminhamento_odontologico",
+    "encaminhamento_ubs_plano": "{r}.encaminhamento_ubs_plano",
+    "encaminhamento_nutricao_plano": "{r}.encaminhamento_nutricao_plano",
+    "encaminhamento_odonto_plano": "{r}.encaminhamento_odonto_plano",
+    "encaminhamento_assistencia_social": "{r}.encaminhamento_assistencia_social",
+    # Crianças encaminhadas por destino (em qualquer seção da ficha)
+    "encaminhados_ubs": "{r}.encaminhamento_ubs_vacina OR {r}.encaminhamento_ubs_plano",
+    "encaminhados_nutricao": "{r}.encaminhamento_nutricao OR {r}.encaminhamento_nutricao_plano",
+    "encaminhados_odontologia": "{r}.encaminhamento_odontologico OR {r}.encaminhamento_odonto_plano",
+    # Achados
+    "vacinas_atraso": "{r}.vacinas_atraso",
+    "esquema_completo": "{r}.esquema_completo",
+    "carie_visivel": "{r}.carie_visivel",
+    "dor_relatada": "{r}.dor_relatada",
+    "inserido_caps": "{r}.inserido_caps",
+    # Classificações
+    "nutricional_nao_avaliado": "{r}.classificacao_nutricional = 'Não avaliado'",
+    "nutricional_baixo_peso": "{r}.classificacao_nutricional = 'Baixo peso'",
+    "nutricional_eutrofia": "{r}.classificacao_nutricional = 'Eutrofia (Peso adequado)'",
+    "nutricional_sobrepeso": "{r}.classificacao_nutricional = 'Sobrepeso'",
+    "nutricional_obesidade": "{r}.classificacao_nutricional = 'Obesidade'",
+    "odonto_rotina": "{r}.classificacao_odonto = 'Rotina'",
+    "odonto_urgencia": "{r}.classificacao_odonto = 'Urgência'",
+}
+
+CHAVES_RESUMO = {
+    "mes": "COALESCE(strftime('%Y-%m', {r}.data_criacao), '')",
+    "profissional": "COALESCE({r}.profissional_responsavel, '')",
+    "cidade": "COALESCE({r}.cidade, '')",
+}
+
+# Colunas de avaliacoes lidas pelos resumos (o gatilho de UPDATE só dispara nelas)
+COLUNAS_ORIGEM = sorted({
+    coluna
+    for expr in list(CHAVES_RESUMO.values()) + list(METRICAS_RESUMO.values())
+    for coluna in re.findall(r"\{r\}\.(\w+)", expr)
+})
+
+def _valores(r, sinal):
+    chaves = [expr.format(r=r) for expr in CHAVES_RESUMO.values()]
+    metricas = [f"{sinal}COALESCE({expr.format(r=r)}, 0)" for expr in METRICAS_RESUMO.values()]
+    return ", ".join(chaves + metricas)
+
+def _upsert(r, sinal):
+    colunas = ", ".join(list(CHAVES_RESUMO) + list(METRICAS_RESUMO))
+    somas = ", ".join(f"{m} = {m} + excluded.{m}" for m in METRICAS_RESUMO)
+    return (
+        f"INSERT INTO resumo_mensal ({colunas}) VALUES ({_valores(r, sinal)}) "
+        f"ON CONFLICT (mes, profissional, cidade) DO UPDATE SET {somas};"
+    )
+
+def _limpar(r):
+    # Grupos que ficaram sem avaliações
+    condicao = " AND ".join(f"{c} = {expr.format(r=r)}" for c, expr in CHAVES_RESUMO.items())
+    return f"DELETE FROM resumo_mensal WHERE {condicao} AND total <= 0;"
+
+def _ddl_resumos():
+    metricas = ",\n        ".join(f"{m} INTEGER NOT NULL DEFAULT 0" for m in METRICAS_RESUMO)
+    return [
+        f"""CREATE TABLE IF NOT EXISTS resumo_mensal (
+        mes TEXT NOT NULL,
+        profissional TEXT NOT NULL,
+        cidade TEXT NOT NULL,
+        {metricas},
+        PRIMARY KEY (mes, profissional, cidade)
+    )""",
+        f"""CREATE TRIGGER IF NOT EXISTS resumo_mensal_ai AFTER INSERT ON avaliacoes
+    WHEN {SEM_MOVIMENTACAO} BEGIN
+        {_upsert('new', '')}
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS resumo_mensal_ad AFTER DELETE ON avaliacoes
+    WHEN {SEM_MOVIMENTACAO} BEGIN
+        {_upsert('old', '-')}
+        {_limpar('old')}
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS resumo_mensal_au
+    AFTER UPDATE OF {', '.join(COLUNAS_ORIGEM)} ON avaliacoes BEGIN
+        {_upsert('old', '-')}
+        {_limpar('old')}
+        {_upsert('new', '')}
+    END""",
+    ]
+
+def reconstruir_resumos(conn):
+    colunas = ", ".join(list(CHAVES_RESUMO) + list(METRICAS_RESUMO))
+    chaves = ", ".join(f"{expr.format(r='a')} AS {c}" for c, expr in CHAVES_RESUMO.items())
+    somas = ", ".join(f"SUM(COALESCE({expr.format(r='a')}, 0))" for expr in METRICAS_RESUMO.values())
+    conn.execute(text("DELETE FROM resumo_mensal"))
+    conn.execute(text(
+        f"INSERT INTO resumo_mensal ({colunas}) "
+        f"SELECT {chaves}, {somas} FROM avaliacoes a GROUP BY {', '.join(CHAVES_RESUMO)}"
+    ))
+
+def criar_resumos(engine):
+    with engine.begin() as conn:
+        existia = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'resumo_mensal'")).first()
+        recriar_gatilhos(conn, _ddl_resumos())
+        for ddl in _ddl_resumos():
+            conn.execute(text(ddl))
+        # Bancos que já tinham avaliações antes dos resumos existirem
+        if not existia:
+            reconstruir_resumos(conn)
+
+def consultar_resumos(conn, mes_inicio=None, mes_fim=None, profissional=None, cidade=None):
+    # Um DataFrame com uma linha por mês/profissional/cidade dentro do filtro
+    condicoes, params = [], {}
+    if mes_inicio:
+        condicoes.append("mes >= :mes_inicio")
+        params["mes_inicio"] = mes_inicio
+    if mes_fim:
+        condicoes.append("mes <= :mes_fim")
+        params["mes_fim"] = mes_fim
+    if profissional:
+        condicoes.append("profissional = :profissional")
+        params["profissional"] = profissional
+    if cidade:
+        condicoes.append("cidade = :cidade")
+        params["cidade"] = cidade
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return pd.read_sql(text(f"SELECT * FROM resumo_mensal {where} ORDER BY mes, profissional, cidade"), conn, params=params)
+
+def opcoes_resumos(conn, coluna):
+    # Valores distintos de uma chave (mes, profissional ou cidade) para os filtros
+    assert coluna in CHAVES_RESUMO
+    return [v for (v,) in conn.execute(text(f"SELECT DISTINCT {coluna} FROM resumo_mensal ORDER BY {coluna}"))]
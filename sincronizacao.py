@@ -0,0 +1,506 @@
+# Sincronização entre unidades: cada CAPS roda o app com o próprio banco e
+# as avaliações de todas são consolidadas por pacotes de alterações.
+#
+# Uso, a partir da raiz do projeto:
+#     python -m sincronizacao unidade --banco sqlite:///caps_data.db [--nome "CAPS Angicos"]
+#     python -m sincronizacao exportar --banco sqlite:///caps_data.db --saida pacote.jsonl.gz [--desde ...] [--para UNIDADE]
+#     python -m sincronizacao aplicar --banco sqlite:///consolidado.db pacote.jsonl.gz
+#     python -m sincronizacao sincronizar --origem sqlite:///angicos.db --destino sqlite:///consolidado.db [--nos-dois-sentidos]
+#
+# Cada banco tem um identificador de unidade (sincronizacao_site) e cada
+# avaliação um uuid, que vale em todas as unidades (o id continua local).
+# Um pacote (JSON em linhas, gzip) leva as avaliações alteradas e as
+# exclusões numa janela do relógio de quem exporta, [desde, ate), lida pelo
+# índice de atualizado_em: o custo acompanha o volume novo, não o total.
+# Quem recebe guarda, por unidade de origem, até onde já aplicou
+# (sincronizacao_marcas); é o --desde da próxima exportação. Aplicar o mesmo
+# pacote de novo não muda nada. O pacote completo (sem --desde) leva também
+# o arquivo morto, e as avaliações de um pacote que estão arquivadas em quem
+# recebe voltam antes ao banco principal (arquivo_morto.py).
+#
+# Conflitos: para cada uuid fica o hash do conteúdo da última versão em
+# comum entre as unidades (sincronizacao_estado), com quando e onde ela foi
+# editada. Se só um lado mudou desde então, vale a mudança; se os dois
+# mudaram, vence a edição mais recente (empate: maior id de unidade) e a
+# versão perdedora fica em sincronizacao_conflitos para revisão (e não é
+# aplicada de novo se voltar num pacote repetido). O nome do
+# paciente entra no hash pela chave do cadastro, então grafias que o
+# cadastro de cada unidade normaliza não contam como edição.
+
+import argparse
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from arquivo_morto import SEM_MOVIMENTACAO, ArquivoMorto, listar_arquivos, restaurar_avaliacoes
+from banco import recriar_gatilhos
+from pacientes import chave_paciente, vincular_pacientes
+
+VERSAO_PACOTE = 1
+# Como na exportação Parquet: linhas gravadas há menos que isto ficam para
+# o próximo pacote (o atualizado_em é calculado antes do commit)
+MARGEM_SEGUNDOS = 60
+TAMANHO_LOTE_SINCRONIZACAO = 5000
+TAMANHO_LOTE_RESTAURACAO = 50_000  # uuids do pacote procurados por vez no arquivo morto
+NIVEL_GZIP = 6  # o padrão (9) custa o dobro de tempo por poucos % de tamanho
+FORMATO_DATA_HORA = '%Y-%m-%d %H:%M:%S.%f'  # como o SQLAlchemy grava DateTime no SQLite
+AGORA_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+# Colunas que não viajam: identificação e controle locais
+COLUNAS_LOCAIS = ('id', 'uuid', 'paciente_id', 'versao', 'atualizado_em')
+
+DDL_SINCRONIZACAO = [
+    "CREATE TABLE IF NOT EXISTS sincronizacao_site (id TEXT PRIMARY KEY, nome TEXT)",
+    """CREATE TABLE IF NOT EXISTS sincronizacao_estado (
+        uuid TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        editado_em TEXT NOT NULL,
+        site TEXT NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS sincronizacao_exclusoes (
+        uuid TEXT PRIMARY KEY,
+        excluida_em TEXT NOT NULL,
+        site TEXT,
+        registrada_em TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_sincronizacao_exclusoes_registrada_em ON sincronizacao_exclusoes (registrada_em)",
+    """CREATE TABLE IF NOT EXISTS sincronizacao_marcas (
+        site TEXT PRIMARY KEY,
+        nome TEXT,
+        ate TEXT NOT NULL,
+        aplicado_em TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS sincronizacao_conflitos (
+        id INTEGER PRIMARY KEY,
+        uuid TEXT NOT NULL,
+        registrado_em TEXT NOT NULL,
+        vencedor_site TEXT NOT NULL,
+        vencedor_editado_em TEXT NOT NULL,
+        perdedor_site TEXT NOT NULL,
+        perdedor_editado_em TEXT NOT NULL,
+        perdedor_hash TEXT,
+        perdedor TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_sincronizacao_conflitos_uuid ON sincronizacao_conflitos (uuid)",
+    # uuid das avaliações gravadas fora do ORM (importação CSV, dados sintéticos)
+    """CREATE TRIGGER IF NOT EXISTS avaliacoes_uuid_ai AFTER INSERT ON avaliacoes WHEN new.uuid IS NULL BEGIN
+        UPDATE avaliacoes SET uuid = lower(hex(randomblob(16))) WHERE id = new.id;
+    END""",
+    # site NULL: excluída nesta unidade
+    f"""CREATE TRIGGER IF NOT EXISTS sincronizacao_exclusoes_ad AFTER DELETE ON avaliacoes
+    WHEN old.uuid IS NOT NULL AND {SEM_MOVIMENTACAO} BEGIN
+        INSERT OR REPLACE INTO sincronizacao_exclusoes (uuid, excluida_em, site, registrada_em)
+        VALUES (old.uuid, {AGORA_SQL}, NULL, {AGORA_SQL});
+        DELETE FROM sincronizacao_estado WHERE uuid = old.uuid;
+    END""",
+]
+
+def criar_sincronizacao(engine):
+    with engine.begin() as conn:
+        recriar_gatilhos(conn, DDL_SINCRONIZACAO)
+        for ddl in DDL_SINCRONIZACAO:
+            conn.execute(text(ddl))
+        # Avaliações de antes da sincronização ganham seu uuid
+        conn.execute(text("UPDATE avaliacoes SET uuid = lower(hex(randomblob(16))) WHERE uuid IS NULL"))
+        conn.execute(text("INSERT INTO sincronizacao_site (id) SELECT :id WHERE NOT EXISTS (SELECT 1 FROM sincronizacao_site)"),
+                     {"id": uuid.uuid4().hex})
+
+def _agora():
+    return datetime.now().strftime(FORMATO_DATA_HORA)
+
+def colunas_sincronizadas():
+    from modelos import Avaliacao
+    return [c.name for c in Avaliacao.__table__.columns if c.name not in COLUNAS_LOCAIS]
+
+def unidade(conn):
+    # (id, nome) desta unidade
+    return tuple(conn.execute(text("SELECT id, nome FROM sincronizacao_site")).one())
+
+def marca(conn, site):
+    # Até onde (no relógio de `site`) este banco já aplicou os pacotes de `site`
+    return conn.execute(text("SELECT ate FROM sincronizacao_marcas WHERE site = :site"), {"site": site}).scalar()
+
+# O mesmo paciente aparece em várias avaliações
+_chave = functools.lru_cache(maxsize=65536)(chave_paciente)
+
+def hash_conteudo(colunas, valores):
+    # Valores crus do SQLite (texto, números, None): repr é estável. Colunas
+    # nulas não entram, então uma coluna nova no modelo (vazia nas avaliações
+    # que já existiam) não conta como edição
+    itens = [(c, _chave(v) if c == 'paciente_nome' else v) for c, v in zip(colunas, valores) if v is not None]
+    return hashlib.sha1(repr(itens).encode()).hexdigest()
+
+_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), check_circular=False).encode
+
+# --- EXPORTAÇÃO ---
+
+def exportar_alteracoes(engine, caminho, desde=None, para=None, margem=timedelta(seconds=MARGEM_SEGUNDOS),
+                        tamanho_lote=TAMANHO_LOTE_SINCRONIZACAO):
+    # Grava em `caminho` o pacote com o que mudou desde `desde` (tudo, se
+    # None). Com `para`, deixa de fora o que veio daquela unidade e não
+    # mudou aqui. Retorna um resumo.
+    inicio = time.perf_counter()
+    colunas = colunas_sincronizadas()
+    corte = (datetime.now() - margem).strftime(FORMATO_DATA_HORA)
+    janela = "a.atualizado_em < :corte" + (" AND a.atualizado_em >= :desde" if desde else " OR a.atualizado_em IS NULL")
+    parametros = {"corte": corte, "desde": desde}
+    avaliacoes = exclusoes = puladas = 0
+    publicadas = []
+
+    with engine.begin() as conn, gzip.open(caminho + ".tmp", "wt", compresslevel=NIVEL_GZIP, encoding="utf-8") as saida:
+        site, nome = unidade(conn)
+        saida.write(_json({"versao": VERSAO_PACOTE, "site": site, "nome": nome, "desde": desde, "ate": corte,
+                           "colunas": colunas}) + "\n")
+
+        def escrever(lote):
+            # Linhas (uuid, atualizado_em, hash, editado_em, site, valores...)
+            nonlocal avaliacoes, puladas
+            for uuid_linha, atualizado_em, hash_base, editado_em, autor, *valores in lote:
+                hash_atual = hash_conteudo(colunas, valores)
+                if hash_atual == hash_base:
+                    # Sem edição local desde a última versão em comum: segue
+                    # com a data e a unidade da edição original
+                    if autor == para:
+                        puladas += 1
+                        continue
+                else:
+                    editado_em, autor = atualizado_em or "", site
+                    if hash_base is None:
+                        publicadas.append((uuid_linha, hash_atual, editado_em, autor))
+                saida.write(_json(["a", uuid_linha, editado_em, autor] + valores) + "\n")
+                avaliacoes += 1
+
+        resultado = conn.execution_options(stream_results=True).execute(text(f"""
+            SELECT a.uuid, a.atualizado_em, e.hash, e.editado_em, e.site, {', '.join('a.' + c for c in colunas)}
+            FROM avaliacoes a LEFT JOIN sincronizacao_estado e ON e.uuid = a.uuid
+            WHERE {janela} ORDER BY a.atualizado_em, a.id
+        """), parametros)
+        while True:
+            lote = resultado.fetchmany(tamanho_lote)
+            if not lote:
+                break
+            escrever(lote)
+
+        def escrever_arquivo(conn_arquivo):
+            # O estado da sincronização das arquivadas continua no banco principal
+            resultado = conn_arquivo.execution_options(stream_results=True).execute(text(
+                f"SELECT uuid, atualizado_em, {', '.join(colunas)} FROM avaliacoes ORDER BY atualizado_em, id"
+            ))
+            while True:
+                lote = resultado.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                estados = {linha[0]: linha[1:] for linha in conn.exec_driver_sql(
+                    f"SELECT uuid, hash, editado_em, site FROM sincronizacao_estado "
+                    f"WHERE uuid IN ({', '.join('?' * len(lote))})", tuple(linha[0] for linha in lote))}
+                escrever([(linha[0], linha[1], *estados.get(linha[0], (None, None, None)), *linha[2:]) for linha in lote])
+
+        if desde is None:
+            # Pacote completo: inclui o arquivo morto
+            arquivo = ArquivoMorto(engine)
+            try:
+                arquivo.consultar(escrever_arquivo)
+            finally:
+                arquivo.fechar()
+
+        for uuid_excluida, excluida_em, autor in conn.execute(text(f"""
+            SELECT uuid, excluida_em, COALESCE(site, :site) FROM sincronizacao_exclusoes
+            WHERE registrada_em < :corte {'AND registrada_em >= :desde' if desde else ''}
+            ORDER BY registrada_em
+        """), {**parametros, "site": site}):
+            if autor == para:
+                puladas += 1
+                continue
+            saida.write(_json(["x", uuid_excluida, excluida_em, autor]) + "\n")
+            exclusoes += 1
+        # Sem esta linha o pacote está truncado (transferência interrompida)
+        saida.write(_json({"fim": True, "avaliacoes": avaliacoes, "exclusoes": exclusoes}) + "\n")
+        # Avaliações que saem daqui pela primeira vez: esta é a versão em
+        # comum (as já compartilhadas só mudam de base ao receber um pacote)
+        if publicadas:
+            conn.exec_driver_sql("INSERT OR IGNORE INTO sincronizacao_estado (uuid, hash, editado_em, site) "
+                                 "VALUES (?, ?, ?, ?)", publicadas)
+    os.replace(caminho + ".tmp", caminho)
+
+    return {
+        "site": site, "desde": desde, "ate": corte, "avaliacoes": avaliacoes, "exclusoes": exclusoes,
+        "puladas": puladas, "bytes": os.path.getsize(caminho), "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+# --- APLICAÇÃO ---
+
+def _ler_pacote(caminho):
+    with gzip.open(caminho, "rt", encoding="utf-8") as entrada:
+        for linha in entrada:
+            yield json.loads(linha)
+
+def _locais(conn, colunas, uuids):
+    # uuid -> (id, atualizado_em, hash, editado_em, site, valores...) das avaliações daqui
+    if not uuids:
+        return {}
+    return {linha[0]: linha[1:] for linha in conn.exec_driver_sql(f"""
+        SELECT a.uuid, a.id, a.atualizado_em, e.hash, e.editado_em, e.site, {', '.join('a.' + c for c in colunas)}
+        FROM avaliacoes a LEFT JOIN sincronizacao_estado e ON e.uuid = a.uuid
+        WHERE a.uuid IN ({', '.join('?' * len(uuids))})
+    """, tuple(uuids))}
+
+def aplicar_alteracoes(engine, caminho, tamanho_lote=TAMANHO_LOTE_SINCRONIZACAO):
+    # Aplica um pacote numa única transação (um pacote truncado não deixa
+    # nada pela metade) e retorna um resumo
+    inicio = time.perf_counter()
+    colunas = colunas_sincronizadas()
+    posicao_nome = colunas.index('paciente_nome')
+    pacote = _ler_pacote(caminho)
+    cabecalho = next(pacote)
+    if cabecalho.get("versao") != VERSAO_PACOTE:
+        raise ValueError(f"Versão de pacote não suportada: {cabecalho.get('versao')}")
+    # Colunas que o pacote não traz (versão anterior do app) ficam vazias
+    posicoes = {c: i for i, c in enumerate(cabecalho["colunas"])}
+    contagem = dict.fromkeys(["inseridas", "atualizadas", "iguais", "antigas", "conflitos", "excluidas"], 0)
+    fim = None
+
+    # Avaliações do pacote que estão no arquivo morto voltam antes ao banco
+    # principal, para serem comparadas, atualizadas ou excluídas como as demais
+    with engine.connect() as conn:
+        arquivos = listar_arquivos(conn)
+    if arquivos:
+        uuids = (registro[1] for registro in _ler_pacote(caminho) if isinstance(registro, list))
+        while True:
+            parte = list(itertools.islice(uuids, TAMANHO_LOTE_RESTAURACAO))
+            if not parte:
+                break
+            restaurar_avaliacoes(engine, uuids=parte)
+
+    with engine.begin() as conn:
+        site, _ = unidade(conn)
+        if cabecalho["site"] == site:
+            raise ValueError("O pacote foi exportado por esta mesma unidade.")
+        agora = _agora()
+        inserir = (f"INSERT INTO avaliacoes (uuid, {', '.join(colunas)}, versao, atualizado_em) "
+                   f"VALUES ({', '.join('?' * (len(colunas) + 3))})")
+        # O paciente_id é refeito por vincular_pacientes quando o nome muda
+        atualizar = (f"UPDATE avaliacoes SET {', '.join(c + ' = ?' for c in colunas)}, "
+                     "paciente_id = CASE WHEN paciente_nome = ? THEN paciente_id END, "
+                     "versao = versao + 1, atualizado_em = ? WHERE id = ?")
+        gravar_estado = ("INSERT INTO sincronizacao_estado (uuid, hash, editado_em, site) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (uuid) DO UPDATE SET hash = excluded.hash, editado_em = excluded.editado_em, "
+                         "site = excluded.site")
+        gravar_conflito = ("INSERT INTO sincronizacao_conflitos (uuid, registrado_em, vencedor_site, vencedor_editado_em, "
+                           "perdedor_site, perdedor_editado_em, perdedor_hash, perdedor) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+        def aplicar_lote(lote):
+            inseridas, atualizadas, estados, conflitos = [], [], [], []
+            uuids = [r[1] for r in lote]
+            locais = _locais(conn, colunas, uuids)
+            excluidas_aqui = {u: (excluida_em, autor) for u, excluida_em, autor in conn.exec_driver_sql(f"""
+                SELECT uuid, excluida_em, COALESCE(site, ?) FROM sincronizacao_exclusoes
+                WHERE uuid IN ({', '.join('?' * len(uuids))})
+            """, (site, *uuids))}
+            # Versões que já perderam um conflito aqui não voltam a ser aplicadas
+            rejeitadas = set(conn.exec_driver_sql(f"""
+                SELECT uuid, perdedor_hash FROM sincronizacao_conflitos
+                WHERE perdedor_hash IS NOT NULL AND uuid IN ({', '.join('?' * len(uuids))})
+            """, tuple(uuids)))
+            reincluidas = []
+            for _, uuid_remoto, editado_em, autor, *recebidos in lote:
+                valores = [recebidos[posicoes[c]] if c in posicoes else None for c in colunas]
+                remoto = (editado_em, autor)
+                hash_remoto = hash_conteudo(colunas, valores)
+                local = locais.get(uuid_remoto)
+                if local is None:
+                    exclusao = excluidas_aqui.get(uuid_remoto)
+                    if exclusao and exclusao >= remoto:
+                        contagem["antigas"] += 1  # excluída aqui depois; a exclusão segue no próximo pacote
+                        continue
+                    if exclusao:
+                        # Editada lá depois de excluída aqui: volta
+                        reincluidas.append((uuid_remoto,))
+                        conflitos.append((uuid_remoto, agora, autor, editado_em, exclusao[1], exclusao[0], None, None))
+                    inseridas.append((uuid_remoto, *valores, 1, agora))
+                    estados.append((uuid_remoto, hash_remoto, editado_em, autor))
+                    continue
+                avaliacao_id, atualizado_em, hash_base, base_editado_em, base_site, *valores_locais = local
+                hash_local = hash_conteudo(colunas, valores_locais)
+                if (uuid_remoto, hash_remoto) in rejeitadas:
+                    contagem["antigas"] += 1
+                elif hash_local == hash_remoto:
+                    if hash_base != hash_remoto:
+                        estados.append((uuid_remoto, hash_remoto, editado_em, autor))
+                    contagem["iguais"] += 1
+                elif hash_local == hash_base:
+                    atualizadas.append((*valores, valores[posicao_nome], agora, avaliacao_id))
+                    estados.append((uuid_remoto, hash_remoto, editado_em, autor))
+                elif hash_remoto == hash_base:
+                    contagem["antigas"] += 1
+                else:
+                    # Editada nos dois lados desde a última versão em comum
+                    local_carimbo = (atualizado_em or "", site)
+                    if remoto > local_carimbo:
+                        atualizadas.append((*valores, valores[posicao_nome], agora, avaliacao_id))
+                        estados.append((uuid_remoto, hash_remoto, editado_em, autor))
+                        conflitos.append((uuid_remoto, agora, autor, editado_em, site, local_carimbo[0], hash_local,
+                                          _json(dict(zip(colunas, valores_locais)))))
+                    else:
+                        estados.append((uuid_remoto, hash_local, *local_carimbo))
+                        conflitos.append((uuid_remoto, agora, site, local_carimbo[0], autor, editado_em, hash_remoto,
+                                          _json(dict(zip(colunas, valores)))))
+            if reincluidas:
+                conn.exec_driver_sql("DELETE FROM sincronizacao_exclusoes WHERE uuid = ?", reincluidas)
+            if inseridas:
+                conn.exec_driver_sql(inserir, inseridas)
+            if atualizadas:
+                conn.exec_driver_sql(atualizar, atualizadas)
+            if estados:
+                conn.exec_driver_sql(gravar_estado, estados)
+            if conflitos:
+                conn.exec_driver_sql(gravar_conflito, conflitos)
+            contagem["inseridas"] += len(inseridas)
+            contagem["atualizadas"] += len(atualizadas)
+            contagem["conflitos"] += len(conflitos)
+
+        def aplicar_exclusao(uuid_excluida, excluida_em, autor):
+            local = _locais(conn, colunas, [uuid_excluida]).get(uuid_excluida)
+            if local is None:
+                # Nunca chegou aqui (ou já foi excluída): só repassa a exclusão adiante
+                conn.execute(text("""
+                    INSERT OR IGNORE INTO sincronizacao_exclusoes (uuid, excluida_em, site, registrada_em)
+                    VALUES (:uuid, :excluida_em, :site, :agora)
+                """), {"uuid": uuid_excluida, "excluida_em": excluida_em, "site": autor, "agora": agora})
+                return
+            avaliacao_id, atualizado_em, hash_base, _, _, *valores_locais = local
+            local_carimbo = (atualizado_em or "", site)
+            if hash_conteudo(colunas, valores_locais) != hash_base and local_carimbo > (excluida_em, autor):
+                # Editada aqui depois de excluída lá: fica, e a edição segue no próximo pacote
+                ja_registrado = conn.exec_driver_sql(
+                    "SELECT 1 FROM sincronizacao_conflitos WHERE uuid = ? AND perdedor IS NULL "
+                    "AND perdedor_site = ? AND perdedor_editado_em = ?", (uuid_excluida, autor, excluida_em)
+                ).first()
+                if ja_registrado:
+                    contagem["antigas"] += 1
+                    return
+                conn.exec_driver_sql(gravar_conflito, (uuid_excluida, agora, site, local_carimbo[0], autor,
+                                                       excluida_em, None, None))
+                contagem["conflitos"] += 1
+                return
+            conn.execute(text("DELETE FROM avaliacoes WHERE id = :id"), {"id": avaliacao_id})
+            conn.execute(text("UPDATE sincronizacao_exclusoes SET excluida_em = :excluida_em, site = :site "
+                              "WHERE uuid = :uuid"), {"uuid": uuid_excluida, "excluida_em": excluida_em, "site": autor})
+            contagem["excluidas"] += 1
+
+        lote = []
+        for registro in pacote:
+            if isinstance(registro, dict):
+                fim = registro
+                break
+            if registro[0] == "a":
+                lote.append(registro)
+                if len(lote) >= tamanho_lote:
+                    aplicar_lote(lote)
+                    lote = []
+            else:
+                if lote:
+                    aplicar_lote(lote)
+                    lote = []
+                aplicar_exclusao(*registro[1:])
+        if lote:
+            aplicar_lote(lote)
+        if fim is None:
+            raise ValueError("Pacote incompleto (transferência interrompida?); nada foi aplicado.")
+
+        # Cadastro de pacientes das avaliações novas ou renomeadas
+        vincular_pacientes(conn)
+
+        # A marca só avança se o pacote começa onde a anterior parou
+        atual = marca(conn, cabecalho["site"])
+        continuo = cabecalho["desde"] is None or (atual is not None and cabecalho["desde"] <= atual)
+        if continuo and (atual is None or cabecalho["ate"] > atual):
+            conn.execute(text("""
+                INSERT INTO sincronizacao_marcas (site, nome, ate, aplicado_em) VALUES (:site, :nome, :ate, :agora)
+                ON CONFLICT (site) DO UPDATE SET nome = excluded.nome, ate = excluded.ate, aplicado_em = excluded.aplicado_em
+            """), {"site": cabecalho["site"], "nome": cabecalho["nome"], "ate": cabecalho["ate"], "agora": agora})
+
+    return {**contagem, "site": cabecalho["site"], "marca_avancou": continuo,
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+# --- DOIS BANCOS ACESSÍVEIS ---
+
+def sincronizar(origem, destino, margem=timedelta(seconds=MARGEM_SEGUNDOS)):
+    # Leva para `destino` o que mudou em `origem` desde a marca do destino
+    with origem.connect() as conn:
+        site_origem, _ = unidade(conn)
+    with destino.connect() as conn:
+        site_destino, _ = unidade(conn)
+        desde = marca(conn, site_origem)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "pacote.jsonl.gz")
+        exportado = exportar_alteracoes(origem, caminho, desde=desde, para=site_destino, margem=margem)
+        aplicado = aplicar_alteracoes(destino, caminho)
+    return exportado, aplicado
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza avaliações entre unidades do CAPS.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    cmd_unidade = comandos.add_parser("unidade", help="mostra (ou nomeia) a unidade e as marcas recebidas")
+    cmd_unidade.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    cmd_unidade.add_argument("--nome")
+    cmd_exportar = comandos.add_parser("exportar", help="grava um pacote de alterações")
+    cmd_exportar.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    cmd_exportar.add_argument("--saida", required=True)
+    cmd_exportar.add_argument("--desde", help="marca de quem vai receber (python -m sincronizacao unidade, no destino)")
+    cmd_exportar.add_argument("--para", help="id da unidade de destino: não devolve o que veio dela")
+    cmd_aplicar = comandos.add_parser("aplicar", help="aplica um pacote neste banco")
+    cmd_aplicar.add_argument("--banco", default=os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db'))
+    cmd_aplicar.add_argument("pacote")
+    cmd_sincronizar = comandos.add_parser("sincronizar", help="leva as alterações de um banco para outro")
+    cmd_sincronizar.add_argument("--origem", required=True)
+    cmd_sincronizar.add_argument("--destino", required=True)
+    cmd_sincronizar.add_argument("--nos-dois-sentidos", action="store_true")
+    args = parser.parse_args()
+
+    from banco import criar_engine
+    from esquema import preparar_banco
+
+    def abrir(url):
+        engine = criar_engine(url)
+        preparar_banco(engine)
+        return engine
+
+    if args.comando == "unidade":
+        engine = abrir(args.banco)
+        with engine.begin() as conn:
+            if args.nome:
+                conn.execute(text("UPDATE sincronizacao_site SET nome = :nome"), {"nome": args.nome})
+            site, nome = unidade(conn)
+            print(f"unidade {site} ({nome or 'sem nome'})")
+            for origem, nome_origem, ate, aplicado_em in conn.execute(text(
+                    "SELECT site, nome, ate, aplicado_em FROM sincronizacao_marcas ORDER BY nome, site")):
+                print(f"  de {origem} ({nome_origem or 'sem nome'}): até {ate}, aplicado em {aplicado_em}")
+    elif args.comando == "exportar":
+        resumo = exportar_alteracoes(abrir(args.banco), args.saida, desde=args.desde, para=args.para)
+        print(f"{resumo['avaliacoes']} avaliações e {resumo['exclusoes']} exclusões, {resumo['bytes'] / 1024:.0f} KB, "
+              f"{resumo['segundos']:.2f} s -> {args.saida} (próximo --desde: {resumo['ate']})")
+    elif args.comando == "aplicar":
+        resumo = aplicar_alteracoes(abrir(args.banco), args.pacote)
+        print(", ".join(f"{resumo[k]} {k}" for k in ("inseridas", "atualizadas", "iguais", "antigas", "conflitos",
+                                                     "excluidas")) + f" em {resumo['segundos']:.2f} s")
+        if not resumo["marca_avancou"]:
+            print("Atenção: há um intervalo entre este pacote e o anterior; a marca não avançou.")
+    else:
+        origem, destino = abrir(args.origem), abrir(args.destino)
+        sentidos = [(origem, destino), (destino, origem)] if args.nos_dois_sentidos else [(origem, destino)]
+        for de, para in sentidos:
+            exportado, aplicado = sincronizar(de, para)
+            print(f"{de.url} -> {para.url}: {exportado['avaliacoes']} avaliações, {exportado['exclusoes']} exclusões "
+                  f"({exportado['bytes'] / 1024:.0f} KB); {aplicado['inseridas']} inseridas, "
+                  f"{aplicado['atualizadas']} atualizadas, {aplicado['conflitos']} conflitos, "
+                  f"{aplicado['excluidas']} excluídas")
+
+if __name__ == "__main__":
+    main()
@@ -1,105 +1,142 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import hashlib
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, Date, Text
-from sqlalchemy.orm import declarative_base, sessionmaker
-from fpdf import FPDF
+import csv
+import gzip
+import json
+import logging
+import os
+import itertools
+import tempfile
+import time
 import io
+from sqlalchemy import Integer, Boolean, Float, Date, Text, func, tuple_, update
+from banco import criar_engine
+from dependencias import pd
+from modelos import User, Avaliacao, make_hash, check_hash
+from esquema import preparar_banco
+from busca import filtro_busca, sugerir_avaliacoes
+from checklist import CAMPOS_CHECKLIST, colunas_mascara, condicao_flags, contar_flags, decodificar_flags
+from resumos import consultar_resumos, opcoes_resumos
+from agenda import VISOES_AGENDA, atualizar_agenda, contar_agenda, consultar_agenda
+from pacientes import (obter_paciente, vincular_pacientes, sugerir_pacientes, consultar_linha_do_tempo,
+                       possiveis_duplicados, renomear_paciente, separar_paciente, unificar_pacientes)
+from ficha_pdf import MAX_LOTE_UNICO, gerar_pdf, gerar_lote_zip, gerar_lote_unico, CachePDF
+from instrumentacao import FAIXAS_MS, Metricas, instrumentar_engine
+from copia_leitura import MAX_ATRASO_SEGUNDOS, CopiaLeitura
+from cache_consultas import MAX_BYTES_CONSULTAS, CacheConsultas
+from crescimento import (CLASSIFICACOES_NUTRICIONAIS, SEXOS, avaliar, calcular_imc, carregar_referencia,
+                         reclassificar_avaliacoes)
+from tarefas import NA_FILA, EXECUTANDO, CONCLUIDA, SIMULTANEAS, FilaTarefas
+from manutencao import INTERVALOS, OK, ROTINAS, Manutencao, listar_execucoes, ultimas_execucoes
+from arquivo_morto import (MESES_ARQUIVO_MORTO, ArquivoMorto, arquivar_avaliacoes, corte_por_meses,
+                           pacientes_arquivados, restaurar_avaliacoes)
 
 # Configuração da Página
 st.set_page_config(page_title="CAPS Infantil - Sistema Completo", layout="wide")
 
+logger = logging.getLogger(__name__)
+
 # Configuração do Banco de Dados
-Base = declarative_base()
-engine = create_engine('sqlite:///caps_data.db')
-Session = sessionmaker(bind=engine)
-
-# --- MODELOS DO BANCO DE DADOS ---
-
-class User(Base):
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True)
-    username = Column(String, unique=True, nullable=False)
-    password_hash = Column(String, nullable=False)
-    role = Column(String, default="user") # user, admin
-
-class Avaliacao(Base):
-    __tablename__ = 'avaliacoes'
-    id = Column(Integer, primary_key=True)
-    data_criacao = Column(Date, default=datetime.today)
-    
-    # Cabeçalho
-    cidade = Column(String, default="Angicos")
-    estado = Column(String, default="RN")
-    profissional_responsavel = Column(String)
-    
-    # Acolhimento Inicial
-    paciente_nome = Column(String)
-    crianca_identificada = Column(Boolean)
-    responsavel_presente = Column(Boolean)
-    responsavel_nome = Column(String)
-    motivo_atendimento = Column(Text)
-    encaminhamento_origem = Column(String)
-    observacao_comportamento = Column(Text)
-    
-    # Caderneta Vacinal
-    caderneta_apresentada = Column(Boolean)
-    vacinas_conferidas = Column(Boolean)
-    esquema_completo = Column(Boolean)
-    vacinas_atraso = Column(Boolean)
-    orientacao_responsavel_vacina = Column(Boolean)
-    encaminhamento_ubs_vacina = Column(Boolean)
-    
-    # Avaliação Nutricional
-    peso = Column(Float)
-    altura = Column(Float)
-    imc = Column(Float)
-    classificacao_nutricional = Column(String)
-    queixa_alimentar = Column(String)
-    orientacao_nutricional = Column(Boolean)
-    encaminhamento_nutricao = Column(Boolean)
+DATABASE_URL = os.environ.get('CAPS_DATABASE_URL', 'sqlite:///caps_data.db')
+
+# Tempos de SQL e das seções do app, compartilhados por todas as sessões
+# (aba "Desempenho" dos administradores)
+@st.cache_resource
+def metricas():
+    return Metricas()
+
+METRICAS_ARQUIVO = os.environ.get('CAPS_METRICAS_ARQUIVO', 'metricas_caps.jsonl')
+
+# O Streamlit reexecuta este script a cada interação. A engine, as tabelas,
+# os índices e o admin padrão são preparados uma única vez por processo e
+# compartilhados por todas as sessões (st.cache_resource).
+@st.cache_resource
+def iniciar_banco(url=DATABASE_URL):
+    inicio = time.perf_counter()
+    engine = criar_engine(url)
+    instrumentar_engine(engine, metricas())
     
-    # Avaliação Odontológica
-    higiene_bucal = Column(Boolean)
-    carie_visivel = Column(Boolean)
-    dor_relatada = Column(Boolean)
-    orientacao_higiene_bucal = Column(Boolean)
-    encaminhamento_odontologico = Column(Boolean)
-    classificacao_odonto = Column(String)
+    Session = preparar_banco(engine)
     
-    # Plano Inicial
-    inserido_caps = Column(Boolean)
-    encaminhamento_ubs_plano = Column(Boolean)
-    encaminhamento_nutricao_plano = Column(Boolean)
-    encaminhamento_odonto_plano = Column(Boolean)
-    encaminhamento_assistencia_social = Column(Boolean)
-    proxima_avaliacao = Column(Date)
-    registro_prontuario = Column(Boolean)
+    logger.info("Banco inicializado em %.1f ms (%s)", (time.perf_counter() - inicio) * 1000, url)
+    return engine, Session
 
-# Criar tabelas
-Base.metadata.create_all(engine)
+engine, Session = iniciar_banco()
 
-# --- FUNÇÕES UTILITÁRIAS ---
+# Histórico, busca, painel e relatórios podem ler de uma cópia do banco
+# renovada em segundo plano (copia_leitura.py), longe dos salvamentos.
+# CAPS_COPIA_LEITURA: "memoria" ou o caminho base dos arquivos da cópia;
+# vazio lê direto do banco principal.
+COPIA_LEITURA = os.environ.get('CAPS_COPIA_LEITURA', '')
+COPIA_LEITURA_ATRASO = float(os.environ.get('CAPS_COPIA_LEITURA_ATRASO', MAX_ATRASO_SEGUNDOS))  # s
 
-def make_hash(password):
-    return hashlib.sha256(str.encode(password)).hexdigest()
+@st.cache_resource
+def copia_leitura():
+    if not COPIA_LEITURA:
+        return None
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        logger.warning("Cópia de leitura só funciona com SQLite em arquivo; lendo do banco principal")
+        return None
+    return CopiaLeitura(engine, COPIA_LEITURA, COPIA_LEITURA_ATRASO,
+                        ao_criar_engine=lambda e: instrumentar_engine(e, metricas()))
 
-def check_hash(password, hash_val):
-    return make_hash(password) == hash_val
+# Páginas do histórico, buscas e agregados do painel compartilhados por
+# todas as sessões até o banco mudar (cache_consultas.py). 0 desliga.
+CACHE_CONSULTAS_MB = float(os.environ.get('CAPS_CACHE_CONSULTAS_MB', MAX_BYTES_CONSULTAS / 1024 / 1024))
 
-def init_db():
-    session = Session()
-    # Criar admin padrão se não existir
-    admin = session.query(User).filter_by(username='admin').first()
-    if not admin:
-        admin_user = User(username='admin', password_hash=make_hash('admin'), role='admin')
-        session.add(admin_user)
-        session.commit()
-    session.close()
+@st.cache_resource
+def cache_consultas():
+    return CacheConsultas(engine, int(CACHE_CONSULTAS_MB * 1024 * 1024))
+
+# Backups online e rotinas de manutenção do banco (manutencao.py), num
+# agendador em segundo plano iniciado com o app; as execuções aparecem na aba
+# "Desempenho". CAPS_MANUTENCAO=0 desliga; CAPS_BACKUP_DIR é a pasta dos
+# backups (padrão: backups_caps/ ao lado do banco).
+MANUTENCAO = os.environ.get('CAPS_MANUTENCAO', '1') != '0'
+BACKUP_PASTA = os.environ.get('CAPS_BACKUP_DIR') or None
+BACKUP_HORAS = float(os.environ.get('CAPS_BACKUP_HORAS', INTERVALOS['backup'] / 3600))
+ROTULOS_MANUTENCAO = {"backup": "Backup", "estatisticas": "Estatísticas (ANALYZE)",
+                      "vacuum": "Vacuum incremental", "verificacao": "Verificação (quick_check)"}
 
-# Inicializa DB e usuário admin
-init_db()
+@st.cache_resource
+def manutencao():
+    if not MANUTENCAO:
+        return None
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        logger.warning("Manutenção automática só funciona com SQLite em arquivo; desligada")
+        return None
+    return Manutencao(engine, BACKUP_PASTA, intervalos={"backup": BACKUP_HORAS * 3600},
+                      ao_executar=lambda rotina, ms, _: metricas().registrar(f"manutencao.{rotina}", ms))
+
+manutencao()
+
+def registrar_gravacao():
+    # A partir daqui as leituras deste usuário vão ao banco principal até a
+    # cópia alcançar a gravação
+    st.session_state['ultima_gravacao'] = time.time()
+    cache_consultas().registrar_gravacao()
+
+def sessao_leitura(desde=None):
+    # Sessão só para consultas; `desde` é o instante da última gravação de
+    # quem lê (st.session_state['ultima_gravacao']). A geração dos dados que
+    # ela vê é lida agora, antes de qualquer consulta (ver em_cache).
+    copia = copia_leitura()
+    engine_copia, numero = copia.fonte_leitura(desde) if copia else (None, None)
+    if numero is not None:
+        return Session(bind=engine_copia, info={'geracao': ("copia", numero)})
+    return Session(info={'geracao': cache_consultas().geracao()})
+
+def em_cache(session, chave, consultar):
+    # Resultado de `consultar()` compartilhado entre sessões enquanto os
+    # dados vistos por `session` (de sessao_leitura) não mudarem. O objeto
+    # devolvido é o mesmo para todas as sessões: quem precisar modificá-lo
+    # (colunas novas num DataFrame, ordenar uma lista) trabalha numa cópia,
+    # senão a mudança aparece para as outras sessões e fica no cache.
+    geracao = session.info.get('geracao')
+    if geracao is None or not CACHE_CONSULTAS_MB:
+        return consultar()
+    return cache_consultas().obter(chave, geracao, consultar)
 
 def login_user(username, password):
     session = Session()
@@ -109,21 +146,62 @@ def login_user(username, password):
         return user
     return None
 
-def save_avaliacao(data, avaliacao_id=None):
+class ConflitoEdicao(Exception):
+    pass
+
+def mesmo_valor(a, b):
+    # Campos de texto vazios do formulário equivalem a nulos no banco
+    return a == b or (a in (None, '') and b in (None, ''))
+
+def campos_alterados(data, original):
+    return {k: v for k, v in data.items() if not mesmo_valor(v, original.get(k))}
+
+def atualizar_avaliacao(session, avaliacao_id, alteracoes, versao=None):
+    # Um único UPDATE só com as colunas alteradas. Com `versao` (a lida ao
+    # abrir a edição), falha se outra pessoa gravou a avaliação nesse meio tempo.
+    query = update(Avaliacao).where(Avaliacao.id == avaliacao_id)
+    if versao is not None:
+        query = query.where(Avaliacao.versao == versao)
+    resultado = session.execute(
+        query.values(**alteracoes, versao=Avaliacao.versao + 1, atualizado_em=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
+        raise ConflitoEdicao("Esta avaliação foi alterada ou excluída por outra pessoa desde que a edição começou.")
+
+def save_avaliacao(data, avaliacao_id=None, original=None):
+    # `original` é a linha como estava ao abrir a edição (inclui a versão)
     session = Session()
     try:
         if avaliacao_id:
-            # Atualizar existente
-            avaliacao = session.query(Avaliacao).filter_by(id=avaliacao_id).first()
-            if avaliacao:
-                for key, value in data.items():
-                    setattr(avaliacao, key, value)
+            # Atualizar existente: só o que mudou, protegido pela versão
+            alteracoes = campos_alterados(data, original) if original else data
+            if 'paciente_nome' in alteracoes or 'data_nascimento' in alteracoes:
+                # O cadastro é o do nome com a data de nascimento: corrigir
+                # qualquer um dos dois pode mudar o paciente da avaliação
+                anterior = original or data
+                nome = alteracoes.get('paciente_nome', anterior.get('paciente_nome'))
+                nascimento = alteracoes.get('data_nascimento', anterior.get('data_nascimento'))
+                alteracoes['paciente_id'], alteracoes['paciente_nome'] = obter_paciente(
+                    session.connection(), nome, nascimento)
+            if alteracoes:
+                atualizar_avaliacao(session, avaliacao_id, alteracoes, original.get('versao') if original else None)
         else:
-            # Criar nova
+            # Criar nova, ligada ao cadastro do paciente (criado se for o primeiro atendimento)
+            data = dict(data)
+            data['paciente_id'], data['paciente_nome'] = obter_paciente(session.connection(), data.get('paciente_nome'),
+                                                                        data.get('data_nascimento'))
             nova_avaliacao = Avaliacao(**data)
             session.add(nova_avaliacao)
         session.commit()
+        registrar_gravacao()
+        if avaliacao_id:
+            cache_pdf().invalidar(avaliacao_id)
         return True
+    except ConflitoEdicao as e:
+        session.rollback()
+        st.error(f"{e} Cancele a edição e abra a avaliação novamente para ver a versão atual.")
+        return False
     except Exception as e:
         st.error(f"Erro ao salvar: {e}")
         return False
@@ -137,6 +215,8 @@ def delete_avaliacao(avaliacao_id):
         if avaliacao:
             session.delete(avaliacao)
             session.commit()
+            registrar_gravacao()
+            cache_pdf().invalidar(avaliacao_id)
             return True
         return False
     except Exception as e:
@@ -152,6 +232,7 @@ def delete_user(user_id):
         if user:
             session.delete(user)
             session.commit()
+            cache_consultas().registrar_gravacao()
             return True
         return False
     finally:
@@ -167,6 +248,7 @@ def create_user(username, password, role):
         new_user = User(username=username, password_hash=make_hash(password), role=role)
         session.add(new_user)
         session.commit()
+        cache_consultas().registrar_gravacao()
         return True, "Usuário criado com sucesso"
     except Exception as e:
         return False, str(e)
@@ -188,6 +270,7 @@ def update_user(user_id, new_password=None, new_role=None, new_username=None):
             if new_role:
                 user.role = new_role
             session.commit()
+            cache_consultas().registrar_gravacao()
             return True, "Usuário atualizado com sucesso"
         return False, "Usuário não encontrado"
     except Exception as e:
@@ -195,82 +278,536 @@ def update_user(user_id, new_password=None, new_role=None, new_username=None):
     finally:
         session.close()
 
-def gerar_pdf(dados):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    
-    pdf.set_font("Arial", 'B', 14)
-    pdf.cell(200, 10, txt="CHECKLIST RÁPIDO – AVALIAÇÃO INICIAL", ln=True, align='C')
-    pdf.cell(200, 10, txt="CAPS INFANTIL", ln=True, align='C')
-    pdf.ln(5)
-    
-    def checkbox(label, value):
-        mark = "X" if value else " "
-        pdf.set_font("Arial", size=10)
-        pdf.cell(10, 5, txt=f"[{mark}]", ln=0)
-        pdf.cell(0, 5, txt=label, ln=1)
-
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, txt="ACOLHIMENTO INICIAL", ln=1, fill=False)
-    checkbox(f"Criança/adolescente identificado: {dados.paciente_nome or ''}", dados.crianca_identificada)
-    checkbox(f"Responsável legal presente: {dados.responsavel_nome or ''}", dados.responsavel_presente)
-    checkbox(f"Motivo do atendimento: {dados.motivo_atendimento or ''}", bool(dados.motivo_atendimento))
-    checkbox(f"Encaminhamento de origem: {dados.encaminhamento_origem or ''}", bool(dados.encaminhamento_origem))
-    checkbox(f"Observação do comportamento: {dados.observacao_comportamento or ''}", bool(dados.observacao_comportamento))
-    checkbox(f"Profissional responsável: {dados.profissional_responsavel or ''}", bool(dados.profissional_responsavel))
-    pdf.ln(3)
-
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, txt="CADERNETA VACINAL", ln=1)
-    checkbox("Caderneta apresentada", dados.caderneta_apresentada)
-    checkbox("Vacinas conferidas conforme idade", dados.vacinas_conferidas)
-    checkbox("Esquema vacinal completo", dados.esquema_completo)
-    checkbox("Vacinas em atraso", dados.vacinas_atraso)
-    checkbox("Orientação ao responsável realizada", dados.orientacao_responsavel_vacina)
-    checkbox("Encaminhamento à UBS (se necessário)", dados.encaminhamento_ubs_vacina)
-    pdf.ln(3)
-
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, txt="AVALIAÇÃO NUTRICIONAL", ln=1)
-    checkbox(f"Peso aferido: {dados.peso} kg", True)
-    checkbox(f"Altura aferida: {dados.altura} m", True)
-    checkbox(f"IMC calculado: {dados.imc:.2f}", True)
-    checkbox(f"Classificação nutricional: {dados.classificacao_nutricional}", True)
-    checkbox(f"Queixa alimentar: {dados.queixa_alimentar or 'Nenhuma'}", bool(dados.queixa_alimentar))
-    checkbox("Orientação nutricional realizada", dados.orientacao_nutricional)
-    checkbox("Encaminhamento realizado (se necessário)", dados.encaminhamento_nutricao)
-    pdf.ln(3)
-
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, txt="AVALIAÇÃO ODONTOLÓGICA", ln=1)
-    checkbox("Higiene bucal adequada", dados.higiene_bucal)
-    checkbox("Presença de cárie visível", dados.carie_visivel)
-    checkbox("Dor ou desconforto relatado", dados.dor_relatada)
-    checkbox("Orientação de higiene bucal realizada", dados.orientacao_higiene_bucal)
-    checkbox("Encaminhamento odontológico", dados.encaminhamento_odontologico)
-    checkbox(f"Classificação: {dados.classificacao_odonto}", True)
-    pdf.ln(3)
-
-    pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, txt="PLANO INICIAL DE CUIDADO", ln=1)
-    checkbox("Inserido no acompanhamento CAPS", dados.inserido_caps)
-    checkbox("Encaminhamento para UBS", dados.encaminhamento_ubs_plano)
-    checkbox("Encaminhamento para Nutrição", dados.encaminhamento_nutricao_plano)
-    checkbox("Encaminhamento para Odontologia", dados.encaminhamento_odonto_plano)
-    checkbox("Encaminhamento para Assistência Social", dados.encaminhamento_assistencia_social)
-    prox_data = dados.proxima_avaliacao.strftime('%d/%m/%Y') if dados.proxima_avaliacao else "Não agendada"
-    checkbox(f"Próxima avaliação agendada: {prox_data}", bool(dados.proxima_avaliacao))
-    checkbox("Registro em prontuário realizado", dados.registro_prontuario)
-    pdf.ln(10)
-
-    data_formatada = dados.data_criacao.strftime('%d de %B de %Y')
-    pdf.cell(0, 10, txt=f"Angicos/RN, {data_formatada}.", ln=1, align='R')
-    pdf.ln(15)
-    pdf.cell(0, 10, txt="__________________________________________", ln=1, align='C')
-    pdf.cell(0, 5, txt=f"{dados.profissional_responsavel or 'Profissional Responsável'}", ln=1, align='C')
-    
-    return pdf.output(dest='S').encode('latin-1')
+# --- PACIENTES ---
+
+def corrigir_paciente(acao, *args):
+    # Renomear ou unificar cadastros (pacientes.py) numa transação
+    session = Session()
+    try:
+        sucesso, msg = acao(session.connection(), *args)
+        if sucesso:
+            session.commit()
+            registrar_gravacao()
+        return sucesso, msg
+    except Exception as e:
+        return False, str(e)
+    finally:
+        session.close()
+
+# --- HISTÓRICO (PAGINAÇÃO NO SERVIDOR) ---
+
+# Rótulo -> (coluna de ordenação, direção). A paginação é por keyset:
+# a próxima página começa logo após a última linha da página atual.
+ORDENACOES_HISTORICO = {
+    "Data (mais recentes)": ("data_criacao", "desc"),
+    "Data (mais antigas)": ("data_criacao", "asc"),
+    "ID (decrescente)": ("id", "desc"),
+    "ID (crescente)": ("id", "asc"),
+}
+
+TAMANHOS_PAGINA = [25, 50, 100, 200]
+
+# A grade só traz o que mostra, em tipos compactos. Textos livres e colunas
+# de controle ficam para quando uma avaliação é escolhida (detalhes, editar,
+# PDF). Os itens de checklist viajam do banco como uma máscara por seção e
+# são expandidos em colunas bool com NumPy (ver checklist.py).
+COLUNAS_TEXTO_LIVRE = [c.name for c in Avaliacao.__table__.columns if isinstance(c.type, Text)]
+COLUNAS_GRADE = [
+    c.name for c in Avaliacao.__table__.columns
+    if c.name not in COLUNAS_TEXTO_LIVRE and c.name not in ('uuid', 'versao', 'atualizado_em', 'paciente_id')
+]
+COLUNAS_HISTORICO = [
+    c for c in Avaliacao.__table__.columns if c.name in COLUNAS_GRADE and c.name not in CAMPOS_CHECKLIST
+] + colunas_mascara()
+TIPOS_HISTORICO = {
+    'cidade': 'category', 'estado': 'category', 'profissional_responsavel': 'category',
+    'classificacao_nutricional': 'category', 'classificacao_odonto': 'category',
+    'peso': 'float32', 'altura': 'float32', 'imc': 'float32', 'imc_escore_z': 'float32',
+}
+
+def filtrar_avaliacoes(query, filtro_nome=None, marcados=None):
+    for condicao in (filtro_busca(filtro_nome), condicao_flags(marcados or ())):
+        if condicao is not None:
+            query = query.filter(condicao)
+    return query
+
+def contar_avaliacoes(session, filtro_nome=None, marcados=None):
+    return filtrar_avaliacoes(session.query(func.count(Avaliacao.id)), filtro_nome, marcados).scalar()
+
+def contar_itens_checklist(session, filtro_nome=None, marcados=None):
+    return contar_flags(session.connection(), filtro_busca(filtro_nome), condicao_flags(marcados or ()))
+
+@metricas().medir("historico.carregar")
+def carregar_pagina_historico(session, filtro_nome=None, ordenacao="Data (mais recentes)", tamanho_pagina=50, cursor=None, marcados=None):
+    campo, direcao = ORDENACOES_HISTORICO[ordenacao]
+    query = filtrar_avaliacoes(session.query(*COLUNAS_HISTORICO), filtro_nome, marcados)
+
+    if campo == "data_criacao":
+        chave = tuple_(Avaliacao.data_criacao, Avaliacao.id)
+        colunas = [Avaliacao.data_criacao, Avaliacao.id]
+    else:
+        chave = Avaliacao.id
+        colunas = [Avaliacao.id]
+
+    if cursor is not None:
+        valor = tuple_(*cursor) if campo == "data_criacao" else cursor
+        query = query.filter(chave < valor if direcao == "desc" else chave > valor)
+
+    ordem = [c.desc() for c in colunas] if direcao == "desc" else [c.asc() for c in colunas]
+    # Uma linha a mais indica se existe próxima página
+    query = query.order_by(*ordem).limit(tamanho_pagina + 1)
+    df = decodificar_flags(pd.read_sql(query.statement, session.bind, dtype=TIPOS_HISTORICO), COLUNAS_GRADE)
+
+    proximo_cursor = None
+    if len(df) > tamanho_pagina:
+        df = df.iloc[:tamanho_pagina]
+        ultima = df.iloc[-1]
+        if campo == "data_criacao":
+            proximo_cursor = (ultima['data_criacao'], int(ultima['id']))
+        else:
+            proximo_cursor = int(ultima['id'])
+    return df, proximo_cursor
+
+def carregar_textos(session, avaliacao_id):
+    # Textos livres de uma avaliação, só quando ela é escolhida na grade
+    return session.query(*[Avaliacao.__table__.c[c] for c in COLUNAS_TEXTO_LIVRE]).filter(
+        Avaliacao.id == avaliacao_id).first()
+
+# --- ARQUIVO MORTO ---
+
+# Avaliações antigas ficam em arquivos SQLite por ano (arquivo_morto.py),
+# lidos só quando a busca, a linha do tempo ou uma exportação precisam.
+# CAPS_ARQUIVO_DIR: pasta dos arquivos (padrão: arquivo_morto/ ao lado do
+# banco); CAPS_ARQUIVO_MESES: idade sugerida para arquivar.
+ARQUIVO_MORTO_PASTA = os.environ.get('CAPS_ARQUIVO_DIR') or None
+ARQUIVO_MORTO_MESES = int(os.environ.get('CAPS_ARQUIVO_MESES', MESES_ARQUIVO_MORTO))
+LIMITE_SUGESTOES_ARQUIVO = 20
+
+@st.cache_resource
+def arquivo_morto():
+    return ArquivoMorto(engine, ao_criar_engine=lambda e: instrumentar_engine(e, metricas()))
+
+def consultar_arquivo_morto(consulta, anos=None):
+    # [(ano, consulta(session))] em cada arquivo (ou só nos `anos`), com uma
+    # sessão somente leitura: as mesmas consultas do banco principal
+    def em_sessao(conn):
+        session_arquivo = Session(bind=conn)
+        try:
+            return consulta(session_arquivo)
+        finally:
+            session_arquivo.close()
+    return arquivo_morto().consultar(em_sessao, anos)
+
+def contar_arquivo_morto(filtro_nome=None, marcados=None):
+    return sum(n for _, n in consultar_arquivo_morto(lambda s: contar_avaliacoes(s, filtro_nome, marcados)))
+
+def sugerir_no_arquivo_morto(filtro_nome):
+    # [(ano, linha)] com as melhores correspondências de cada arquivo, do ano mais recente
+    sugestoes = [(ano, linha) for ano, linhas in consultar_arquivo_morto(
+        lambda s: sugerir_avaliacoes(s.connection(), filtro_nome)) for linha in linhas]
+    return sugestoes[:LIMITE_SUGESTOES_ARQUIVO]
+
+def avaliacao_arquivada(ano, avaliacao_id):
+    # (objeto Avaliacao desligado da sessão, textos livres), para ler e gerar o PDF
+    return consultar_arquivo_morto(
+        lambda s: (s.query(Avaliacao).filter_by(id=avaliacao_id).first(), carregar_textos(s, avaliacao_id)), [ano],
+    )[0][1]
+
+def linha_do_tempo(conn, paciente_id):
+    # Linha do tempo do banco principal mais, se houver, a do arquivo morto
+    # (só os anos em que o paciente tem avaliações arquivadas)
+    df = consultar_linha_do_tempo(conn, paciente_id)
+    ids, anos = pacientes_arquivados(conn, paciente_id)
+    if anos:
+        arquivadas = [parte for _, parte in arquivo_morto().consultar(
+            lambda c: consultar_linha_do_tempo(c, paciente_id, ids[1:]), anos)]
+        # Uma avaliação nos dois (movimentação interrompida): vale a do principal
+        df = (pd.concat([df, *arquivadas], ignore_index=True).drop_duplicates('id')
+              .sort_values(['data_criacao', 'id'], ignore_index=True))
+    return df
+
+def anos_no_periodo(data_inicio=None, data_fim=None):
+    return [ano for ano, _, _ in arquivo_morto().arquivos()
+            if (not data_inicio or ano >= data_inicio.year) and (not data_fim or ano <= data_fim.year)]
+
+def restaurar_avaliacao(avaliacao_id):
+    try:
+        restauradas = restaurar_avaliacoes(engine, ids=[avaliacao_id])
+    except Exception as e:
+        st.error(f"Erro ao restaurar: {e}")
+        return False
+    if restauradas:
+        registrar_gravacao()
+    return bool(restauradas)
+
+# --- EXPORTAÇÃO CSV (SOB DEMANDA) ---
+
+COLUNAS_EXPORTACAO = [c.name for c in Avaliacao.__table__.columns]
+TAMANHO_LOTE_EXPORTACAO = 5000
+
+@metricas().medir("exportar_csv")
+def gerar_csv_avaliacoes(filtro_nome=None, colunas=None, compactar=False, marcados=None, progresso=None, desde=None,
+                         incluir_arquivo=False):
+    # Lê o resultado em lotes do cursor e grava num arquivo temporário em disco,
+    # então a memória fica limitada a um lote mesmo exportando o banco inteiro.
+    # `progresso` recebe o total de linhas já gravadas após cada lote. Com
+    # `incluir_arquivo`, as do arquivo morto vêm depois das do banco principal.
+    colunas = colunas or COLUNAS_EXPORTACAO
+    arquivo = tempfile.TemporaryFile()
+    saida = gzip.GzipFile(fileobj=arquivo, mode='wb') if compactar else arquivo
+    texto = io.TextIOWrapper(saida, encoding='utf-8', newline='')
+    session = sessao_leitura(desde)
+    try:
+        query = session.query(*[getattr(Avaliacao, c) for c in colunas])
+        query = filtrar_avaliacoes(query, filtro_nome, marcados).order_by(Avaliacao.id)
+        
+        csv.writer(texto).writerow(colunas)
+        gravadas = 0
+
+        def gravar(conn):
+            nonlocal gravadas
+            for lote in pd.read_sql(query.statement, conn.execution_options(stream_results=True),
+                                    chunksize=TAMANHO_LOTE_EXPORTACAO):
+                lote.to_csv(texto, index=False, header=False)
+                gravadas += len(lote)
+                if progresso:
+                    progresso(gravadas)
+
+        gravar(session.connection())
+        if incluir_arquivo:
+            arquivo_morto().consultar(gravar)
+        
+        texto.flush()
+        texto.detach()
+        if compactar:
+            saida.close()  # grava o rodapé do gzip sem fechar o arquivo
+    finally:
+        session.close()
+    arquivo.seek(0)
+    return arquivo
+
+# --- IMPORTAÇÃO CSV ---
+
+# Aceita o mesmo layout do "Baixar CSV". As colunas de controle são
+# ignoradas (o banco atribui ids e versões novos e liga cada linha ao
+# cadastro do paciente pelo nome) e colunas desconhecidas são relatadas e
+# descartadas.
+TAMANHO_LOTE_IMPORTACAO = 5000
+COLUNAS_CONTROLE = ['id', 'uuid', 'versao', 'atualizado_em', 'paciente_id']
+COLUNAS_IMPORTACAO = [c for c in COLUNAS_EXPORTACAO if c not in COLUNAS_CONTROLE]
+VALORES_BOOLEANOS = {
+    'true': True, '1': True, 'sim': True, 's': True, 'x': True, 'verdadeiro': True,
+    'false': False, '0': False, 'não': False, 'nao': False, 'n': False, 'falso': False,
+}
+
+def coagir_coluna(serie, coluna):
+    # Converte uma coluna de texto para o tipo do modelo.
+    # Retorna (valores, máscara das linhas com valor inválido).
+    vazio = serie.str.strip() == ''
+    if isinstance(coluna.type, Boolean):
+        valores = serie.str.strip().str.lower().map(VALORES_BOOLEANOS)
+    elif isinstance(coluna.type, (Float, Integer)):
+        valores = pd.to_numeric(serie.str.strip().str.replace(',', '.', regex=False), errors='coerce')
+        if isinstance(coluna.type, Integer):
+            valores = valores.where(valores % 1 == 0)
+    elif isinstance(coluna.type, Date):
+        # ISO (como exportado) ou dd/mm/aaaa
+        datas = pd.to_datetime(serie, format='%Y-%m-%d', errors='coerce')
+        datas = datas.fillna(pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce'))
+        valores = pd.Series([d.date() if pd.notna(d) else None for d in datas], index=serie.index, dtype=object)
+    else:
+        valores = serie.astype(object)
+    invalido = ~vazio & valores.isna()
+    valores = valores.astype(object).where(~vazio & ~invalido, None)
+    if isinstance(coluna.type, Integer):
+        valores = valores.map(lambda v: None if v is None else int(v))
+    return valores, invalido
+
+def tipo_legivel(coluna):
+    if isinstance(coluna.type, Boolean):
+        return "sim/não"
+    if isinstance(coluna.type, (Float, Integer)):
+        return "número"
+    if isinstance(coluna.type, Date):
+        return "data"
+    return "texto"
+
+def valor_padrao(coluna):
+    # Mesmo padrão que o modelo aplicaria (ex.: cidade "Angicos", data de hoje)
+    padrao = coluna.default
+    if padrao is None:
+        return None
+    valor = padrao.arg(None) if padrao.is_callable else padrao.arg
+    return valor.date() if isinstance(valor, datetime) else valor
+
+def valor_para_banco(coluna):
+    if isinstance(coluna.type, Date):
+        return lambda v: None if v is None else v.isoformat()
+    if isinstance(coluna.type, Boolean):
+        return lambda v: None if v is None else int(v)
+    return lambda v: v
+
+@metricas().medir("importar_csv")
+def importar_csv(arquivo, tamanho_lote=None):
+    # Retorna (quantidade inserida, erros por linha, colunas ignoradas). Cada
+    # lote é validado de forma vetorizada e inserido numa única transação com
+    # executemany, em vez de um session.add + commit por linha. Linhas com
+    # erro são puladas; as demais do lote são gravadas.
+    tabela = Avaliacao.__table__
+    inseridas = 0
+    erros = []
+    ignoradas = None
+    leitor = pd.read_csv(arquivo, dtype=str, keep_default_na=False, chunksize=tamanho_lote or TAMANHO_LOTE_IMPORTACAO)
+    for lote in leitor:
+        if ignoradas is None:
+            ignoradas = [c for c in lote.columns if c not in COLUNAS_EXPORTACAO]
+            if 'paciente_nome' not in lote.columns:
+                return 0, [{"linha": 1, "coluna": "paciente_nome", "valor": "", "erro": "Coluna obrigatória ausente"}], ignoradas
+        colunas = [c for c in COLUNAS_IMPORTACAO if c in lote.columns]
+        
+        convertido = {}
+        com_erro = pd.Series(False, index=lote.index)
+        for nome in colunas:
+            valores, invalido = coagir_coluna(lote[nome], tabela.c[nome])
+            for idx in lote.index[invalido]:
+                # idx segue contínuo entre lotes; +2 pelo cabeçalho e por começar em 1
+                erros.append({"linha": idx + 2, "coluna": nome, "valor": lote.at[idx, nome],
+                              "erro": f"Esperado {tipo_legivel(tabela.c[nome])}"})
+            com_erro |= invalido
+            convertido[nome] = valores
+        
+        sem_nome = convertido['paciente_nome'].isna() & ~com_erro
+        for idx in lote.index[sem_nome]:
+            erros.append({"linha": idx + 2, "coluna": "paciente_nome", "valor": "", "erro": "Nome do paciente é obrigatório"})
+        com_erro |= sem_nome
+        
+        # IMC em branco (ou sem a coluna) é calculado de peso e altura, como no formulário
+        if 'peso' in convertido and 'altura' in convertido:
+            calculado = pd.Series(calcular_imc(convertido['peso'].astype(float), convertido['altura'].astype(float)),
+                                  index=lote.index)
+            if 'imc' not in convertido:
+                colunas.append('imc')
+                convertido['imc'] = pd.Series(None, index=lote.index, dtype=object)
+            convertido['imc'] = convertido['imc'].where(convertido['imc'].notna() | calculado.isna(), calculado)
+        
+        # Valores já validados vão direto ao driver, no formato em que o
+        # SQLAlchemy os grava no SQLite (datas ISO, booleanos 0/1)
+        valores_colunas = []
+        for nome in colunas:
+            padrao = valor_padrao(tabela.c[nome])
+            para_banco = valor_para_banco(tabela.c[nome])
+            valores_colunas.append([
+                para_banco(padrao if v is None else v) for v in convertido[nome][~com_erro].tolist()
+            ])
+        agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        registros = [linha + (agora,) for linha in zip(*valores_colunas)]
+        if registros:
+            colunas = colunas + ['atualizado_em']
+            sql = f"INSERT INTO avaliacoes ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+            session = Session()
+            try:
+                session.connection().exec_driver_sql(sql, registros)
+                session.commit()
+            finally:
+                session.close()
+            inseridas += len(registros)
+    if inseridas:
+        with engine.begin() as conn:
+            vincular_pacientes(conn)
+        registrar_gravacao()
+    return inseridas, erros, ignoradas or []
+
+# Tabelas de IMC para idade da OMS (None se não instaladas)
+@st.cache_resource
+def referencia_imc():
+    return carregar_referencia()
+
+# --- PDF ---
+
+# Cache de PDFs compartilhado por todas as sessões
+@st.cache_resource
+def cache_pdf():
+    return CachePDF()
+
+def versao_avaliacao(avaliacao):
+    valores = tuple(getattr(avaliacao, c.name) for c in Avaliacao.__table__.columns)
+    return hashlib.sha1(repr(valores).encode()).hexdigest()
+
+@metricas().medir("pdf")
+def gerar_pdf_avaliacao(avaliacao):
+    return cache_pdf().obter(avaliacao.id, versao_avaliacao(avaliacao), lambda: gerar_pdf(avaliacao))
+
+# --- PDF EM LOTE ---
+
+FORMATOS_LOTE = ["ZIP (um PDF por avaliação)", "PDF único"]
+
+def filtrar_lote(query, data_inicio=None, data_fim=None, profissional=None, paciente=None):
+    if data_inicio:
+        query = query.filter(Avaliacao.data_criacao >= data_inicio)
+    if data_fim:
+        query = query.filter(Avaliacao.data_criacao <= data_fim)
+    if profissional:
+        query = query.filter(Avaliacao.profissional_responsavel.icontains(profissional, autoescape=True))
+    return filtrar_avaliacoes(query, paciente)
+
+def registros_lote(session, **filtros):
+    # Percorre o resultado em lotes do cursor, entregando um dict por avaliação
+    query = filtrar_lote(session.query(*Avaliacao.__table__.columns), **filtros)
+    for linha in query.order_by(Avaliacao.data_criacao, Avaliacao.id).yield_per(500):
+        yield linha._asdict()
+
+def registros_arquivo_morto(principal, **filtros):
+    # As do arquivo morto nos anos do período, do mais antigo ao mais recente.
+    # Uma que também está no banco principal (sobra de uma movimentação
+    # interrompida) fica de fora: vale a do principal.
+    anos = anos_no_periodo(filtros.get('data_inicio'), filtros.get('data_fim'))
+    for ano, caminho, _ in reversed(arquivo_morto().arquivos()):
+        if ano in anos:
+            session = Session(bind=arquivo_morto().engine_arquivo(ano, caminho))
+            try:
+                registros = registros_lote(session, **filtros)
+                while lote := list(itertools.islice(registros, 500)):
+                    no_principal = {i for (i,) in principal.query(Avaliacao.id).filter(
+                        Avaliacao.id.in_([r['id'] for r in lote]))}
+                    yield from (r for r in lote if r['id'] not in no_principal)
+            finally:
+                session.close()
+
+def contar_lote(session, **filtros):
+    # Banco principal e arquivo morto
+    return filtrar_lote(session.query(func.count(Avaliacao.id)), **filtros).scalar() + sum(
+        n for _, n in consultar_arquivo_morto(lambda s: filtrar_lote(s.query(func.count(Avaliacao.id)), **filtros).scalar(),
+                                              anos_no_periodo(filtros.get('data_inicio'), filtros.get('data_fim'))))
+
+@metricas().medir("pdf_lote")
+def gerar_pdfs_em_lote(formato, progresso=None, desde=None, **filtros):
+    destino = tempfile.TemporaryFile()
+    session = sessao_leitura(desde)
+    try:
+        registros = itertools.chain(registros_arquivo_morto(session, **filtros), registros_lote(session, **filtros))
+        if formato == FORMATOS_LOTE[0]:
+            gerar_lote_zip(registros, destino, progresso=progresso)
+        else:
+            gerar_lote_unico(registros, destino, progresso=progresso)
+    finally:
+        session.close()
+    destino.seek(0)
+    return destino
+
+# --- TAREFAS EM SEGUNDO PLANO ---
+
+PASTA_TAREFAS = os.environ.get('CAPS_TAREFAS_DIR', 'tarefas_caps')
+INTERVALO_PAINEL_TAREFAS = 2  # s entre atualizações do painel enquanto há tarefa ativa
+ROTULOS_TAREFAS = {"exportar_csv": "Exportação CSV", "pdf_lote": "PDFs em lote",
+                   "reclassificar_imc": "Reclassificação nutricional", "arquivar": "Arquivo morto"}
+
+def tarefa_exportar_csv(parametros, progresso):
+    incluir_arquivo = parametros.get('incluir_arquivo', False)
+    session = sessao_leitura(parametros['desde'])
+    try:
+        total = contar_avaliacoes(session, parametros['filtro_nome'], parametros['marcados'])
+    finally:
+        session.close()
+    if incluir_arquivo:
+        total += contar_arquivo_morto(parametros['filtro_nome'], parametros['marcados'])
+    return gerar_csv_avaliacoes(
+        parametros['filtro_nome'], parametros['colunas'], parametros['compactar'], parametros['marcados'],
+        progresso=lambda n: progresso(n / max(total, 1), f"{n} de {total} avaliações"), desde=parametros['desde'],
+        incluir_arquivo=incluir_arquivo,
+    )
+
+def tarefa_pdf_lote(parametros, progresso):
+    filtros = dict(parametros['filtros'])
+    for campo in ('data_inicio', 'data_fim'):
+        if filtros[campo]:
+            filtros[campo] = date.fromisoformat(filtros[campo])
+    total = parametros['quantidade']
+    return gerar_pdfs_em_lote(
+        parametros['formato'], progresso=lambda n: progresso(n / total, f"{n} de {total} PDFs"),
+        desde=parametros['desde'], **filtros,
+    )
+
+def tarefa_reclassificar_imc(parametros, progresso):
+    # Relatório CSV com as avaliações divergentes (corrigidas, se pedido)
+    contagem, divergentes = reclassificar_avaliacoes(
+        engine, referencia_imc(), parametros['corrigir'],
+        progresso=lambda n, total: progresso(n / max(total, 1), f"{n} de {total} avaliações"),
+    )
+    logger.info("Reclassificação nutricional: %s", contagem)
+    if contagem['corrigidas']:
+        cache_consultas().registrar_gravacao()
+    arquivo = tempfile.TemporaryFile()
+    arquivo.write(divergentes.to_csv(index=False).encode('utf-8'))
+    arquivo.seek(0)
+    return arquivo
+
+def tarefa_arquivar(parametros, progresso):
+    # Relatório CSV com quantas avaliações foram para cada ano
+    antes_de = date.fromisoformat(parametros['antes_de'])
+    movidas = arquivar_avaliacoes(
+        engine, antes_de, ARQUIVO_MORTO_PASTA,
+        progresso=lambda n, total: progresso(n / max(total, 1), f"{n} de {total} avaliações"),
+    )
+    logger.info("Arquivo morto (anteriores a %s): %s", antes_de, movidas)
+    if movidas:
+        cache_consultas().registrar_gravacao()
+    arquivo = tempfile.TemporaryFile()
+    arquivo.write(pd.DataFrame(sorted(movidas.items()), columns=["ano", "avaliacoes"]).to_csv(index=False).encode('utf-8'))
+    arquivo.seek(0)
+    return arquivo
+
+# Uma fila por processo, compartilhada por todas as sessões
+@st.cache_resource
+def fila_tarefas():
+    fila = FilaTarefas(engine, PASTA_TAREFAS, simultaneas=int(os.environ.get('CAPS_TAREFAS_SIMULTANEAS', SIMULTANEAS)))
+    fila.registrar("exportar_csv", tarefa_exportar_csv)
+    fila.registrar("pdf_lote", tarefa_pdf_lote)
+    fila.registrar("reclassificar_imc", tarefa_reclassificar_imc)
+    fila.registrar("arquivar", tarefa_arquivar)
+    fila.limpar()
+    retomadas = fila.retomar()
+    if retomadas:
+        logger.info("%d tarefa(s) interrompida(s) retomada(s)", retomadas)
+    return fila
+
+def enviar_tarefa(tipo, parametros, nome_arquivo, mime):
+    # `desde`: a tarefa também vê o que o próprio usuário acabou de gravar
+    parametros = {**parametros, "desde": st.session_state.get('ultima_gravacao')}
+    sucesso, resultado = fila_tarefas().enviar(tipo, parametros, st.session_state['username'], nome_arquivo, mime)
+    if sucesso:
+        st.success(f"Tarefa #{resultado} enviada. Acompanhe e baixe o arquivo em \"Minhas tarefas\", na barra lateral.")
+    else:
+        st.error(resultado)
+    return sucesso
+
+def ler_arquivo(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+def painel_tarefas(atualizando=False):
+    fila = fila_tarefas()
+    tarefas = fila.listar(st.session_state['username'])
+    if atualizando and not any(t['estado'] in (NA_FILA, EXECUTANDO) for t in tarefas):
+        # Tudo terminou: um rerun completo desliga a atualização periódica
+        st.rerun()
+    for tarefa in tarefas:
+        rotulo = f"#{tarefa['id']} {ROTULOS_TAREFAS.get(tarefa['tipo'], tarefa['tipo'])}"
+        if tarefa['estado'] in (NA_FILA, EXECUTANDO):
+            st.progress(tarefa['progresso'], text=f"{rotulo} — {tarefa['mensagem'] or tarefa['estado']}")
+            if tarefa['cancelar']:
+                st.caption("Cancelando...")
+            elif st.button("Cancelar", key=f"cancelar_tarefa_{tarefa['id']}"):
+                fila.cancelar(tarefa['id'], st.session_state['username'])
+                st.rerun(scope="fragment")
+        elif tarefa['estado'] == CONCLUIDA and tarefa['arquivo'] and os.path.exists(tarefa['arquivo']):
+            st.download_button(
+                f"⬇️ {rotulo}",
+                data=lambda caminho=tarefa['arquivo']: ler_arquivo(caminho),
+                file_name=tarefa['nome_arquivo'], mime=tarefa['mime'],
+                key=f"baixar_tarefa_{tarefa['id']}", on_click="ignore",
+            )
+        else:
+            st.caption(f"{rotulo}: {tarefa['estado']}" + (f" — {tarefa['mensagem']}" if tarefa['mensagem'] else ""))
 
 # --- INTERFACE GRÁFICA ---
 
@@ -300,14 +837,14 @@ def main_app():
     
     st.title("CAPS INFANTIL - AVALIAÇÃO INICIAL")
     
-    tabs = ["Avaliação", "Histórico / Gerenciar"]
+    tabs = ["Avaliação", "Histórico / Gerenciar", "Painel", "Retornos", "Pacientes"]
     if st.session_state['role'] == 'admin':
-        tabs.append("Usuários")
+        tabs += ["Usuários", "Desempenho"]
         
     current_tab = st.tabs(tabs)
     
     # --- ABA AVALIAÇÃO ---
-    with current_tab[0]:
+    with current_tab[0], metricas().span("aba.avaliacao"):
         st.subheader("Ficha de Avaliação")
         
         # Recuperar dados se estiver editando
@@ -332,6 +869,15 @@ def main_app():
             col1, col2 = st.columns(2)
             paciente_nome = col1.text_input("Nome da Criança/Adolescente", value=edit_data.get('paciente_nome', '') if edit_data else '')
             
+            col_nasc, col_sexo = st.columns(2)
+            data_nascimento = col_nasc.date_input(
+                "Data de nascimento", value=edit_data.get('data_nascimento') if edit_data else None,
+                min_value=date(1990, 1, 1), max_value=datetime.today(),
+            )
+            rotulos_sexo = list(SEXOS)
+            sexo_atual = next((r for r, c in SEXOS.items() if edit_data and c == edit_data.get('sexo')), rotulos_sexo[0])
+            sexo = SEXOS[col_sexo.radio("Sexo", rotulos_sexo, index=rotulos_sexo.index(sexo_atual), horizontal=True)]
+            
             # Checkboxes defaults
             def get_val(key):
                 return bool(edit_data.get(key)) if edit_data else False
@@ -369,7 +915,17 @@ def main_app():
                 imc = peso / (altura * altura)
             nc3.metric("IMC Calculado", f"{imc:.2f}")
             
-            class_options = ["Não avaliado", "Baixo peso", "Eutrofia (Peso adequado)", "Sobrepeso", "Obesidade"]
+            # Com idade e sexo, a classificação vem do escore z da OMS
+            _, escore_z, classificacao_oms = avaliar(referencia_imc(), peso, altura, data_nascimento, data_atual, sexo)
+            if classificacao_oms:
+                st.caption(f"IMC para idade (OMS): escore z {escore_z:+.2f} — {classificacao_oms}. "
+                           "Esta classificação é a gravada.")
+            elif referencia_imc() is None:
+                st.caption("Tabelas da OMS de IMC para idade não instaladas: classificação manual.")
+            else:
+                st.caption("Informe data de nascimento e sexo (até 19 anos) para classificar pelo escore z da OMS.")
+            
+            class_options = CLASSIFICACOES_NUTRICIONAIS
             default_class_idx = 0
             if edit_data and edit_data.get('classificacao_nutricional') in class_options:
                 default_class_idx = class_options.index(edit_data.get('classificacao_nutricional'))
@@ -428,6 +984,8 @@ def main_app():
                         "data_criacao": data_atual,
                         "profissional_responsavel": profissional,
                         "paciente_nome": paciente_nome,
+                        "data_nascimento": data_nascimento,
+                        "sexo": sexo,
                         "crianca_identificada": crianca_identificada,
                         "responsavel_presente": responsavel_presente,
                         "responsavel_nome": responsavel_nome,
@@ -443,7 +1001,8 @@ def main_app():
                         "peso": peso,
                         "altura": altura,
                         "imc": imc,
-                        "classificacao_nutricional": classificacao_nutricional,
+                        "imc_escore_z": escore_z,
+                        "classificacao_nutricional": classificacao_oms or classificacao_nutricional,
                         "queixa_alimentar": queixa_alimentar,
                         "orientacao_nutricional": orientacao_nutricional,
                         "encaminhamento_nutricao": encaminhamento_nutricao,
@@ -463,7 +1022,7 @@ def main_app():
                         "cidade": "Angicos",
                         "estado": "RN"
                     }
-                    if save_avaliacao(dados, avaliacao_id=edit_id):
+                    if save_avaliacao(dados, avaliacao_id=edit_id, original=edit_data):
                         st.success("Avaliação salva com sucesso!")
                         if edit_id:
                             st.session_state['edit_data'] = None
@@ -471,42 +1030,223 @@ def main_app():
                             st.rerun()
 
     # --- ABA HISTÓRICO / GERENCIAR ---
-    with current_tab[1]:
+    with current_tab[1], metricas().span("aba.historico"):
         st.header("Gerenciar Avaliações")
-        session = Session()
+        
+        # Importação em lote (fichas antigas, dados de outra unidade)
+        if st.session_state['role'] == 'admin':
+            with st.expander("Importar CSV"):
+                st.caption("Mesmo formato do \"Exportar CSV\". A coluna id é ignorada; datas em AAAA-MM-DD ou DD/MM/AAAA.")
+                arquivo_csv = st.file_uploader("Arquivo CSV", type=["csv"])
+                if arquivo_csv and st.button("Importar"):
+                    try:
+                        with st.spinner("Importando..."):
+                            inseridas, erros, ignoradas = importar_csv(arquivo_csv)
+                        st.success(f"{inseridas} avaliações importadas.")
+                        if ignoradas:
+                            st.warning(f"Colunas ignoradas: {', '.join(ignoradas)}")
+                        if erros:
+                            df_erros = pd.DataFrame(erros)
+                            st.warning(f"{df_erros['linha'].nunique()} linhas não importadas por erro de validação.")
+                            st.dataframe(df_erros)
+                            st.download_button("Baixar relatório de erros", df_erros.to_csv(index=False), "erros_importacao.csv", "text/csv")
+                    except Exception as e:
+                        st.error(f"Erro ao importar: {e}")
+            
+            # Recalcula IMC e escore z de todas as avaliações com as tabelas da OMS
+            with st.expander("Reclassificação nutricional (OMS)"):
+                if referencia_imc() is None:
+                    st.info("Tabelas da OMS de IMC para idade não instaladas (pasta referencias_oms).")
+                else:
+                    st.caption("Gera um CSV com as avaliações cujo IMC ou classificação gravados divergem do cálculo. "
+                               "Avaliações sem data de nascimento, sexo, peso ou altura ficam como estão.")
+                    corrigir = st.checkbox("Gravar as correções")
+                    if st.button("Reclassificar"):
+                        enviar_tarefa("reclassificar_imc", {"corrigir": corrigir},
+                                      nome_arquivo="reclassificacao_imc.csv", mime="text/csv")
+            
+            # Avaliações antigas em arquivos por ano, fora do banco principal
+            with st.expander("Arquivo morto"):
+                arquivos = arquivo_morto().arquivos()
+                if arquivos:
+                    st.dataframe(pd.DataFrame([(ano, n, caminho) for ano, caminho, n in arquivos],
+                                              columns=["Ano", "Avaliações", "Arquivo"]), hide_index=True)
+                st.caption("Move para um arquivo por ano as avaliações anteriores à data, menos a última de cada "
+                           "paciente e as alteradas depois dela. Elas continuam na busca, na linha do tempo e nas "
+                           "exportações; para editar ou excluir uma, restaure-a.")
+                arquivar_antes_de = st.date_input("Arquivar as anteriores a", value=corte_por_meses(ARQUIVO_MORTO_MESES),
+                                                  max_value=date.today(), format="DD/MM/YYYY")
+                if st.button("Arquivar"):
+                    enviar_tarefa("arquivar", {"antes_de": arquivar_antes_de.isoformat()},
+                                  nome_arquivo="arquivo_morto.csv", mime="text/csv")
+        
+        session = sessao_leitura(st.session_state.get('ultima_gravacao'))
         try:
-            df = pd.read_sql(session.query(Avaliacao).statement, session.bind)
-            
-            if not df.empty:
-                # Filtros
-                col_filt, col_export = st.columns([3, 1])
-                filtro_nome = col_filt.text_input("Filtrar por nome do paciente")
-                if filtro_nome:
-                    df = df[df['paciente_nome'].str.contains(filtro_nome, case=False, na=False)]
+            # Filtros e paginação (executados no banco, não em memória)
+            col_filt, col_ordem, col_tam = st.columns([3, 2, 1])
+            filtro_nome = col_filt.text_input("Buscar por paciente, responsável ou profissional")
+            ordenacao = col_ordem.selectbox("Ordenar por", list(ORDENACOES_HISTORICO))
+            tamanho_pagina = col_tam.selectbox("Por página", TAMANHOS_PAGINA, index=1)
+            marcados = st.multiselect(
+                "Com os itens marcados", CAMPOS_CHECKLIST,
+                format_func=lambda c: c.replace('_', ' ').capitalize(),
+            )
+            
+            # Volta para a primeira página quando filtro, ordem ou tamanho mudam
+            assinatura = (filtro_nome, ordenacao, tamanho_pagina, tuple(marcados))
+            if st.session_state.get('hist_assinatura') != assinatura:
+                st.session_state['hist_assinatura'] = assinatura
+                st.session_state['hist_cursores'] = [None]
+            cursores = st.session_state['hist_cursores']
+            
+            total = em_cache(session, ("historico.contar", filtro_nome, tuple(marcados)),
+                             lambda: contar_avaliacoes(session, filtro_nome, marcados))
+            # A grade mostra o banco principal; as do arquivo morto aparecem
+            # na busca por nome e entram nas exportações
+            if filtro_nome or marcados:
+                arquivadas = em_cache(session, ("historico.arquivo", filtro_nome, tuple(marcados)),
+                                      lambda: contar_arquivo_morto(filtro_nome, marcados))
+            else:
+                arquivadas = arquivo_morto().total()
+            
+            if total or arquivadas:
+                df, proximo_cursor = em_cache(
+                    session, ("historico.pagina", *assinatura, cursores[-1]),
+                    lambda: carregar_pagina_historico(session, filtro_nome, ordenacao, tamanho_pagina, cursores[-1], marcados),
+                ) if total else (None, None)
+                
+                if total:
+                    st.dataframe(df, column_config={
+                        "peso": st.column_config.NumberColumn(format="%.2f"),
+                        "altura": st.column_config.NumberColumn(format="%.2f"),
+                        "imc": st.column_config.NumberColumn(format="%.2f"),
+                    })
+                    
+                    pagina = len(cursores)
+                    total_paginas = -(-total // tamanho_pagina)
+                    nav_ant, nav_info, nav_prox = st.columns([1, 3, 1])
+                    nav_info.caption(f"Página {pagina} de {total_paginas} — {total} avaliações")
+                    if nav_ant.button("⬅️ Anterior", disabled=pagina == 1):
+                        cursores.pop()
+                        st.rerun()
+                    if nav_prox.button("Próxima ➡️", disabled=proximo_cursor is None):
+                        cursores.append(proximo_cursor)
+                        st.rerun()
+                if arquivadas:
+                    st.caption(f"Mais {arquivadas} avaliação(ões) no arquivo morto" + (
+                        ": as melhores correspondências estão na lista de ações abaixo." if filtro_nome and not marcados
+                        else ". Busque pelo nome para abri-las; a exportação CSV pode incluí-las."))
                 
-                # Botão CSV
-                csv = df.to_csv(index=False).encode('utf-8')
-                col_export.download_button("Baixar CSV", csv, "avaliacoes.csv", "text/csv")
+                # Quantas das avaliações filtradas têm cada item marcado (banco principal)
+                if total:
+                    with st.expander("Itens do checklist"):
+                        if st.checkbox("Contar os itens nas avaliações filtradas"):
+                            contagem = em_cache(session, ("historico.itens", filtro_nome, tuple(marcados)),
+                                                lambda: contar_itens_checklist(session, filtro_nome, marcados))
+                            st.dataframe(pd.DataFrame({
+                                "Item": [c.replace('_', ' ').capitalize() for c in contagem],
+                                "Avaliações": list(contagem.values()),
+                                "%": [100 * n / total for n in contagem.values()],
+                            }), column_config={"%": st.column_config.NumberColumn(format="%.1f")}, hide_index=True)
                 
-                st.dataframe(df)
+                # PDFs em lote (ex.: fechamento do mês por profissional)
+                with st.expander("Gerar PDFs em lote"):
+                    lc1, lc2, lc3, lc4 = st.columns(4)
+                    lote_inicio = lc1.date_input("De", value=None, key="lote_inicio")
+                    lote_fim = lc2.date_input("Até", value=None, key="lote_fim")
+                    lote_prof = lc3.text_input("Profissional", key="lote_prof")
+                    lote_pac = lc4.text_input("Paciente", key="lote_pac")
+                    lote_formato = st.radio("Formato", FORMATOS_LOTE, horizontal=True,
+                                            help=f"PDF único até {MAX_LOTE_UNICO} avaliações; acima disso o lote sai em ZIP.")
+                    
+                    if st.button("Gerar lote"):
+                        filtros = dict(data_inicio=lote_inicio, data_fim=lote_fim, profissional=lote_prof, paciente=lote_pac)
+                        qtd = contar_lote(session, **filtros)
+                        if qtd:
+                            if lote_formato != FORMATOS_LOTE[0] and qtd > MAX_LOTE_UNICO:
+                                st.info(f"{qtd} avaliações: acima de {MAX_LOTE_UNICO} o lote sai em ZIP, um PDF por avaliação.")
+                                lote_formato = FORMATOS_LOTE[0]
+                            zip_lote = lote_formato == FORMATOS_LOTE[0]
+                            enviar_tarefa(
+                                "pdf_lote",
+                                {"formato": lote_formato, "quantidade": qtd,
+                                 "filtros": {**filtros, "data_inicio": lote_inicio and lote_inicio.isoformat(),
+                                             "data_fim": lote_fim and lote_fim.isoformat()}},
+                                nome_arquivo="fichas_caps.zip" if zip_lote else "fichas_caps.pdf",
+                                mime="application/zip" if zip_lote else "application/pdf",
+                            )
+                        else:
+                            st.info("Nenhuma avaliação no período/filtro informado.")
+                
+                # Exportação: o CSV é gerado em segundo plano, com o filtro atual
+                with st.expander("Exportar CSV"):
+                    colunas_export = st.multiselect("Colunas", COLUNAS_EXPORTACAO, default=COLUNAS_EXPORTACAO)
+                    compactar = st.checkbox("Compactar (gzip)")
+                    incluir_arquivo = bool(arquivadas) and st.checkbox(f"Incluir arquivo morto ({arquivadas})")
+                    if st.button("Gerar CSV", disabled=not colunas_export):
+                        enviar_tarefa(
+                            "exportar_csv",
+                            {"filtro_nome": filtro_nome, "colunas": colunas_export, "compactar": compactar,
+                             "marcados": marcados, "incluir_arquivo": incluir_arquivo},
+                            nome_arquivo="avaliacoes.csv.gz" if compactar else "avaliacoes.csv",
+                            mime="application/gzip" if compactar else "text/csv",
+                        )
                 
                 st.markdown("---")
                 st.subheader("Ações (Editar / Excluir / PDF)")
                 
                 # Seletor de Avaliação para Ação
-                # Criar lista de strings para seleção amigável
-                df['display_name'] = df['id'].astype(str) + " - " + df['paciente_nome'] + " (" + pd.to_datetime(df['data_criacao']).dt.strftime('%d/%m/%Y') + ")"
+                # Com busca, usa as melhores correspondências do índice; sem busca
+                # (ou filtrando também por itens marcados), a página atual
+                # (as do arquivo morto, depois, com o ano do arquivo)
+                arquivo_de = {}
+                if filtro_nome and not marcados:
+                    linhas = list(em_cache(session, ("busca.avaliacoes", filtro_nome),
+                                           lambda: sugerir_avaliacoes(session.connection(), filtro_nome)))
+                    if arquivadas:
+                        no_principal = {int(l.id) for l in linhas}
+                        for ano, linha in em_cache(session, ("busca.arquivo", filtro_nome),
+                                                   lambda: sugerir_no_arquivo_morto(filtro_nome)):
+                            # Uma avaliação nos dois (movimentação interrompida): vale a do principal
+                            if int(linha.id) not in no_principal and int(linha.id) not in arquivo_de:
+                                arquivo_de[int(linha.id)] = ano
+                                linhas.append(linha)
+                elif total:
+                    linhas = df[['id', 'paciente_nome', 'data_criacao']].itertuples(index=False)
+                else:
+                    linhas = []
+                opcoes = {
+                    int(l.id): f"{l.id} - {l.paciente_nome} ({l.data_criacao.strftime('%d/%m/%Y') if l.data_criacao else ''})"
+                               + (f" — arquivo morto {arquivo_de[int(l.id)]}" if int(l.id) in arquivo_de else "")
+                    for l in linhas
+                }
                 
-                selected_display = st.selectbox("Selecione uma avaliação para gerenciar:", df['display_name'].tolist())
+                selected_id = st.selectbox("Selecione uma avaliação para gerenciar:", list(opcoes), format_func=opcoes.get)
                 
-                if selected_display:
-                    selected_id = int(selected_display.split(" - ")[0])
+                if selected_id:
+                    ano_arquivo = arquivo_de.get(selected_id)
+                    if ano_arquivo:
+                        avaliacao_arquivo, textos = avaliacao_arquivada(ano_arquivo, selected_id)
+                        st.caption(f"No arquivo morto de {ano_arquivo}: somente leitura. Para editar ou excluir, restaure-a.")
+                    else:
+                        textos = carregar_textos(session, selected_id)
+                    if textos and any(textos):
+                        with st.expander("Textos da avaliação"):
+                            for campo, texto in zip(COLUNAS_TEXTO_LIVRE, textos):
+                                if texto:
+                                    st.markdown(f"**{campo.replace('_', ' ').capitalize()}**")
+                                    st.text(texto)
                     
-                    c_act1, c_act2, c_act3 = st.columns(3)
+                    c_act1, c_act2, c_act3, c_act4 = st.columns(4)
                     
-                    if c_act1.button("✏️ Editar Avaliação"):
-                        # Carregar dados para sessão e ir para aba de avaliação
-                        avaliacao_obj = session.query(Avaliacao).filter_by(id=selected_id).first()
+                    if c_act1.button("✏️ Editar Avaliação", disabled=bool(ano_arquivo)):
+                        # Carregar dados para sessão e ir para aba de avaliação. Do
+                        # banco principal: a versão lida protege a edição.
+                        session_edicao = Session()
+                        try:
+                            avaliacao_obj = session_edicao.query(Avaliacao).filter_by(id=selected_id).first()
+                        finally:
+                            session_edicao.close()
                         if avaliacao_obj:
                             # Converter objeto SQLAlchemy para dict
                             data_dict = {c.name: getattr(avaliacao_obj, c.name) for c in avaliacao_obj.__table__.columns}
@@ -514,21 +1254,32 @@ def main_app():
                             st.session_state['edit_id'] = selected_id
                             st.rerun()
                             
-                    if c_act2.button("🗑️ Excluir Avaliação", type="primary"):
+                    if c_act2.button("🗑️ Excluir Avaliação", type="primary", disabled=bool(ano_arquivo)):
                         if delete_avaliacao(selected_id):
                             st.success("Avaliação excluída!")
                             st.rerun()
                             
                     if c_act3.button("📄 Gerar PDF"):
-                        avaliacao_obj = session.query(Avaliacao).filter_by(id=selected_id).first()
+                        if ano_arquivo:
+                            avaliacao_obj = avaliacao_arquivo
+                        else:
+                            avaliacao_obj = session.query(Avaliacao).filter_by(id=selected_id).first()
                         if avaliacao_obj:
-                            pdf_bytes = gerar_pdf(avaliacao_obj)
+                            pdf_bytes = gerar_pdf_avaliacao(avaliacao_obj)
                             st.download_button(
                                 label="⬇️ Baixar PDF",
                                 data=pdf_bytes,
                                 file_name=f"ficha_{selected_id}.pdf",
                                 mime='application/pdf'
                             )
+                    
+                    if ano_arquivo and st.session_state['role'] == 'admin':
+                        if c_act4.button("♻️ Restaurar"):
+                            if restaurar_avaliacao(selected_id):
+                                st.success("Avaliação de volta ao banco principal.")
+                                st.rerun()
+            elif filtro_nome or marcados:
+                st.info("Nenhuma avaliação encontrada para este filtro.")
             else:
                 st.info("Nenhuma avaliação registrada.")
         except Exception as e:
@@ -536,9 +1287,229 @@ def main_app():
         finally:
             session.close()
 
+    # --- ABA PAINEL ---
+    with current_tab[2], metricas().span("aba.painel"):
+        st.header("Painel de Indicadores")
+        session = sessao_leitura(st.session_state.get('ultima_gravacao'))
+        try:
+            conn = session.connection()
+            opcoes = lambda coluna: em_cache(session, ("painel.opcoes", coluna), lambda: opcoes_resumos(conn, coluna))
+            meses = opcoes('mes')
+            if meses:
+                pc1, pc2, pc3, pc4 = st.columns(4)
+                mes_inicio = pc1.selectbox("De (mês)", meses, index=max(0, len(meses) - 12))
+                mes_fim = pc2.selectbox("Até (mês)", meses, index=len(meses) - 1)
+                profissional = pc3.selectbox("Profissional", ["Todos"] + opcoes('profissional'),
+                                             format_func=lambda p: p or "(não informado)")
+                cidade = pc4.selectbox("Cidade", ["Todas"] + opcoes('cidade'),
+                                       format_func=lambda c: c or "(não informada)")
+                
+                filtros_painel = (mes_inicio, mes_fim, None if profissional == "Todos" else profissional,
+                                  None if cidade == "Todas" else cidade)
+                df = em_cache(session, ("painel.resumos", *filtros_painel),
+                              lambda: consultar_resumos(conn, *filtros_painel))
+                totais = df.sum(numeric_only=True)
+                
+                st.subheader("Encaminhamentos")
+                m1, m2, m3, m4, m5 = st.columns(5)
+                m1.metric("Avaliações", int(totais.get('total', 0)))
+                m2.metric("Nutrição", int(totais.get('encaminhados_nutricao', 0)))
+                m3.metric("Odontologia", int(totais.get('encaminhados_odontologia', 0)))
+                m4.metric("Assistência Social", int(totais.get('encaminhamento_assistencia_social', 0)))
+                m5.metric("UBS", int(totais.get('encaminhados_ubs', 0)))
+                
+                st.subheader("Achados")
+                a1, a2, a3, a4 = st.columns(4)
+                a1.metric("Vacinas em atraso", int(totais.get('vacinas_atraso', 0)))
+                a2.metric("Cárie visível", int(totais.get('carie_visivel', 0)))
+                a3.metric("Urgência odontológica", int(totais.get('odonto_urgencia', 0)))
+                a4.metric("Inseridos no CAPS", int(totais.get('inserido_caps', 0)))
+                
+                if not df.empty:
+                    por_mes = df.groupby('mes')[['total', 'encaminhados_nutricao', 'encaminhados_odontologia',
+                                                 'encaminhamento_assistencia_social', 'encaminhados_ubs']].sum()
+                    st.subheader("Avaliações e encaminhamentos por mês")
+                    st.bar_chart(por_mes.rename(columns={
+                        'total': 'Avaliações', 'encaminhados_nutricao': 'Nutrição',
+                        'encaminhados_odontologia': 'Odontologia',
+                        'encaminhamento_assistencia_social': 'Assistência Social', 'encaminhados_ubs': 'UBS',
+                    }), stack=False)
+                    
+                    st.subheader("Classificação nutricional")
+                    nutricional = df.groupby('mes')[['nutricional_baixo_peso', 'nutricional_eutrofia',
+                                                     'nutricional_sobrepeso', 'nutricional_obesidade',
+                                                     'nutricional_nao_avaliado']].sum()
+                    st.bar_chart(nutricional.rename(columns={
+                        'nutricional_baixo_peso': 'Baixo peso', 'nutricional_eutrofia': 'Eutrofia',
+                        'nutricional_sobrepeso': 'Sobrepeso', 'nutricional_obesidade': 'Obesidade',
+                        'nutricional_nao_avaliado': 'Não avaliado',
+                    }))
+                    
+                    st.subheader("Por profissional")
+                    st.dataframe(df.groupby('profissional').sum(numeric_only=True))
+            else:
+                st.info("Nenhuma avaliação registrada.")
+        except Exception as e:
+            st.error(f"Erro ao carregar painel: {e}")
+        finally:
+            session.close()
+
+    # --- ABA RETORNOS ---
+    with current_tab[3], metricas().span("aba.retornos"):
+        st.header("Agenda de Retornos")
+        session = Session()
+        try:
+            hoje = datetime.today().date()
+            atualizar_agenda(engine, hoje)
+            conn = session.connection()
+            contagens = contar_agenda(conn, hoje)
+            
+            colunas_metricas = st.columns(len(VISOES_AGENDA))
+            for coluna, (visao, qtd) in zip(colunas_metricas, contagens.items()):
+                coluna.metric(visao, qtd)
+            
+            visao = st.radio("Mostrar", list(VISOES_AGENDA), horizontal=True)
+            if contagens[visao]:
+                df = consultar_agenda(conn, visao, hoje)
+                st.dataframe(
+                    df,
+                    column_order=["paciente_nome", "responsavel_nome", "profissional_responsavel",
+                                  "data_criacao", "proxima_avaliacao", "dias", "avaliacao_id"],
+                    column_config={
+                        "paciente_nome": "Paciente",
+                        "responsavel_nome": "Responsável",
+                        "profissional_responsavel": "Profissional",
+                        "data_criacao": st.column_config.DateColumn("Última avaliação", format="DD/MM/YYYY"),
+                        "proxima_avaliacao": st.column_config.DateColumn("Retorno", format="DD/MM/YYYY"),
+                        "dias": "Dias até o retorno",
+                        "avaliacao_id": "ID",
+                    },
+                    hide_index=True,
+                )
+                if contagens[visao] > len(df):
+                    st.caption(f"Mostrando {len(df)} de {contagens[visao]} pacientes.")
+            else:
+                st.info("Nenhum paciente nesta lista.")
+        except Exception as e:
+            st.error(f"Erro ao carregar retornos: {e}")
+        finally:
+            session.close()
+
+    # --- ABA PACIENTES ---
+    with current_tab[4], metricas().span("aba.pacientes"):
+        st.header("Linha do Tempo do Paciente")
+        session = sessao_leitura(st.session_state.get('ultima_gravacao'))
+        try:
+            conn = session.connection()
+            termo = st.text_input("Buscar paciente pelo nome")
+            encontrados = em_cache(session, ("busca.pacientes", termo),
+                                   lambda: sugerir_pacientes(conn, termo)) if termo else []
+            if encontrados:
+                opcoes = {
+                    p.id: f"{p.nome}"
+                          f"{' (nasc. ' + p.data_nascimento.strftime('%d/%m/%Y') + ')' if p.data_nascimento else ''}"
+                          f" — {p.avaliacoes} avaliação(ões), última em "
+                          f"{p.ultima.strftime('%d/%m/%Y') if p.ultima else '-'}"
+                    for p in encontrados
+                }
+                paciente_id = st.selectbox("Paciente", list(opcoes), format_func=opcoes.get)
+                nome_paciente = next(p.nome for p in encontrados if p.id == paciente_id)
+                df = em_cache(session, ("pacientes.linha_do_tempo", paciente_id),
+                              lambda: linha_do_tempo(conn, paciente_id))
+                
+                ultima = df.iloc[-1]
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("Avaliações", len(df))
+                k2.metric("Primeira", df['data_criacao'].iloc[0].strftime('%d/%m/%Y'))
+                k3.metric("Última", ultima['data_criacao'].strftime('%d/%m/%Y'))
+                k4.metric("Retorno", ultima['proxima_avaliacao'].strftime('%d/%m/%Y')
+                          if pd.notna(ultima['proxima_avaliacao']) else "—")
+                
+                medidas = df.set_index('data_criacao')[['peso', 'altura', 'imc']]
+                if medidas.notna().any().any():
+                    st.subheader("Evolução")
+                    g1, g2, g3 = st.columns(3)
+                    for coluna_grafico, campo, rotulo in [(g1, 'peso', "Peso (kg)"), (g2, 'altura', "Altura (m)"),
+                                                          (g3, 'imc', "IMC")]:
+                        coluna_grafico.caption(rotulo)
+                        coluna_grafico.line_chart(medidas[campo].dropna())
+                
+                st.subheader("Avaliações")
+                st.dataframe(
+                    df.iloc[::-1],
+                    column_order=["data_criacao", "profissional_responsavel", "peso", "altura", "imc",
+                                  "classificacao_nutricional", "classificacao_odonto", "encaminhamentos",
+                                  "proxima_avaliacao", "id"],
+                    column_config={
+                        "data_criacao": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                        "profissional_responsavel": "Profissional",
+                        "peso": "Peso (kg)",
+                        "altura": "Altura (m)",
+                        "imc": st.column_config.NumberColumn("IMC", format="%.2f"),
+                        "classificacao_nutricional": "Nutricional",
+                        "classificacao_odonto": "Odontológica",
+                        "encaminhamentos": "Encaminhamentos",
+                        "proxima_avaliacao": st.column_config.DateColumn("Retorno", format="DD/MM/YYYY"),
+                        "id": "ID",
+                    },
+                    hide_index=True,
+                )
+                
+                # Nomes digitados de formas diferentes para a mesma criança
+                if st.session_state['role'] == 'admin':
+                    with st.expander("Corrigir cadastro"):
+                        with st.form("renomear_paciente"):
+                            novo_nome = st.text_input("Nome", value=nome_paciente)
+                            if st.form_submit_button("Renomear"):
+                                sucesso, msg = corrigir_paciente(renomear_paciente, paciente_id, novo_nome)
+                                if sucesso:
+                                    st.success(msg)
+                                    st.rerun()
+                                else:
+                                    st.error(msg)
+                        
+                        if st.checkbox("Procurar cadastros com nome parecido"):
+                            parecidos = possiveis_duplicados(conn, paciente_id)
+                            if parecidos:
+                                duplicado = st.selectbox(
+                                    "Unificar com (as avaliações passam para este paciente)", parecidos,
+                                    format_func=lambda p: f"{p[1]} (cadastro {p[0]}"
+                                                          f"{', nasc. ' + p[2].strftime('%d/%m/%Y') if p[2] else ''})",
+                                )
+                                if st.button("Unificar"):
+                                    sucesso, msg = corrigir_paciente(unificar_pacientes, paciente_id, duplicado[0])
+                                    if sucesso:
+                                        st.success(msg)
+                                        st.rerun()
+                                    else:
+                                        st.error(msg)
+                            else:
+                                st.caption("Nenhum cadastro com nome parecido.")
+                        
+                        # Duas crianças com o mesmo nome no mesmo cadastro
+                        with st.form("separar_paciente"):
+                            separar = st.multiselect(
+                                "Separar avaliações de um homônimo (passam para um cadastro novo com o mesmo nome)",
+                                df['id'].iloc[::-1].tolist(),
+                                format_func=lambda i: f"#{i} de {df.loc[df['id'] == i, 'data_criacao'].iloc[0]:%d/%m/%Y}",
+                            )
+                            if st.form_submit_button("Separar"):
+                                sucesso, msg = corrigir_paciente(separar_paciente, paciente_id, separar)
+                                if sucesso:
+                                    st.success(msg)
+                                    st.rerun()
+                                else:
+                                    st.error(msg)
+            elif termo:
+                st.info("Nenhum paciente encontrado.")
+        except Exception as e:
+            st.error(f"Erro ao carregar paciente: {e}")
+        finally:
+            session.close()
+
     # --- ABA USUÁRIOS (ADMIN) ---
     if st.session_state['role'] == 'admin':
-        with current_tab[2]:
+        with current_tab[5], metricas().span("aba.usuarios"):
             st.header("Gerenciar Usuários")
             
             # Criar Novo Usuário
@@ -596,14 +1567,120 @@ def main_app():
                     st.success("Usuário excluído!")
                     st.rerun()
 
+    # --- ABA DESEMPENHO (ADMIN) ---
+    if st.session_state['role'] == 'admin':
+        with current_tab[6]:
+            st.header("Desempenho")
+            m = metricas()
+            dados = m.instantaneo()
+            st.caption(f"Medições desde {dados['desde']} (todas as sessões). Tempos em ms; "
+                       "p50/p95 aproximados pelas faixas do histograma.")
+            copia = copia_leitura()
+            if copia:
+                st.caption(f"Cópia de leitura ({COPIA_LEITURA}): conferida há {copia.atraso():.0f} s "
+                           f"(máximo {copia.max_atraso:.0f} s), {copia.renovacoes} cópia(s), "
+                           f"a última em {copia.ultima_duracao_ms:.0f} ms.")
+            consultas = cache_consultas().instantaneo()
+            st.caption(f"Cache de consultas: {consultas['acertos']} acertos e {consultas['faltas']} faltas "
+                       f"({consultas['taxa_acertos']:.0%} de acertos), {consultas['itens']} resultado(s) em "
+                       f"{consultas['bytes'] / 1024 / 1024:.1f} de {consultas['max_bytes'] / 1024 / 1024:.0f} MB, "
+                       f"{consultas['descartes']} descartado(s) pelo limite.")
+            
+            if dados['spans']:
+                st.subheader("Tempos por trecho")
+                resumo = pd.DataFrame.from_dict(
+                    {nome: {k: v for k, v in span.items() if k != 'contagens'} for nome, span in dados['spans'].items()},
+                    orient='index',
+                )
+                st.dataframe(resumo)
+                st.caption("sql.* e rerun.sql: só a execução das consultas (cursor.execute, até a primeira linha), "
+                           "sem a leitura das linhas. O tempo completo de uma leitura está no trecho que a faz "
+                           "(aba.*, pdf, pdf_lote...).")
+                
+                nome_span = st.selectbox("Histograma de", list(dados['spans']))
+                faixas = [f"até {f} ms" for f in FAIXAS_MS] + [f"acima de {FAIXAS_MS[-1]} ms"]
+                st.bar_chart(pd.DataFrame({"chamadas": dados['spans'][nome_span]['contagens']}, index=faixas), sort=False)
+            
+            st.subheader("Consultas lentas (só execução)")
+            st.caption("Medidas até a primeira linha: consultas lidas aos poucos (exportação, PDFs em lote) "
+                       "podem ser lentas na leitura das linhas sem aparecer aqui.")
+            m.limite_lento_ms = st.number_input("Registrar consultas cuja execução passe de (ms)", min_value=1,
+                                                value=int(m.limite_lento_ms))
+            if dados['consultas_lentas']:
+                for consulta in dados['consultas_lentas']:
+                    with st.expander(f"{consulta['ms']} ms — {consulta['quando']} — {consulta['sql'][:80]}"):
+                        st.code(consulta['sql'], language="sql")
+                        st.code("\n".join(consulta['plano']), language="text")
+            else:
+                st.info("Nenhuma consulta acima do limite.")
+            
+            d1, d2, d3 = st.columns(3)
+            d1.download_button("Baixar métricas (JSON)",
+                               data=lambda: json.dumps({**m.instantaneo(), "cache_consultas": cache_consultas().instantaneo()},
+                                                       ensure_ascii=False, indent=2),
+                               file_name="metricas_caps.json", mime="application/json")
+            if d2.button("Salvar em arquivo"):
+                m.salvar(METRICAS_ARQUIVO)
+                st.success(f"Métricas acrescentadas em {os.path.abspath(METRICAS_ARQUIVO)}")
+            if d3.button("Zerar métricas"):
+                m.zerar()
+                cache_consultas().zerar()
+                st.rerun()
+            
+            st.subheader("Manutenção do banco")
+            rotinas = manutencao()
+            if rotinas is None:
+                st.info("Manutenção automática desligada (CAPS_MANUTENCAO=0 ou banco que não é SQLite em arquivo).")
+            else:
+                with engine.connect() as conn:
+                    ultimas = ultimas_execucoes(conn)
+                    execucoes = listar_execucoes(conn)
+                proximas = rotinas.proximas(ultimas)
+                st.caption(f"Backup a cada {rotinas.intervalos['backup'] / 3600:g} h em {rotinas.pasta_backups} "
+                           f"(ficam os {rotinas.manter_backups} mais recentes). As demais rotinas esperam "
+                           f"{rotinas.ocioso_segundos / 60:g} min sem gravações no banco; agora são "
+                           f"{rotinas.ocioso_ha() / 60:.0f} min."
+                           + (f" Em execução: {ROTULOS_MANUTENCAO[rotinas.em_execucao]}." if rotinas.em_execucao else ""))
+                st.dataframe(pd.DataFrame([{
+                    "Rotina": ROTULOS_MANUTENCAO[rotina],
+                    "Última": ultimas[rotina].iniciada_em[:19] if rotina in ultimas else "nunca",
+                    "Resultado": ultimas[rotina].resultado if rotina in ultimas else "",
+                    "Duração (ms)": ultimas[rotina].duracao_ms if rotina in ultimas else None,
+                    "Próxima": proximas[rotina].strftime('%d/%m/%Y %H:%M') if proximas[rotina] else "assim que possível",
+                } for rotina in ROTINAS]), hide_index=True)
+                for rotina in ROTINAS:
+                    if rotina in ultimas and ultimas[rotina].resultado != OK:
+                        st.error(f"{ROTULOS_MANUTENCAO[rotina]}: {ultimas[rotina].resultado} — {ultimas[rotina].detalhes}")
+                r1, r2 = st.columns([3, 1])
+                rotina = r1.selectbox("Rotina", ROTINAS, format_func=ROTULOS_MANUTENCAO.get, label_visibility="collapsed")
+                if r2.button("Executar agora"):
+                    rotinas.pedir(rotina)
+                    st.success("Pedido enviado: roda em segundo plano em instantes, mesmo com o banco em uso.")
+                with st.expander("Últimas execuções"):
+                    st.dataframe(pd.DataFrame(
+                        [(l.iniciada_em[:19], ROTULOS_MANUTENCAO.get(l.rotina, l.rotina), l.resultado, l.duracao_ms, l.detalhes)
+                         for l in execucoes],
+                        columns=["Início", "Rotina", "Resultado", "Duração (ms)", "Detalhes"]), hide_index=True)
+
+    # --- MINHAS TAREFAS (BARRA LATERAL) ---
+    # Por último, para já mostrar o que foi enviado neste rerun. Só o
+    # fragmento é reexecutado enquanto houver tarefa ativa.
+    tarefas = fila_tarefas().listar(st.session_state['username'])
+    if tarefas:
+        with st.sidebar:
+            st.subheader("Minhas tarefas")
+            ativas = any(t['estado'] in (NA_FILA, EXECUTANDO) for t in tarefas)
+            st.fragment(painel_tarefas, run_every=INTERVALO_PAINEL_TAREFAS if ativas else None)(ativas)
+
 def main():
     if 'logged_in' not in st.session_state:
         st.session_state['logged_in'] = False
         
-    if not st.session_state['logged_in']:
-        login_page()
-    else:
-        main_app()
+    with metricas().rerun():
+        if not st.session_state['logged_in']:
+            login_page()
+        else:
+            main_app()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+# --- TAREFAS EM SEGUNDO PLANO ---
+#
+# Trabalhos demorados (exportação CSV, PDFs em lote) rodam num pool de
+# threads fora do rerun do Streamlit: a página só envia o pedido e acompanha
+# o progresso. Cada tarefa é uma linha da tabela tarefas (tipo, parâmetros
+# em JSON, estado, progresso) e o resultado fica num arquivo em disco até
+# ser baixado ou expirar. Como tipo e parâmetros ficam gravados, tarefas
+# que estavam na fila ou em execução quando o servidor parou são retomadas
+# na próxima inicialização. Tarefas encerradas há mais de DIAS_RETENCAO dias
+# e seus arquivos são apagados na inicialização e, depois, no máximo uma vez
+# por INTERVALO_LIMPEZA, quando chega uma tarefa nova (só elas criam arquivos).
+
+logger = logging.getLogger(__name__)
+
+NA_FILA, EXECUTANDO, CONCLUIDA, ERRO, CANCELADA = "na fila", "executando", "concluída", "erro", "cancelada"
+FILTRO_ATIVAS = "estado IN ('na fila', 'executando')"
+
+SIMULTANEAS = 2        # threads do pool
+MAX_NA_FILA = 20       # tarefas ativas no total
+MAX_POR_USUARIO = 3    # tarefas ativas por usuário
+INTERVALO_PROGRESSO = 0.5  # s entre gravações de progresso de uma tarefa
+DIAS_RETENCAO = 7
+INTERVALO_LIMPEZA = 3600   # s entre limpezas feitas por enviar()
+FORMATO_DATA_HORA = '%Y-%m-%d %H:%M:%S.%f'
+
+DDL_TAREFAS = [
+    """CREATE TABLE IF NOT EXISTS tarefas (
+        id INTEGER PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        usuario TEXT NOT NULL,
+        parametros TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        progresso REAL NOT NULL DEFAULT 0,
+        mensagem TEXT,
+        cancelar INTEGER NOT NULL DEFAULT 0,
+        nome_arquivo TEXT,
+        mime TEXT,
+        arquivo TEXT,
+        criada_em DATETIME NOT NULL,
+        iniciada_em DATETIME,
+        concluida_em DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_tarefas_estado ON tarefas (estado)",
+    "CREATE INDEX IF NOT EXISTS ix_tarefas_usuario_id ON tarefas (usuario, id)",
+]
+
+def criar_tarefas(engine):
+    with engine.begin() as conn:
+        for ddl in DDL_TAREFAS:
+            conn.execute(text(ddl))
+
+class TarefaCancelada(Exception):
+    pass
+
+def _agora():
+    return datetime.now().strftime(FORMATO_DATA_HORA)
+
+class FilaTarefas:
+    def __init__(self, engine, pasta, simultaneas=SIMULTANEAS, max_na_fila=MAX_NA_FILA,
+                 max_por_usuario=MAX_POR_USUARIO):
+        self.engine = engine
+        self.pasta = pasta
+        self.max_na_fila = max_na_fila
+        self.max_por_usuario = max_por_usuario
+        self.tipos = {}
+        self._lock = threading.Lock()
+        self._limpeza = None  # time.monotonic() da última limpeza
+        self._executor = ThreadPoolExecutor(max_workers=simultaneas, thread_name_prefix="tarefa")
+        os.makedirs(pasta, exist_ok=True)
+
+    def registrar(self, tipo, funcao):
+        # funcao(parametros, progresso) -> arquivo binário aberto com o
+        # resultado; progresso(fração, mensagem) também interrompe a tarefa
+        # se ela foi cancelada
+        self.tipos[tipo] = funcao
+
+    def _atualizar(self, tarefa_id, **campos):
+        atribuicoes = ", ".join(f"{c} = :{c}" for c in campos)
+        with self.engine.begin() as conn:
+            conn.execute(text(f"UPDATE tarefas SET {atribuicoes} WHERE id = :id"), {**campos, "id": tarefa_id})
+
+    def enviar(self, tipo, parametros, usuario, nome_arquivo, mime):
+        # Retorna (sucesso, id da tarefa ou mensagem de erro)
+        if tipo not in self.tipos:
+            return False, f"Tipo de tarefa desconhecido: {tipo}"
+        with self._lock:
+            limpar = self._limpeza is None or time.monotonic() - self._limpeza >= INTERVALO_LIMPEZA
+            if limpar:
+                self._limpeza = time.monotonic()
+        if limpar:
+            self.limpar()
+        with self._lock, self.engine.begin() as conn:
+            ativas, do_usuario = conn.execute(text(
+                f"SELECT COUNT(*), COALESCE(SUM(usuario = :usuario), 0) FROM tarefas WHERE {FILTRO_ATIVAS}"
+            ), {"usuario": usuario}).one()
+            if ativas >= self.max_na_fila:
+                return False, "A fila de tarefas está cheia. Tente novamente em alguns minutos."
+            if do_usuario >= self.max_por_usuario:
+                return False, f"Você já tem {do_usuario} tarefas em andamento. Aguarde alguma terminar."
+            tarefa_id = conn.execute(text("""
+                INSERT INTO tarefas (tipo, usuario, parametros, estado, nome_arquivo, mime, criada_em)
+                VALUES (:tipo, :usuario, :parametros, :estado, :nome_arquivo, :mime, :agora)
+            """), {"tipo": tipo, "usuario": usuario, "parametros": json.dumps(parametros, ensure_ascii=False),
+                   "estado": NA_FILA, "nome_arquivo": nome_arquivo, "mime": mime, "agora": _agora()}).lastrowid
+        self._executor.submit(self._executar, tarefa_id)
+        return True, tarefa_id
+
+    def retomar(self):
+        # Na inicialização: devolve ao pool as tarefas interrompidas
+        with self.engine.begin() as conn:
+            ids = conn.execute(text(f"SELECT id FROM tarefas WHERE {FILTRO_ATIVAS} ORDER BY id")).scalars().all()
+            conn.execute(text("UPDATE tarefas SET estado = :estado, progresso = 0 WHERE estado = :executando"),
+                         {"estado": NA_FILA, "executando": EXECUTANDO})
+        for tarefa_id in ids:
+            self._executor.submit(self._executar, tarefa_id)
+        return len(ids)
+
+    def _executar(self, tarefa_id):
+        # A tarefa só começa se ainda estiver na fila (pode ter sido cancelada)
+        with self.engine.begin() as conn:
+            iniciou = conn.execute(text("""
+                UPDATE tarefas SET estado = :executando, iniciada_em = :agora WHERE id = :id AND estado = :na_fila
+            """), {"executando": EXECUTANDO, "na_fila": NA_FILA, "agora": _agora(), "id": tarefa_id}).rowcount
+            if not iniciou:
+                return
+            tarefa = conn.execute(text("SELECT tipo, parametros FROM tarefas WHERE id = :id"), {"id": tarefa_id}).one()
+
+        ultima_gravacao = 0.0
+
+        def progresso(fracao, mensagem=None):
+            nonlocal ultima_gravacao
+            if time.monotonic() - ultima_gravacao < INTERVALO_PROGRESSO:
+                return
+            ultima_gravacao = time.monotonic()
+            with self.engine.begin() as conn:
+                cancelar = conn.execute(text("SELECT cancelar FROM tarefas WHERE id = :id"), {"id": tarefa_id}).scalar()
+                if cancelar:
+                    raise TarefaCancelada()
+                conn.execute(text("UPDATE tarefas SET progresso = :progresso, mensagem = :mensagem WHERE id = :id"),
+                             {"progresso": min(max(fracao, 0.0), 1.0), "mensagem": mensagem, "id": tarefa_id})
+
+        caminho = os.path.join(self.pasta, f"tarefa_{tarefa_id}")
+        try:
+            resultado = self.tipos[tarefa.tipo](json.loads(tarefa.parametros), progresso)
+            with resultado, open(caminho, "wb") as destino:
+                shutil.copyfileobj(resultado, destino)
+            self._atualizar(tarefa_id, estado=CONCLUIDA, progresso=1.0, mensagem=None, arquivo=caminho,
+                            concluida_em=_agora())
+        except TarefaCancelada:
+            self._atualizar(tarefa_id, estado=CANCELADA, concluida_em=_agora())
+        except Exception as e:
+            logger.exception("Tarefa %s (%s) falhou", tarefa_id, tarefa.tipo)
+            self._atualizar(tarefa_id, estado=ERRO, mensagem=str(e), concluida_em=_agora())
+
+    def cancelar(self, tarefa_id, usuario):
+        # Na fila: cancela já. Em execução: para no próximo aviso de progresso.
+        parametros = {"id": tarefa_id, "usuario": usuario, "na_fila": NA_FILA, "executando": EXECUTANDO,
+                      "cancelada": CANCELADA, "agora": _agora()}
+        with self.engine.begin() as conn:
+            if conn.execute(text("""
+                UPDATE tarefas SET estado = :cancelada, concluida_em = :agora
+                WHERE id = :id AND usuario = :usuario AND estado = :na_fila
+            """), parametros).rowcount:
+                return True
+            return conn.execute(text("""
+                UPDATE tarefas SET cancelar = 1 WHERE id = :id AND usuario = :usuario AND estado = :executando
+            """), parametros).rowcount > 0
+
+    def listar(self, usuario, limite=10):
+        with self.engine.connect() as conn:
+            return conn.execute(text("""
+                SELECT id, tipo, estado, progresso, mensagem, cancelar, nome_arquivo, mime, arquivo,
+                       criada_em, concluida_em
+                FROM tarefas WHERE usuario = :usuario ORDER BY id DESC LIMIT :limite
+            """), {"usuario": usuario, "limite": limite}).mappings().all()
+
+    def limpar(self, dias=DIAS_RETENCAO):
+        # Apaga tarefas encerradas há mais de `dias` e seus arquivos
+        self._limpeza = time.monotonic()
+        limite = (datetime.now() - timedelta(days=dias)).strftime(FORMATO_DATA_HORA)
+        with self.engine.begin() as conn:
+            antigas = conn.execute(text(
+                f"SELECT id, arquivo FROM tarefas WHERE NOT {FILTRO_ATIVAS} AND concluida_em < :limite"
+            ), {"limite": limite}).all()
+            for tarefa_id, arquivo in antigas:
+                if arquivo and os.path.exists(arquivo):
+                    os.remove(arquivo)
+                conn.execute(text("DELETE FROM tarefas WHERE id = :id"), {"id": tarefa_id})
+        return len(antigas)